@@ -0,0 +1,153 @@
+import re
+from query_result import QueryResult
+
+# Longest list / widest row rendered locally; bigger results go to the LLM
+MAX_LIST_ROWS = 10
+MAX_ROW_COLUMNS = 6
+
+_ACRONYMS = {"rx", "hcp", "ln", "id", "ytd"}
+_WORD_LABELS = {"cnt": "count", "pct": "%", "num": "number", "avg": "average", "amt": "amount"}
+_RANKING_RE = re.compile(r"\b(top|bottom|most|least|highest|lowest|best|worst|rank\w*|largest|smallest|leading)\b", re.I)
+# Identifier-like columns are printed verbatim (no thousands separators)
+_VERBATIM_COLUMN_RE = re.compile(r"(^|_)(id|code|year|quarter|month|week|week_num|date|zip)$", re.I)
+
+# Results are only rendered locally when every column is a plain identifier
+# that says what it holds; "SUM(t1.trx_cnt)" or "n" go to the LLM instead
+_PLAIN_COLUMN_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+GENERIC_COLUMNS = {"n", "cnt", "count", "value", "val", "total", "sum", "avg", "amount", "result", "metric", "x"}
+
+# Filters in the question that the result columns don't show: periods
+# ("in 2024", "last quarter", "Q3 2024") and capitalized names after
+# for/in/at ("for GAZYVA", "in the Northeast"); they are repeated in the answer
+_MONTHS = "january|february|march|april|may|june|july|august|september|october|november|december"
+_PERIOD_FILTER_RE = re.compile(
+    r"\b(?:(?:in|for|during|since|from|through|until)\s+(?:the\s+)?)?"
+    rf"(?:(?:last|this|next|previous|current)\s+(?:week|month|quarter|year)|q[1-4](?:\s+(?:19|20)\d{{2}})?"
+    rf"|(?:{_MONTHS})(?:\s+(?:19|20)\d{{2}})?|(?:19|20)\d{{2}}|ytd)\b",
+    re.I,
+)
+_NAME_FILTER_RE = re.compile(r"\b(?i:for|in|at)\s+(?:the\s+)?(?:Dr\.?\s+)?[A-Z][A-Za-z0-9]*(?:\s+[A-Z][A-Za-z0-9]*)*")
+
+
+def humanize_column(column: str) -> str:
+    """Turns a result column name into a label, e.g. "total_trx" -> "total TRx"."""
+    words = []
+    for word in re.split(r"[_\s]+", column.strip()):
+        if not word:
+            continue
+        lower = word.lower()
+        if lower in _WORD_LABELS:
+            words.append(_WORD_LABELS[lower])
+        elif lower in ("trx", "nrx"):
+            words.append(lower[0].upper() + "Rx")
+        elif lower in _ACRONYMS:
+            words.append(lower.upper())
+        else:
+            words.append(lower)
+    return " ".join(words) or column
+
+
+def format_value(column: str, value) -> str:
+    """Formats a single value for an answer sentence."""
+    if value is None:
+        return "N/A"
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return str(value) if _VERBATIM_COLUMN_RE.search(column) else f"{value:,}"
+    if isinstance(value, float):
+        if value.is_integer() and not _VERBATIM_COLUMN_RE.search(column):
+            return f"{int(value):,}"
+        if abs(value) < 1:
+            # Shares and rates: 0.1234 stays 0.1234 instead of 0.12
+            return f"{value:.4g}"
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def describes_itself(column: str) -> bool:
+    """True for a plain identifier that is more than a generic alias such as "n" or "value"."""
+    return bool(_PLAIN_COLUMN_RE.match(column)) and column.lower() not in GENERIC_COLUMNS
+
+
+def question_filters(question: str) -> str:
+    """The period and name filters of a question, e.g. "for GAZYVA in 2024", or ""."""
+    matches = sorted(list(_PERIOD_FILTER_RE.finditer(question)) + list(_NAME_FILTER_RE.finditer(question)),
+                     key=lambda match: match.start())
+    phrases, end = [], 0
+    for match in matches:
+        if match.start() >= end:
+            phrases.append(match.group(0))
+            end = match.end()
+    return " ".join(phrases)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _scoped(text: str, question: str) -> str:
+    """`text` followed by the question's filters, if any."""
+    filters = question_filters(question)
+    return f"{text} {filters}" if filters else text
+
+
+def _render_scalar(question: str, result: QueryResult) -> str:
+    column = result.columns[0]
+    return f"The {_scoped(humanize_column(column), question)} is {format_value(column, result.rows[0][0])}."
+
+
+def _render_row(question: str, result: QueryResult) -> str:
+    parts = [f"{humanize_column(column)}: {format_value(column, value)}"
+             for column, value in zip(result.columns, result.rows[0])]
+    return _scoped("Result", question) + ": " + ", ".join(parts) + "."
+
+
+def _render_list(question: str, result: QueryResult) -> str | None:
+    """Renders up to MAX_LIST_ROWS rows of label column(s) followed by one numeric column."""
+    numeric = [i for i, _ in enumerate(result.columns) if all(_is_number(row[i]) for row in result.rows)]
+    if len(result.columns) > 3 or not numeric or numeric[-1] != len(result.columns) - 1:
+        return None
+    value_index = numeric[-1]
+    label_indexes = [i for i in range(len(result.columns)) if i != value_index]
+    if not label_indexes:
+        return None
+
+    metric = result.columns[value_index]
+    ranked = bool(_RANKING_RE.search(question))
+    noun = " / ".join(humanize_column(result.columns[i]) for i in label_indexes)
+    items = []
+    for position, row in enumerate(result.rows, start=1):
+        label = " / ".join(format_value(result.columns[i], row[i]) for i in label_indexes)
+        value = format_value(metric, row[value_index])
+        items.append(f"{position}. {label} ({value})" if ranked else f"{label}: {value}")
+
+    if ranked:
+        heading = f"{noun} ranked by {humanize_column(metric)}"
+    else:
+        heading = f"{humanize_column(metric)} by {noun}"
+    heading = _scoped(heading, question)
+    return f"{heading[0].upper()}{heading[1:]}: " + "; ".join(items) + "."
+
+
+def render_answer(question: str, result: QueryResult) -> str | None:
+    """
+    Phrases simple result shapes without an LLM call: an empty set, a single
+    value, a single row, or a short list of labels with one numeric column,
+    repeating the question's period and name filters. Returns None for
+    anything else (errors, truncated or larger results, columns without a
+    descriptive alias) so the caller falls back to the LLM.
+    """
+    if result.error or result.truncated:
+        return None
+    if result.is_empty:
+        return "No data was found for your question."
+    if not all(describes_itself(column) for column in result.columns):
+        return None
+    if result.row_count == 1 and len(result.columns) == 1:
+        return _render_scalar(question, result)
+    if result.row_count == 1 and len(result.columns) <= MAX_ROW_COLUMNS:
+        return _render_row(question, result)
+    if result.row_count <= MAX_LIST_ROWS:
+        return _render_list(question, result)
+    return None
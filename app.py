@@ -1,25 +1,18 @@
 # gradio_ui.py
+import os
 import gradio as gr
 import pandas as pd
-from backend_app import process_query
+from backend_app import aprocess_query, astream_query, metrics_text, warm_up
+from query_result import QueryResult
 
-def call_backend(question: str):
-    if not question or not question.strip():
-        return {
-            "status": "error",
-            "final_answer": "Please provide a question.",
-            "generated_sql": "",
-            "sql_result": "",
-            "model_used": "",
-            "explanation": "",
-            "table": pd.DataFrame()
-        }
-
-    # Call the local process_query function directly
-    data = process_query(question)
 
-    # Normalize SQL result to DataFrame if possible
-    sql_result = data.get("sql_result")
+def to_dataframe(sql_result) -> pd.DataFrame:
+    """Normalize SQL result to DataFrame if possible"""
+    # Structured results map straight onto a DataFrame
+    if isinstance(sql_result, QueryResult):
+        if sql_result.error:
+            return pd.DataFrame({"raw": [sql_result.error]})
+        return pd.DataFrame.from_records(sql_result.rows, columns=sql_result.columns)
 
     if isinstance(sql_result, str):
         try:
@@ -36,9 +29,26 @@ def call_backend(question: str):
         except (ValueError, SyntaxError):
             # If it's not a valid Python literal, keep it as a string
             pass
-    
-    df = pd.DataFrame(sql_result) if isinstance(sql_result, list) else pd.DataFrame({"raw": [str(sql_result)]}) if sql_result is not None else pd.DataFrame()
-    data['table'] = df
+
+    return pd.DataFrame(sql_result) if isinstance(sql_result, list) else pd.DataFrame({"raw": [str(sql_result)]}) if sql_result is not None else pd.DataFrame()
+
+
+async def call_backend(question: str):
+    if not question or not question.strip():
+        return {
+            "status": "error",
+            "final_answer": "Please provide a question.",
+            "generated_sql": "",
+            "sql_result": "",
+            "model_used": "",
+            "explanation": "",
+            "table": pd.DataFrame()
+        }
+
+    # Call the local async pipeline directly; Gradio awaits it on its event loop
+    data = await aprocess_query(question)
+
+    data['table'] = to_dataframe(data.get("sql_result"))
 
     return data
 
@@ -71,17 +81,42 @@ with gr.Blocks(title="Pharma Data QA — Gradio UI") as demo:
         model_box = gr.Textbox(label="Model used", interactive=False)
         status_box = gr.Textbox(label="Status / Error", interactive=False)
 
-    def on_run(q):
-        out = call_backend(q)
-        # Return order must match the outputs list in run.click
-        return (
-            out.get("generated_sql"),
-            out.get("final_answer"),
-            out.get("table"),
-            out.get("explanation"),
-            out.get("model_used"),
-            out.get("status")
-        )
+    async def on_run(q):
+        # Yield order must match the outputs list in run.click
+        if not q or not q.strip():
+            out = await call_backend(q)
+            yield (
+                out.get("generated_sql"),
+                out.get("final_answer"),
+                out.get("table"),
+                out.get("explanation"),
+                out.get("model_used"),
+                out.get("status")
+            )
+            return
+
+        # Stream stages into the UI as they finish: SQL, then the table, then the answer
+        sql, answer, table, explanation, model, status = "", "", pd.DataFrame(), "", "", "running"
+        yield (sql, answer, table, explanation, model, "Generating SQL...")
+        async for update in astream_query(q):
+            stage = update["stage"]
+            if stage == "sql":
+                sql, explanation = update["generated_sql"], update["explanation"]
+                status = "Running SQL..."
+            elif stage == "result":
+                sql, explanation = update["generated_sql"], update["explanation"]
+                table = to_dataframe(update["sql_result"])
+                status = "Writing answer..."
+            elif stage == "answer":
+                answer = update["final_answer"]
+            elif stage == "done":
+                sql = update.get("generated_sql")
+                answer = update.get("final_answer")
+                table = to_dataframe(update.get("sql_result"))
+                explanation = update.get("explanation")
+                model = update.get("model_used")
+                status = update.get("status")
+            yield (sql, answer, table, explanation, model, status)
 
     # wire up the click — inputs and outputs order must match the on_run return tuple
     run.click(
@@ -92,4 +127,20 @@ with gr.Blocks(title="Pharma Data QA — Gradio UI") as demo:
 
 
 if __name__ == "__main__":
-    demo.launch()
+    import threading
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+
+    # Serve the UI and a Prometheus scrape endpoint on the same port
+    server = FastAPI()
+
+    @server.get("/metrics")
+    def metrics():
+        return PlainTextResponse(metrics_text(), media_type="text/plain; version=0.0.4")
+
+    server = gr.mount_gradio_app(server, demo, path="/")
+    # Load the data and create the clients while uvicorn starts; a question
+    # that arrives first waits for the warm-up to finish
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    uvicorn.run(server, host=os.getenv("GRADIO_SERVER_NAME", "127.0.0.1"), port=int(os.getenv("GRADIO_SERVER_PORT", "7860")))
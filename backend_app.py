@@ -1,66 +1,464 @@
-import json
-import sqlite3
-from pydantic import BaseModel
-from openai import OpenAI
-from system_prompt import SYSTEM_PROMPT 
+import os
+import asyncio
+import threading
+import functools
+import itertools
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from system_prompt import SYSTEM_PROMPT, DIALECT_NOTES, build_schema_prompt
+from schema_retriever import select_tables
 import re
-from csv_to_sqlite import load_csv_to_sqlite
+from connection_pool import SQLiteConnectionPool
+from result_cache import QueryResultCache, normalize_sql
+from question_cache import QuestionCache, normalize_question
+from query_result import QueryResult
+from answer_renderer import render_answer
+from retry_policy import RetryBudget, RetryController, AttemptStats, classify_llm_error
+from sql_validator import SQLValidationError
+from sql_engines import SQLiteEngine, DuckDBEngine, QueryInterrupted
+from metrics import MetricsRegistry, RequestTrace, maybe_span
+from entity_resolver import EntityIndex, ENTITY_SOURCES, format_entity_hints
 
 
-try:
-    client = OpenAI()
-except Exception as e:
-    print(f"Error initializing OpenAI client: {e}")
-    print("Please ensure OPENAI_API_KEY environment variable is set.")
+# Importing this module is cheap: the OpenAI SDK, pandas and the data load
+# are deferred to warm_up(), which runs at startup or on the first question.
+# OpenAI clients, created by get_client() / get_async_client(); both honour
+# OPENAI_BASE_URL, e.g. for a local mock server
+client = None
+async_client = None
 
 DB_FILE = "pharma_data.db"
 GPT_MODEL = "gpt-4o-mini"
 
-load_csv_to_sqlite()
+# Set SKIP_DATA_LOAD=1 when pharma_data.db is built ahead of time (e.g. in a
+# container image) so warm-up doesn't read the CSVs to check for changes
+SKIP_DATA_LOAD = os.getenv("SKIP_DATA_LOAD") == "1"
 
+# Serve a read-only snapshot built by db_snapshot.py instead of DB_FILE, e.g.
+# SNAPSHOT_DB=snapshots/current.db. The link is re-resolved every
+# SNAPSHOT_CHECK_SECONDS, so publishing a new snapshot takes effect without a
+# restart. Snapshots are opened with immutable=1 and mapped into memory, so
+# worker processes share their pages through the OS page cache.
+SNAPSHOT_DB = os.getenv("SNAPSHOT_DB")
+SNAPSHOT_CHECK_SECONDS = 5.0
+SNAPSHOT_MMAP_SIZE = 2**31  # SQLite caps this at its compile-time maximum (2 GiB by default)
+_snapshot_path = None
+_snapshot_checked = 0.0
+_warm_up_lock = threading.Lock()
+_warmed_up = False
+
+# Per-question budget for SQL generation: LLM requests, tokens and seconds
 MAX_RETRIES = 5
+SQL_RETRY_BUDGET = RetryBudget(max_calls=MAX_RETRIES, max_tokens=30_000, max_seconds=60.0)
+attempt_stats = AttemptStats()
+
+# Send only the tables a question needs instead of the full schema
+PRUNE_SCHEMA = True
+
+# Phrase simple results (scalar, single row, short list, empty) locally instead of with a second LLM call
+TEMPLATED_ANSWERS = True
+
+# Resolve HCP, account, rep and territory names in the question to their IDs
+# before prompting, so the SQL filters on keys instead of LIKE-matching names
+ENTITY_RESOLUTION = True
+ENTITY_INDEX_MAX_ROWS = 1_000_000  # rows read per dimension when building the index
+entity_index = None  # built by refresh_entity_index() at warm-up, rebuilt when the data version changes
+_entity_index_lock = threading.Lock()
+
+# Rows kept from a query result; anything beyond is dropped and flagged as truncated
+MAX_RESULT_ROWS = 10_000
+FETCH_BATCH_SIZE = 1_000
+
+# Per-query budgets; the VM instruction budget only applies to SQLite
+QUERY_TIMEOUT_SECONDS = 15.0
+QUERY_MAX_VM_STEPS = 500_000_000
+PROGRESS_HANDLER_STEPS = 10_000  # VM instructions between budget checks
+
+# Long-lived read-only connections shared by all execute_sql calls
+POOL_SIZE = 8
+db_pool = SQLiteConnectionPool(DB_FILE, max_size=POOL_SIZE)
+
+# Engine behind execute_sql: "sqlite" (default) or "duckdb" (needs the duckdb package)
+SQL_ENGINE = os.getenv("SQL_ENGINE", "sqlite")
+DUCKDB_PARQUET_DIR = None  # e.g. "data/parquet" to have DuckDB query Parquet copies of the CSVs
+engine = None  # created by get_engine(); the SQLite engine uses db_pool
+_engine_lock = threading.Lock()
+
+# Bounded executor the async pipeline uses for blocking SQLite work
+sql_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="sql")
+
+# Parallel candidate SQL: each attempt races this many requests at different
+# temperatures and keeps the first one that executes with rows (1 disables)
+SQL_CANDIDATES = 1
+CANDIDATE_TEMPERATURES = (0.0, 0.4, 0.8, 1.0)
+candidate_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="candidate")
+
+# LRU cache of execute_sql results, invalidated when the loader bumps the data version
+RESULT_CACHE_SIZE = 256
+RESULT_CACHE_TTL = 600  # seconds
+result_cache = QueryResultCache(max_entries=RESULT_CACHE_SIZE, ttl_seconds=RESULT_CACHE_TTL)
+
+# Overlapping execute_sql calls for the same SQL share one execution
+_inflight_sql = {}
+_inflight_lock = threading.Lock()
+
+# Questions in flight at once in process_queries / aprocess_queries
+BATCH_CONCURRENCY = 8
+
+# Persistent question -> SQL cache that lets repeated questions skip SQL generation
+QUESTION_CACHE_FILE = "question_cache.db"
+QUESTION_CACHE_SIZE = 1000
+QUESTION_CACHE_NEAR_MATCH = None  # char-trigram cosine (e.g. 0.9) to also match rewordings; None: exact only
+question_cache = None  # opened by get_question_cache() at warm-up or on first use, so importing creates no file
+_question_cache_lock = threading.Lock()
+
+# Latency histograms and counters of the pipeline; app.py serves them at /metrics
+pipeline_metrics = MetricsRegistry()
+pipeline_metrics.declare("requests_total", "counter", "Questions answered, by status and answer source.")
+pipeline_metrics.declare("request_seconds", "histogram", "End-to-end latency of a question.")
+pipeline_metrics.declare("stage_seconds", "histogram", "Latency of the pipeline stages, one observation per span.")
+pipeline_metrics.declare("sql_attempts_total", "counter", "LLM replies used to generate SQL.")
+pipeline_metrics.declare("sql_attempt_failures_total", "counter", "Failed SQL generation attempts that trigger a retry if the budget allows, by reason.")
+pipeline_metrics.declare("tokens_total", "counter", "LLM tokens used, by kind.")
+pipeline_metrics.declare("sql_rows_total", "counter", "Rows returned by execute_sql.")
+pipeline_metrics.declare("sql_result_bytes_total", "counter", "Estimated JSON-serialized size of the execute_sql results.")
+pipeline_metrics.declare("sql_shared_total", "counter", "execute_sql calls served by an identical query that was already running.")
+pipeline_metrics.declare("cache_hits_total", "counter", "Cache hits, by cache.")
+pipeline_metrics.declare("cache_misses_total", "counter", "Cache misses, by cache.")
+pipeline_metrics.declare("entity_matches_total", "counter", "Names in questions resolved to dimension IDs before prompting, by kind.")
+pipeline_metrics.declare("sql_generation_questions_total", "counter", "Questions that went to SQL generation, by the LLM replies they needed.")
+pipeline_metrics.declare("sql_generation_failures_total", "counter", "Questions for which SQL generation gave up.")
+
+
+def _cache_metrics():
+    """Hit and miss counters kept by the caches themselves."""
+    result_stats = result_cache.stats()
+    samples = [
+        ("cache_hits_total", {"cache": "result"}, result_stats["hits"]),
+        ("cache_misses_total", {"cache": "result"}, result_stats["misses"]),
+    ]
+    if question_cache is not None:
+        question_stats = question_cache.stats()
+        samples += [
+            ("cache_hits_total", {"cache": "question", "match": "exact"}, question_stats["exact_hits"]),
+            ("cache_hits_total", {"cache": "question", "match": "near"}, question_stats["near_hits"]),
+            ("cache_misses_total", {"cache": "question"}, question_stats["misses"]),
+        ]
+    return samples
+
+
+def _attempt_metrics():
+    """The attempts histogram of attempt_stats."""
+    stats = attempt_stats.stats()
+    samples = [("sql_generation_questions_total", {"attempts": str(attempts)}, count)
+               for attempts, count in stats["histogram"].items()]
+    samples.append(("sql_generation_failures_total", {}, stats["failures"]))
+    return samples
+
+
+pipeline_metrics.add_collector(_cache_metrics)
+pipeline_metrics.add_collector(_attempt_metrics)
+
+
+def metrics_text() -> str:
+    """The pipeline metrics in the Prometheus text format."""
+    return pipeline_metrics.render()
+
+
+def __getattr__(name: str):
+    # QueryRequest is built on first access so importing this module doesn't import pydantic
+    if name == "QueryRequest":
+        from pydantic import BaseModel
+
+        class QueryRequest(BaseModel):
+            """Model for the incoming user query."""
+            user_question: str
+
+        globals()["QueryRequest"] = QueryRequest
+        return QueryRequest
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _create_client(client_class):
+    try:
+        return client_class()
+    except Exception as e:
+        print(f"Error initializing OpenAI client: {e}")
+        print("Please ensure OPENAI_API_KEY environment variable is set.")
+        raise
+
+
+def get_client():
+    """The OpenAI client; the SDK is imported on first use."""
+    global client
+    if client is None:
+        from openai import OpenAI
+        client = _create_client(OpenAI)
+    return client
+
+
+def get_async_client():
+    """The AsyncOpenAI client used by the async pipeline."""
+    global async_client
+    if async_client is None:
+        from openai import AsyncOpenAI
+        async_client = _create_client(AsyncOpenAI)
+    return async_client
+
 
-class QueryRequest(BaseModel):
-    """Model for the incoming user query."""
-    user_question: str
+def get_engine():
+    """The engine behind execute_sql, created on first use."""
+    global engine
+    if SNAPSHOT_DB and SQL_ENGINE != "duckdb":
+        if engine is None or time.monotonic() - _snapshot_checked >= SNAPSHOT_CHECK_SECONDS:
+            try:
+                swap_snapshot()
+            except Exception as e:
+                if engine is None:
+                    raise
+                print(f"❌ Could not switch snapshots, still serving '{_snapshot_path}': {e}")
+        return engine
+    if engine is None:
+        with _engine_lock:
+            if engine is None:
+                if SQL_ENGINE == "duckdb":
+                    engine = DuckDBEngine(parquet_dir=DUCKDB_PARQUET_DIR, fetch_batch_size=FETCH_BATCH_SIZE)
+                else:
+                    engine = SQLiteEngine(db_pool, progress_steps=PROGRESS_HANDLER_STEPS, fetch_batch_size=FETCH_BATCH_SIZE)
+    return engine
 
 
-def build_sql_prompt(user_question: str) -> str:
-    """Builds the full prompt used to generate the SQL query."""
+def get_question_cache() -> QuestionCache:
+    """The question cache; its SQLite file is created on first use."""
+    global question_cache
+    if question_cache is None:
+        with _question_cache_lock:
+            if question_cache is None:
+                question_cache = QuestionCache(QUESTION_CACHE_FILE, max_entries=QUESTION_CACHE_SIZE,
+                                               near_match_threshold=QUESTION_CACHE_NEAR_MATCH)
+    return question_cache
+
+
+def swap_snapshot(path: str | None = None) -> bool:
+    """
+    Points execute_sql at the snapshot `path` (default: wherever SNAPSHOT_DB
+    leads now) with a fresh immutable connection pool. Queries already
+    running finish on the old snapshot, whose connections are closed as they
+    come back; cached results are keyed on the data version, which differs
+    per snapshot. Returns whether the snapshot changed.
+    """
+    global db_pool, engine, _snapshot_path, _snapshot_checked
+    path = os.path.realpath(path or SNAPSHOT_DB)
+    with _engine_lock:
+        _snapshot_checked = time.monotonic()
+        if path == _snapshot_path and engine is not None:
+            return False
+        pool = SQLiteConnectionPool(path, max_size=POOL_SIZE, immutable=True, mmap_size=SNAPSHOT_MMAP_SIZE)
+        new_engine = SQLiteEngine(pool, progress_steps=PROGRESS_HANDLER_STEPS, fetch_batch_size=FETCH_BATCH_SIZE)
+        data_version = new_engine.data_version()  # fails here rather than in a request if the file is unusable
+        old_pool = db_pool
+        db_pool, engine, _snapshot_path = pool, new_engine, path
+    old_pool.close()
+    print(f"✅ Serving snapshot '{path}' (data version {data_version})")
+    return True
+
+
+def warm_up(load_data: bool | None = None) -> dict:
+    """
+    Does the startup work up front: loads the CSVs into the DB (skipped when
+    `load_data` is False, by default with SKIP_DATA_LOAD or SNAPSHOT_DB),
+    opens the engine and the question cache, creates the OpenAI clients and
+    builds the full-schema prompt. Safe to call more than once; only the first call does anything.
+    Returns the seconds spent per step.
+    """
+    global _warmed_up
+    with _warm_up_lock:
+        if _warmed_up:
+            return {}
+        if load_data is None:
+            load_data = not (SKIP_DATA_LOAD or SNAPSHOT_DB)
+        seconds = {}
+
+        start = time.perf_counter()
+        if load_data:
+            from csv_to_sqlite import load_csv_to_sqlite
+            load_csv_to_sqlite(DB_FILE)
+        seconds["data"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        get_engine().data_version()
+        seconds["engine"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if ENTITY_RESOLUTION:
+            refresh_entity_index()
+        seconds["entities"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        get_question_cache()
+        seconds["question_cache"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            get_client()
+            get_async_client()
+        except Exception:
+            pass  # already reported; the first LLM call raises again
+        seconds["llm_clients"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        build_sql_system_prompt(None)
+        seconds["prompt"] = time.perf_counter() - start
+
+        _warmed_up = True
+    print(f"✅ Warm-up done in {sum(seconds.values()):.2f}s "
+          f"({', '.join(f'{step} {value:.2f}s' for step, value in seconds.items())})")
+    return seconds
+
+
+async def _awarm_up():
+    # Off the event loop: the data load and client setup block
+    if not _warmed_up:
+        await asyncio.get_running_loop().run_in_executor(None, warm_up)
+
+
+@functools.lru_cache(maxsize=128)
+def build_sql_system_prompt(tables: tuple | None = None) -> str:
+    """
+    Builds the system message for SQL generation: role, output format, rules,
+    notes on the engine's SQL dialect and the schema of `tables` (the full
+    schema for None). It never contains
+    the question, so identical table sets produce byte-identical messages
+    and the provider can reuse the cached prompt prefix across questions.
+    """
+    schema = SYSTEM_PROMPT if tables is None else build_schema_prompt(list(tables))
+    sql_engine = get_engine()
 
     return f"""
     -- ROLE: Data Analyst SQL Expert
-    -- TASK: You are a highly accurate SQLite database expert. Your sole function is to translate a user's natural language question into a single, valid, and executable SQLite query.
+    -- TASK: You are a highly accurate {sql_engine.dialect} database expert. Your sole function is to translate a user's natural language question into a single, valid, and executable {sql_engine.dialect} query.
 
     -- OUTPUT FORMAT (required, exact):
     -- 1) A short, high-level, non-sensitive explanation enclosed in <explanation>...</explanation>.
     --    - This should be a concise rationale describing the approach and any key assumptions (reveal internal chain-of-thought or step-by-step hidden reasoning).
     -- 2) The final SQL enclosed in <sql>...</sql>.
-    --    - The <sql> section must contain only the single, executable SQLite query (no surrounding backticks, no commentary).
+    --    - The <sql> section must contain only the single, executable {sql_engine.dialect} query (no surrounding backticks, no commentary).
     -- Example correct output:
     -- <explanation>Use date_dim.year filter for 2024; aggregate prescriptions by doctor; exclude null names.</explanation>
     -- <sql>SELECT ...;</sql>
 
-    -- DATABASE CONTEXT:
-    -- The database is named 'pharma_data.db' and uses the SQLite dialect.
-
-    -- SCHEMA DEFINITION:
-    {SYSTEM_PROMPT}
-
     -- INSTRUCTIONS & RULES:
-    -- 1. **SQL DIALECT:** Use standard SQLite syntax.
-    -- 2. **Aliasing:** Always use table aliases (e.g., T1, T2) for readability.
+    -- 1. **SQL DIALECT:** Use standard {sql_engine.dialect} syntax.
+    -- 2. **Aliasing:** Always use table aliases (e.g., T1, T2) for readability, and give every computed column a descriptive snake_case alias (e.g., SUM(T1.trx_cnt) AS total_trx), never a generic one such as n, cnt, value or total.
     -- 3. **Aggregation:** Use appropriate aggregate functions (SUM, AVG, COUNT) and GROUP BY clauses when needed.
-    -- 4. **HCP/Account Names:** Names are typically full strings. Use LIKE '%%' or '=' as appropriate.
+    -- 4. **HCP/Account Names:** Names are typically full strings. Use LIKE '%%' or '=' as appropriate. When the question is followed by resolved entities, filter on the given IDs with = or IN instead.
     -- 5. **Date Filtering:** Use the appropriate columns in the `date_dim` table for filtering by year, quarter, etc.
     -- 6. **Single Query:** Return exactly one valid, executable SQL statement inside <sql>...</sql>.
     -- 7. **No Extra Output:** Do NOT include any other text, markup, or commentary outside the two tags.
     -- 8. **Safety:** Do NOT output internal chain-of-thought or verbatim reasoning. Only provide the short, high-level explanation in <explanation> as described above.
+    -- 9. **Question:** The user's question arrives in the next message.
 
-    -- USER QUESTION START:
-    {user_question}
-    -- USER QUESTION END
+    -- DATABASE CONTEXT:
+    -- The database is named 'pharma_data.db' and uses the {sql_engine.dialect} dialect.
+    {DIALECT_NOTES.get(sql_engine.name, "")}
+
+    -- SCHEMA DEFINITION:
+    {schema}
+    """
+
+
+def refresh_entity_index(data_version: int | None = None) -> EntityIndex:
     """
+    (Re)builds the in-memory name index over the ENTITY_SOURCES dimensions
+    for the current data, unless it is already up to date.
+    """
+    global entity_index
+    sql_engine = get_engine()
+    with _entity_index_lock:
+        if data_version is None:
+            data_version = sql_engine.data_version()
+        if entity_index is not None and entity_index.data_version == data_version:
+            return entity_index
+        start = time.perf_counter()
+        index = EntityIndex(data_version)
+        for kind, source in ENTITY_SOURCES.items():
+            try:
+                result = sql_engine.execute(source["sql"], False, QUERY_TIMEOUT_SECONDS, QUERY_MAX_VM_STEPS,
+                                            ENTITY_INDEX_MAX_ROWS, None)
+            except Exception as e:
+                print(f"⚠️ Entity index: could not read {source['table']}: {e}")
+                continue
+            for entity_id, name in result.rows:
+                index.add(kind, entity_id, name)
+        entity_index = index
+    print(f"✅ Entity index: {len(index)} names in {time.perf_counter() - start:.2f}s (data version {data_version})")
+    return index
+
+
+def _refresh_stale_entity_index(data_version: int):
+    # Called from execute_sql when the data changed; never fails the query itself,
+    # and a rebuild already running elsewhere isn't waited for
+    if _entity_index_lock.locked():
+        return
+    try:
+        refresh_entity_index(data_version)
+    except Exception as e:
+        print(f"⚠️ Entity index: rebuild failed: {e}")
+
+
+def resolve_entities(user_question: str) -> list[dict]:
+    """The dimension names mentioned in the question with their IDs (see EntityIndex.resolve)."""
+    if not ENTITY_RESOLUTION or entity_index is None:
+        return []
+    matches = entity_index.resolve(user_question)
+    for match in matches:
+        pipeline_metrics.inc("entity_matches_total", kind=match["kind"])
+    return matches
+
+
+def build_sql_messages(user_question: str, prune_schema: bool = PRUNE_SCHEMA, entities: list[dict] | None = None) -> list[dict]:
+    """
+    Builds the chat messages used to generate the SQL query: the static
+    system message first and the question as a small user message. With
+    prune_schema the schema only covers the tables select_tables picks for
+    the question (falling back to the full schema if nothing or no fact
+    table matched); retries after a failed attempt always use the full one.
+    Resolved `entities` (resolve_entities) are listed under the question
+    with their IDs, and their dimensions are kept in the pruned schema.
+    """
+    entities = entities or []
+    tables = select_tables(user_question, [match["table"] for match in entities]) if prune_schema else None
+    system_prompt = build_sql_system_prompt(tuple(tables) if tables else None)
+    content = f"{user_question}\n\n{format_entity_hints(entities)}" if entities else user_question
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": content},
+    ]
+
+
+def new_token_usage() -> dict:
+    """Empty per-request token counters, filled in by add_token_usage."""
+    return {"llm_calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+
+def add_token_usage(totals: dict | None, usage) -> None:
+    """Adds the `usage` of a chat.completions response (or final stream chunk) to `totals`."""
+    if totals is None or usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    totals["llm_calls"] += 1
+    totals["prompt_tokens"] += usage.prompt_tokens or 0
+    totals["cached_tokens"] += getattr(details, "cached_tokens", None) or 0
+    totals["completion_tokens"] += usage.completion_tokens or 0
+    totals["total_tokens"] += usage.total_tokens or 0
+
+
+def merge_token_usage(totals: dict | None, other: dict) -> None:
+    """Adds the counters of another new_token_usage() dict to `totals`."""
+    if totals is None:
+        return
+    for key, value in other.items():
+        totals[key] += value
 
 
 def parse_response(text: str):
@@ -76,151 +474,885 @@ def parse_response(text: str):
     }
 
 
-def generate_sql_query(messages: list = [], max_retry: int = 3) -> dict | None:
-    """Generates a SQL query from the user question using the LLM with retry logic."""
-    retry_count = 0
-    while retry_count < max_retry:
-        try:
-            response = client.chat.completions.create(
-                model=GPT_MODEL,
-                messages=messages,
-                temperature=0.0
-            )
-            response = response.choices[0].message.content.strip()
-            parsed = parse_response(response)
-            return parsed
-        except Exception:
-            retry_count += 1
-    
-    print(f"Failed to generate valid SQL after {max_retry} retries.")
-    return {}
+def generate_sql_query(messages: list, usage: dict | None = None, temperature: float = 0.0) -> dict:
+    """
+    Generates a SQL query from the chat messages with a single LLM call.
+    Token usage is added to `usage` when given. API errors propagate and a
+    reply without <explanation>/<sql> tags raises ValueError; retrying is
+    up to the caller's RetryController.
+    """
+    response = get_client().chat.completions.create(
+        model=GPT_MODEL,
+        messages=messages,
+        temperature=temperature
+    )
+    add_token_usage(usage, response.usage)
+    return parse_response(response.choices[0].message.content.strip())
 
 
-def generate_final_answer(question: str, sql_query: str, sql_result: str) -> str:
-    """Translates the raw SQL result into a natural language answer."""
-    prompt = f"""
+async def agenerate_sql_query(messages: list, usage: dict | None = None, temperature: float = 0.0) -> dict:
+    """Async variant of generate_sql_query using the AsyncOpenAI client."""
+    response = await get_async_client().chat.completions.create(
+        model=GPT_MODEL,
+        messages=messages,
+        temperature=temperature
+    )
+    add_token_usage(usage, response.usage)
+    return parse_response(response.choices[0].message.content.strip())
+
+
+FINAL_ANSWER_SYSTEM_PROMPT = """
     You are a friendly, concise data analyst.
-    The user asked the question: "{question}"
-    The SQL query executed was: "{sql_query}"
-    The raw result from the database was: "{sql_result}"
-    
-    Please provide the final answer in a single, concise, human-readable sentence. 
+    You are given a user's question, the SQL query that was executed and a summary of its result.
+    Please provide the final answer in a single, concise, human-readable sentence.
     If the result is an empty set, state that no data was found.
     """
-    
+
+
+def build_final_answer_messages(question: str, sql_query: str, sql_result: QueryResult) -> list[dict]:
+    """Builds the messages used to phrase the SQL result as an answer."""
+    return [
+        {"role": "system", "content": FINAL_ANSWER_SYSTEM_PROMPT},
+        {"role": "user", "content": f"""
+    The user asked the question: "{question}"
+    The SQL query executed was: "{sql_query}"
+    A summary of the result from the database was:
+    {sql_result.summary()}
+    """},
+    ]
+
+
+def generate_final_answer(question: str, sql_query: str, sql_result: QueryResult, usage: dict | None = None) -> str:
+    """Translates the raw SQL result into a natural language answer."""
+    messages = build_final_answer_messages(question, sql_query, sql_result)
+
     # Simple single-attempt LLM call for translation
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
+            model=GPT_MODEL,
+            messages=messages,
+            temperature=0.0
+        )
+        add_token_usage(usage, response.usage)
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        return f"Error translating result: {e}"
+
+
+async def agenerate_final_answer(question: str, sql_query: str, sql_result: QueryResult, usage: dict | None = None) -> str:
+    """Async variant of generate_final_answer."""
+    messages = build_final_answer_messages(question, sql_query, sql_result)
+    try:
+        response = await get_async_client().chat.completions.create(
             model=GPT_MODEL,
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
+            messages=messages,
             temperature=0.0
         )
+        add_token_usage(usage, response.usage)
         return response.choices[0].message.content.strip()
     except Exception as e:
         return f"Error translating result: {e}"
 
 
-def execute_sql(sql_query: str) -> str:
-    """Executes the SQL query against the SQLite database and formats the result."""
-    conn = None
+async def astream_final_answer(question: str, sql_query: str, sql_result: QueryResult, usage: dict | None = None):
+    """
+    Streams the final answer token by token (stream=True), yielding text deltas.
+    The usage sent with the last chunk is added to `usage` when given.
+    """
+    messages = build_final_answer_messages(question, sql_query, sql_result)
     try:
-        # Connect to the database
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute(sql_query)
-        
-        # Fetch results
-        rows = cursor.fetchall()
-        column_names = [description[0] for description in cursor.description]
-        
-        if not rows:
-            return "[]" # Return an empty JSON string for no data
-            
-        # Format results as a list of dictionaries (JSON format)
-        result_list = []
-        for row in rows:
-            result_list.append(dict(zip(column_names, row)))
-            
-        # Use json.dumps to handle complex types and structure for LLM context
-        return json.dumps(result_list, indent=2)
-
-    except sqlite3.OperationalError as e:
+        stream = await get_async_client().chat.completions.create(
+            model=GPT_MODEL,
+            messages=messages,
+            temperature=0.0,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            add_token_usage(usage, getattr(chunk, "usage", None))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        yield f"Error translating result: {e}"
+
+
+def execute_sql(sql_query: str, use_cache: bool = True, validate: bool = True,
+                timeout: float = QUERY_TIMEOUT_SECONDS, max_steps: int = QUERY_MAX_VM_STEPS,
+                max_rows: int = MAX_RESULT_ROWS, cancel_event: threading.Event | None = None,
+                trace: RequestTrace | None = None) -> QueryResult:
+    """
+    Executes the SQL query on the configured engine (SQLite by default) and
+    returns the columns and row tuples, keeping at most `max_rows` rows.
+    Successful results are served from / stored in the result cache.
+    Unless validate=False, the SQL is validated first so unsafe or runaway
+    queries are rejected before any work is done.
+
+    Execution is aborted once it runs longer than `timeout` seconds, uses
+    more than `max_steps` SQLite VM instructions or `cancel_event` is set;
+    this comes back as a TIMEOUT_ERROR result.
+
+    With `trace`, the call is recorded as an "execute_sql" span with the
+    rows returned and the estimated size of the result serialized as JSON.
+    """
+    if trace is None:
+        return _execute_shared(sql_query, use_cache, validate, timeout, max_steps, max_rows, cancel_event)
+
+    with trace.span("execute_sql") as span:
+        result = _execute_shared(sql_query, use_cache, validate, timeout, max_steps, max_rows, cancel_event)
+        span["rows"] = result.row_count
+        # Sampled, so large and cached results don't pay for a full serialization
+        span["bytes"] = result.estimated_bytes()
+        if result.error:
+            span["error"] = result.error_type
+    pipeline_metrics.inc("sql_rows_total", span["rows"])
+    pipeline_metrics.inc("sql_result_bytes_total", span["bytes"])
+    return result
+
+
+def _execute_shared(sql_query: str, use_cache: bool, validate: bool, timeout: float, max_steps: int,
+                    max_rows: int, cancel_event: threading.Event | None) -> QueryResult:
+    """
+    Runs _execute_sql, unless the same SQL (after normalize_sql) is already
+    running in another thread; then that execution's result is shared. Calls
+    that bypass the result cache or can be cancelled always run on their own.
+    """
+    if not use_cache or cancel_event is not None:
+        return _execute_sql(sql_query, use_cache, validate, timeout, max_steps, max_rows, cancel_event)
+
+    key = (normalize_sql(sql_query), validate, max_rows)
+    with _inflight_lock:
+        future = _inflight_sql.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight_sql[key] = Future()
+    if not leader:
+        pipeline_metrics.inc("sql_shared_total")
+        return future.result()
+
+    try:
+        result = _execute_sql(sql_query, use_cache, validate, timeout, max_steps, max_rows, cancel_event)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight_sql[key]
+
+
+def _execute_sql(sql_query: str, use_cache: bool, validate: bool, timeout: float, max_steps: int,
+                 max_rows: int, cancel_event: threading.Event | None) -> QueryResult:
+    sql_engine = get_engine()
+    try:
+        data_version = sql_engine.data_version()
+        if entity_index is not None and entity_index.data_version != data_version:
+            _refresh_stale_entity_index(data_version)
+        if use_cache:
+            cached = result_cache.get(sql_query, data_version)
+            if cached is not None:
+                return cached
+
+        result = sql_engine.execute(sql_query, validate, timeout, max_steps, max_rows, cancel_event)
+        if use_cache:
+            result_cache.put(sql_query, data_version, result)
+        return result
+
+    except SQLValidationError as e:
+        # Rejected before execution; cheap to report back to the model
+        print(f"SQL Validation Error: {e}")
+        return QueryResult(error=f"VALIDATION_ERROR: {e}")
+
+    except QueryInterrupted as e:
+        # Stopped by the query budget: the query was too expensive
+        print(f"SQL Timeout: {e}")
+        return QueryResult(error=f"TIMEOUT_ERROR: {e}")
+
+    except sql_engine.errors as e:
         # This is a critical error (e.g., bad syntax, misspelled table/column)
         print(f"SQL Execution Error: {e}")
-        return f"SQL_ERROR: {e}"
-        
+        return QueryResult(error=f"SQL_ERROR: {e}")
+
     except Exception as e:
         print(f"General Execution Error: {e}")
-        return f"GENERAL_ERROR: {e}"
-        
-    finally:
-        if conn:
-            conn.close()
+        return QueryResult(error=f"GENERAL_ERROR: {e}")
 
 
-def process_query(user_question: str) -> dict:
+async def aexecute_sql(sql_query: str, **kwargs) -> QueryResult:
+    """Runs execute_sql on the bounded SQL executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(sql_executor, functools.partial(execute_sql, sql_query, **kwargs))
+
+
+def execution_error(sql_result: QueryResult) -> str | None:
+    """Returns the retry feedback for a failed or empty execute_sql result, or None if it is usable."""
+    if sql_result.error_type == "TIMEOUT_ERROR":
+        return (f"The query was too expensive and was stopped ({sql_result.error.split(': ', 1)[1]}). "
+                "Write a cheaper query: filter on dates or keys early, aggregate before joining and avoid large joins.")
+    if sql_result.error_type == "VALIDATION_ERROR":
+        return f"The SQL was rejected before execution. The problem was: {sql_result.error.split(': ', 1)[1]}"
+    if sql_result.error:
+        return f"SQL generation was successful, but execution failed. The error was: {sql_result.error.split(': ', 1)[1]}"
+    if sql_result.is_empty:
+        return "No data found for the given query, try another query."
+    return None
+
+
+def _count_attempt_failure(reason: str):
+    """Counts a failed SQL generation attempt, e.g. reason="sql_error", "empty_result" or "rate_limit"."""
+    pipeline_metrics.inc("sql_attempt_failures_total", reason=reason)
+
+
+def _result_failure_reason(sql_result: QueryResult) -> str:
+    return (sql_result.error_type or "empty_result").lower()
+
+
+FORMAT_FEEDBACK = "The reply must contain <explanation>...</explanation> and <sql>...</sql> tags."
+
+
+def _candidate_temperature(index: int) -> float:
+    return CANDIDATE_TEMPERATURES[index % len(CANDIDATE_TEMPERATURES)]
+
+
+def _sql_candidate(messages: list, usage: dict, temperature: float, cancel_event: threading.Event,
+                   trace: RequestTrace | None = None):
+    with maybe_span(trace, "generate_sql", temperature=temperature):
+        generated = generate_sql_query(messages, usage=usage, temperature=temperature)
+    if cancel_event.is_set():
+        return generated, QueryResult(error="TIMEOUT_ERROR: query cancelled")
+    return generated, execute_sql(generated["sql"], cancel_event=cancel_event, trace=trace)
+
+
+def _count_late_tokens(counts: dict):
+    """Tokens of a losing candidate that replied after its request was answered."""
+    for kind in ("prompt", "cached", "completion"):
+        pipeline_metrics.inc("tokens_total", counts[f"{kind}_tokens"], kind=kind)
+
+
+def race_sql_candidates(messages: list, count: int, usage: dict | None = None, trace: RequestTrace | None = None):
     """
-    Processes a natural language query, generates SQL, executes it, and provides a final answer.
+    Requests `count` SQL candidates concurrently, at different temperatures,
+    and executes each one as soon as it arrives. Returns (generated, result,
+    failures): the first candidate whose result has rows and no error (or
+    None, None if there was none) and the (generated, error) pairs of the
+    candidates that failed before it. The remaining queries are cancelled
+    once a winner is found, without waiting for LLM requests already sent:
+    candidates finishing after the return don't touch `usage` any more and
+    their tokens only go to the tokens_total metric.
     """
-    messages = []
-    user_question = user_question.strip()
-    prompt = build_sql_prompt(user_question)
-    messages.append({"role": "user", "content": prompt})
+    cancel_event = threading.Event()
+    # Each candidate counts into its own dict, added to `usage` when it finishes
+    candidate_usage = [new_token_usage() for _ in range(count)]
+    usage_lock = threading.Lock()
+    counted = set()  # candidates whose tokens were added to usage or the metric
+    race = {"over": False}
 
-    final_answer = ""
-    sql_query = ""
-    sql_result = ""
-    explanation = ""
+    def count_usage(index: int) -> bool:
+        """Adds a finished candidate's tokens to `usage` while the race runs; False once it is over."""
+        with usage_lock:
+            if index in counted:
+                return True
+            counted.add(index)
+            if not race["over"]:
+                merge_token_usage(usage, candidate_usage[index])
+                return True
+        return False
 
+    def candidate_done(index: int, future: Future):
+        if not count_usage(index):
+            _count_late_tokens(candidate_usage[index])
 
-    for attempt in range(MAX_RETRIES):
-        print(f"Attempt {attempt + 1} of {MAX_RETRIES} to generate valid SQL query...")
-        generated_response = generate_sql_query(messages)
+    futures = [
+        candidate_executor.submit(_sql_candidate, messages, candidate_usage[i], _candidate_temperature(i), cancel_event, trace)
+        for i in range(count)
+    ]
+    for i, future in enumerate(futures):
+        future.add_done_callback(functools.partial(candidate_done, i))
+    failures = []
+    try:
+        for future in as_completed(futures):
+            try:
+                generated, result = future.result()
+            except Exception as e:
+                failures.append((None, e))
+                continue
+            error_message = execution_error(result)
+            if not error_message:
+                return generated, result, failures
+            _count_attempt_failure(_result_failure_reason(result))
+            failures.append((generated, error_message))
+        return None, None, failures
+    finally:
+        cancel_event.set()
+        for future in futures:
+            future.cancel()
+        # Done futures whose callbacks haven't run yet (e.g. the winner) still count here
+        for i, future in enumerate(futures):
+            if future.done():
+                count_usage(i)
+        with usage_lock:
+            race["over"] = True
 
-        sql_query = generated_response.get('sql')
-        explanation = generated_response.get('explanation')
-        error_message = None
 
-        if sql_query is None:
+async def _asql_candidate(messages: list, usage: dict, temperature: float, cancel_event: threading.Event,
+                         trace: RequestTrace | None = None, on_sql=None):
+    with maybe_span(trace, "generate_sql", temperature=temperature):
+        generated = await agenerate_sql_query(messages, usage=usage, temperature=temperature)
+    if on_sql is not None:
+        on_sql(generated["sql"], generated["explanation"])
+    return generated, await aexecute_sql(generated["sql"], cancel_event=cancel_event, trace=trace)
+
+
+async def arace_sql_candidates(messages: list, count: int, usage: dict | None = None, trace: RequestTrace | None = None,
+                               on_sql=None):
+    """
+    Async variant of race_sql_candidates; losing tasks are cancelled.
+    `on_sql(sql, explanation)` is called with every candidate before it runs.
+    """
+    cancel_event = threading.Event()
+    candidate_usage = [new_token_usage() for _ in range(count)]
+    tasks = [
+        asyncio.create_task(_asql_candidate(messages, candidate_usage[i], _candidate_temperature(i), cancel_event, trace, on_sql))
+        for i in range(count)
+    ]
+    for task in tasks:
+        # Errors of candidates that lose the race are not interesting
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    failures = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                generated, result = await next_done
+            except Exception as e:
+                failures.append((None, e))
+                continue
+            error_message = execution_error(result)
+            if not error_message:
+                return generated, result, failures
+            _count_attempt_failure(_result_failure_reason(result))
+            failures.append((generated, error_message))
+        return None, None, failures
+    finally:
+        cancel_event.set()
+        for task in tasks:
+            task.cancel()
+        # Once the cancellations are through, no candidate adds to its usage any more
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for counts in candidate_usage:
+            merge_token_usage(usage, counts)
+
+
+def _record_candidate_failures(controller: RetryController, failures: list, count: int):
+    """
+    Charges the `count` LLM requests of one race to the retry controller:
+    a backoff for every candidate that failed with an API error and an
+    attempt for all others, the winner and any losers still running
+    included. Feeds the failed candidates into the controller and returns
+    (last failed candidate, error_message, api_error), where api_error is
+    set when no candidate produced a reply because of an API error (or any
+    of them hit a non-retryable one).
+    """
+    last_generated, error_message, api_errors = None, None, []
+    for generated, error in failures:
+        if not isinstance(error, Exception):
+            controller.record_failure(generated["sql"], error)
+            last_generated, error_message = generated, error
+        elif classify_llm_error(error) == "format":
+            controller.record_failure(None, FORMAT_FEEDBACK)
             error_message = "Failed to generate valid SQL query."
+            _count_attempt_failure("format")
         else:
-            sql_result = execute_sql(sql_query)
-            if sql_result.startswith("SQL_ERROR") or sql_result.startswith("GENERAL_ERROR"):
-                error_message = f"SQL generation was successful, but execution failed. The error was: {sql_result.split(': ', 1)[1]}"
-            elif sql_result == "[]": # Check for exact empty array string
-                error_message = "No data found for the given query, try another query."
-            else:
-                # If no error and data found, break the retry loop
-                break
-        
-        # If an error occurred, append messages for retry and continue loop
-        if error_message:
-            messages.append({"role": "assistant", "content": generated_response})
-            messages.append({"role": "user", "content": f"The previous attempt resulted in an error: {error_message}. Please try again."})
-            print(f"Error encountered: {error_message}. Retrying...")
-            continue
+            api_errors.append(error)
+            _count_attempt_failure(classify_llm_error(error))
+    controller.attempts += count - len(api_errors)
+    controller.backoffs += len(api_errors)
 
-    if sql_query is None or error_message:
-        # If loop finished without success due to persistent errors or max retries
-        final_answer = "I was unable to generate a valid SQL query or execute it successfully. Please try rephrasing your question."
-        return {
-            "status": "failure",
-            "final_answer": final_answer,
-            "generated_sql": sql_query if sql_query else "N/A",
-            "sql_result": sql_result if sql_result else "N/A",
-            "model_used": GPT_MODEL,
-            "explanation": explanation if explanation else "N/A"
-        }
-
-    final_answer = generate_final_answer(user_question, sql_query, sql_result)
-    
+    fatal = [e for e in api_errors if classify_llm_error(e) == "fatal"]
+    if fatal:
+        return last_generated, error_message, fatal[0]
+    if api_errors and len(api_errors) == len(failures):
+        return last_generated, error_message, api_errors[0]
+    return last_generated, error_message, None
+
+
+def _failure_response(sql_query: str, sql_result: QueryResult | None, explanation: str, cache_match: str | None,
+                      usage: dict | None = None, attempts: int = 0) -> dict:
+    # If loop finished without success due to persistent errors or max retries
+    final_answer = "I was unable to generate a valid SQL query or execute it successfully. Please try rephrasing your question."
+    return {
+        "status": "failure",
+        "final_answer": final_answer,
+        "generated_sql": sql_query if sql_query else "N/A",
+        "sql_result": sql_result if sql_result else "N/A",
+        "model_used": GPT_MODEL,
+        "explanation": explanation if explanation else "N/A",
+        "question_cache": cache_match,
+        "attempts": attempts,
+        "token_usage": usage if usage is not None else new_token_usage()
+    }
+
+
+def _success_response(final_answer: str, sql_query: str, sql_result: QueryResult, explanation: str, cache_match: str | None,
+                      usage: dict | None = None, answer_source: str = "llm", attempts: int = 0) -> dict:
     return {
         "status": "success",
         "final_answer": final_answer,
         "generated_sql": sql_query,
         "sql_result": sql_result,
         "model_used": GPT_MODEL,
-        "explanation": explanation
+        "explanation": explanation,
+        "question_cache": cache_match,
+        "answer_source": answer_source,
+        "attempts": attempts,
+        "token_usage": usage if usage is not None else new_token_usage()
+    }
+
+
+def _templated_answer(user_question: str, sql_result: QueryResult) -> str | None:
+    """Returns the locally rendered answer, or None when the LLM has to phrase it."""
+    return render_answer(user_question, sql_result) if TEMPLATED_ANSWERS else None
+
+
+def _finish_request(trace: RequestTrace, response: dict) -> dict:
+    """Adds the per-request "timings" dict to the response and updates the pipeline metrics."""
+    response["timings"] = trace.timings()
+    pipeline_metrics.inc("requests_total", status=response["status"], answer_source=response.get("answer_source", "none"))
+    pipeline_metrics.observe("request_seconds", trace.elapsed)
+    pipeline_metrics.inc("sql_attempts_total", response["attempts"])
+    for kind in ("prompt", "cached", "completion"):
+        pipeline_metrics.inc("tokens_total", response["token_usage"][f"{kind}_tokens"], kind=kind)
+    return response
+
+
+def resolve_sql(user_question: str, trace: RequestTrace | None = None) -> dict:
+    """
+    Finds SQL that answers the question: from the question cache if possible,
+    otherwise by asking the LLM and retrying on errors or empty results.
+    Returns the sql_query, sql_result, explanation, error_message, cache_match,
+    the number of LLM attempts, the token usage of the LLM calls made and
+    the RequestTrace the stages were recorded in.
+    """
+    trace = trace or RequestTrace(pipeline_metrics)
+    with trace.span("prompt_build") as span:
+        entities = resolve_entities(user_question)
+        span["entities"] = len(entities)
+        messages = build_sql_messages(user_question, entities=entities)
+    pruned = PRUNE_SCHEMA
+    usage = new_token_usage()
+
+    sql_query = ""
+    sql_result = None
+    explanation = ""
+    error_message = None
+    cache_match = None
+
+    # Questions answered before go straight to execute_sql with their cached SQL
+    with trace.span("question_cache") as span:
+        cached = get_question_cache().lookup(user_question)
+        span["match"] = cached["match"] if cached else None
+    if cached:
+        print(f"Question cache hit ({cached['match']}): {cached['cached_question']}")
+        cached_result = execute_sql(cached["sql"], trace=trace)
+        if execution_error(cached_result):
+            # The cached SQL no longer answers the question; regenerate it
+            get_question_cache().invalidate(cached["cached_question"])
+        else:
+            sql_query = cached["sql"]
+            explanation = cached["explanation"]
+            sql_result = cached_result
+            cache_match = cached["match"]
+
+    controller = RetryController(SQL_RETRY_BUDGET, usage)
+    while cache_match is None:
+        stop_reason = controller.exhausted()
+        if stop_reason:
+            print(f"Giving up on SQL generation: {stop_reason}.")
+            error_message = error_message or f"Gave up: {stop_reason}."
+            break
+
+        # The pruned schema may have left out the table a failed attempt needed
+        if pruned and controller.last_error is not None:
+            messages = build_sql_messages(user_question, prune_schema=False, entities=entities)
+            pruned = False
+
+        if SQL_CANDIDATES > 1:
+            count = min(SQL_CANDIDATES, controller.remaining_calls)
+            print(f"Racing {count} SQL candidates ({controller.attempts} of {SQL_RETRY_BUDGET.max_calls} requests used)...")
+            generated_response, candidate_result, failures = race_sql_candidates(controller.messages(messages), count, usage, trace)
+            last_generated, error_message, api_error = _record_candidate_failures(controller, failures, count)
+            if last_generated is not None:
+                sql_query = last_generated['sql']
+                explanation = last_generated['explanation']
+            if generated_response is not None:
+                sql_query = generated_response['sql']
+                explanation = generated_response['explanation']
+                sql_result = candidate_result
+                error_message = None
+                get_question_cache().store(user_question, sql_query, explanation)
+                break
+            if api_error is not None:
+                error_class = classify_llm_error(api_error)
+                delay = controller.backoff_delay(api_error, counted=True) if error_class != "fatal" else None
+                if delay is None:
+                    print(f"LLM request failed: {api_error}")
+                    error_message = f"LLM request failed: {api_error}"
+                    break
+                print(f"LLM {error_class} error, retrying in {delay:.2f}s...")
+                time.sleep(delay)
+            continue
+
+        print(f"Attempt {controller.attempts + 1} of {SQL_RETRY_BUDGET.max_calls} to generate valid SQL query...")
+        try:
+            with trace.span("generate_sql", attempt=controller.attempts + controller.backoffs + 1):
+                generated_response = generate_sql_query(controller.messages(messages), usage=usage)
+        except Exception as e:
+            error_class = classify_llm_error(e)
+            _count_attempt_failure(error_class)
+            if error_class in ("rate_limit", "transient"):
+                delay = controller.backoff_delay(e)
+                if delay is None:
+                    error_message = f"LLM unavailable ({error_class}): {e}"
+                    break
+                print(f"LLM {error_class} error, retrying in {delay:.2f}s...")
+                time.sleep(delay)
+                continue
+            if error_class == "format":
+                # Corrective feedback right away, no point in waiting
+                controller.attempts += 1
+                error_message = "Failed to generate valid SQL query."
+                controller.record_failure(None, FORMAT_FEEDBACK)
+                continue
+            print(f"LLM request failed: {e}")
+            error_message = f"LLM request failed: {e}"
+            break
+
+        controller.attempts += 1
+        sql_query = generated_response['sql']
+        explanation = generated_response['explanation']
+        sql_result = execute_sql(sql_query, trace=trace)
+        error_message = execution_error(sql_result)
+        if not error_message:
+            # If no error and data found, remember the SQL and stop retrying
+            get_question_cache().store(user_question, sql_query, explanation)
+            break
+
+        # Only the latest SQL and its error are sent back to the model
+        controller.record_failure(sql_query, error_message)
+        _count_attempt_failure(_result_failure_reason(sql_result))
+        print(f"Error encountered: {error_message} Retrying...")
+
+    if cache_match is None:
+        attempt_stats.record(controller.attempts, error_message is None)
+
+    return {
+        "sql_query": sql_query,
+        "sql_result": sql_result,
+        "explanation": explanation,
+        "error_message": error_message,
+        "cache_match": cache_match,
+        "attempts": controller.attempts,
+        "token_usage": usage,
+        "trace": trace,
     }
+
+
+async def aresolve_sql(user_question: str, trace: RequestTrace | None = None, on_sql=None) -> dict:
+    """
+    Async variant of resolve_sql. `on_sql(sql, explanation, attempt)` is
+    called with every SQL query right before it is executed: the cached one
+    (attempt 0) and each generated one, so callers can show it early.
+    """
+    loop = asyncio.get_running_loop()
+    trace = trace or RequestTrace(pipeline_metrics)
+    with trace.span("prompt_build") as span:
+        entities = resolve_entities(user_question)
+        span["entities"] = len(entities)
+        messages = build_sql_messages(user_question, entities=entities)
+    pruned = PRUNE_SCHEMA
+    usage = new_token_usage()
+
+    sql_query = ""
+    sql_result = None
+    explanation = ""
+    error_message = None
+    cache_match = None
+
+    with trace.span("question_cache") as span:
+        cached = await loop.run_in_executor(sql_executor, get_question_cache().lookup, user_question)
+        span["match"] = cached["match"] if cached else None
+    if cached:
+        print(f"Question cache hit ({cached['match']}): {cached['cached_question']}")
+        if on_sql is not None:
+            on_sql(cached["sql"], cached["explanation"], 0)
+        cached_result = await aexecute_sql(cached["sql"], trace=trace)
+        if execution_error(cached_result):
+            await loop.run_in_executor(sql_executor, get_question_cache().invalidate, cached["cached_question"])
+        else:
+            sql_query = cached["sql"]
+            explanation = cached["explanation"]
+            sql_result = cached_result
+            cache_match = cached["match"]
+
+    controller = RetryController(SQL_RETRY_BUDGET, usage)
+    while cache_match is None:
+        stop_reason = controller.exhausted()
+        if stop_reason:
+            print(f"Giving up on SQL generation: {stop_reason}.")
+            error_message = error_message or f"Gave up: {stop_reason}."
+            break
+
+        # The pruned schema may have left out the table a failed attempt needed
+        if pruned and controller.last_error is not None:
+            messages = build_sql_messages(user_question, prune_schema=False, entities=entities)
+            pruned = False
+
+        if SQL_CANDIDATES > 1:
+            count = min(SQL_CANDIDATES, controller.remaining_calls)
+            print(f"Racing {count} SQL candidates ({controller.attempts} of {SQL_RETRY_BUDGET.max_calls} requests used)...")
+            candidate_sql = None
+            if on_sql is not None:
+                numbers = itertools.count(controller.attempts + 1)
+
+                def candidate_sql(sql, candidate_explanation):
+                    on_sql(sql, candidate_explanation, next(numbers))
+            generated_response, candidate_result, failures = await arace_sql_candidates(controller.messages(messages), count, usage, trace, candidate_sql)
+            last_generated, error_message, api_error = _record_candidate_failures(controller, failures, count)
+            if last_generated is not None:
+                sql_query = last_generated['sql']
+                explanation = last_generated['explanation']
+            if generated_response is not None:
+                sql_query = generated_response['sql']
+                explanation = generated_response['explanation']
+                sql_result = candidate_result
+                error_message = None
+                await loop.run_in_executor(sql_executor, get_question_cache().store, user_question, sql_query, explanation)
+                break
+            if api_error is not None:
+                error_class = classify_llm_error(api_error)
+                delay = controller.backoff_delay(api_error, counted=True) if error_class != "fatal" else None
+                if delay is None:
+                    print(f"LLM request failed: {api_error}")
+                    error_message = f"LLM request failed: {api_error}"
+                    break
+                print(f"LLM {error_class} error, retrying in {delay:.2f}s...")
+                await asyncio.sleep(delay)
+            continue
+
+        print(f"Attempt {controller.attempts + 1} of {SQL_RETRY_BUDGET.max_calls} to generate valid SQL query...")
+        try:
+            with trace.span("generate_sql", attempt=controller.attempts + controller.backoffs + 1):
+                generated_response = await agenerate_sql_query(controller.messages(messages), usage=usage)
+        except Exception as e:
+            error_class = classify_llm_error(e)
+            _count_attempt_failure(error_class)
+            if error_class in ("rate_limit", "transient"):
+                delay = controller.backoff_delay(e)
+                if delay is None:
+                    error_message = f"LLM unavailable ({error_class}): {e}"
+                    break
+                print(f"LLM {error_class} error, retrying in {delay:.2f}s...")
+                await asyncio.sleep(delay)
+                continue
+            if error_class == "format":
+                # Corrective feedback right away, no point in waiting
+                controller.attempts += 1
+                error_message = "Failed to generate valid SQL query."
+                controller.record_failure(None, FORMAT_FEEDBACK)
+                continue
+            print(f"LLM request failed: {e}")
+            error_message = f"LLM request failed: {e}"
+            break
+
+        controller.attempts += 1
+        sql_query = generated_response['sql']
+        explanation = generated_response['explanation']
+        if on_sql is not None:
+            on_sql(sql_query, explanation, controller.attempts)
+        sql_result = await aexecute_sql(sql_query, trace=trace)
+        error_message = execution_error(sql_result)
+        if not error_message:
+            # If no error and data found, remember the SQL and stop retrying
+            await loop.run_in_executor(sql_executor, get_question_cache().store, user_question, sql_query, explanation)
+            break
+
+        # Only the latest SQL and its error are sent back to the model
+        controller.record_failure(sql_query, error_message)
+        _count_attempt_failure(_result_failure_reason(sql_result))
+        print(f"Error encountered: {error_message} Retrying...")
+
+    if cache_match is None:
+        attempt_stats.record(controller.attempts, error_message is None)
+
+    return {
+        "sql_query": sql_query,
+        "sql_result": sql_result,
+        "explanation": explanation,
+        "error_message": error_message,
+        "cache_match": cache_match,
+        "attempts": controller.attempts,
+        "token_usage": usage,
+        "trace": trace,
+    }
+
+
+def process_query(user_question: str) -> dict:
+    """
+    Processes a natural language query, generates SQL, executes it, and provides a final answer.
+    The response's "timings" dict has the total and per-stage milliseconds and the spans.
+    """
+    if not _warmed_up:
+        warm_up()
+    trace = RequestTrace(pipeline_metrics)
+    user_question = user_question.strip()
+    resolved = resolve_sql(user_question, trace)
+    sql_query = resolved["sql_query"]
+    sql_result = resolved["sql_result"]
+    explanation = resolved["explanation"]
+    usage = resolved["token_usage"]
+
+    if sql_query is None or resolved["error_message"]:
+        return _finish_request(trace, _failure_response(sql_query, sql_result, explanation, resolved["cache_match"], usage, attempts=resolved["attempts"]))
+
+    with trace.span("final_answer") as span:
+        final_answer = _templated_answer(user_question, sql_result)
+        span["source"] = "template" if final_answer is not None else "llm"
+        if final_answer is None:
+            final_answer = generate_final_answer(user_question, sql_query, sql_result, usage)
+    return _finish_request(trace, _success_response(final_answer, sql_query, sql_result, explanation, resolved["cache_match"], usage, span["source"], attempts=resolved["attempts"]))
+
+
+async def aprocess_query(user_question: str) -> dict:
+    """
+    Async variant of process_query. LLM calls go through AsyncOpenAI and all
+    SQLite work runs on the bounded sql_executor, so one process can keep
+    many questions in flight.
+    """
+    await _awarm_up()
+    trace = RequestTrace(pipeline_metrics)
+    user_question = user_question.strip()
+    resolved = await aresolve_sql(user_question, trace)
+    sql_query = resolved["sql_query"]
+    sql_result = resolved["sql_result"]
+    explanation = resolved["explanation"]
+    usage = resolved["token_usage"]
+
+    if sql_query is None or resolved["error_message"]:
+        return _finish_request(trace, _failure_response(sql_query, sql_result, explanation, resolved["cache_match"], usage, attempts=resolved["attempts"]))
+
+    with trace.span("final_answer") as span:
+        final_answer = _templated_answer(user_question, sql_result)
+        span["source"] = "template" if final_answer is not None else "llm"
+        if final_answer is None:
+            final_answer = await agenerate_final_answer(user_question, sql_query, sql_result, usage)
+    return _finish_request(trace, _success_response(final_answer, sql_query, sql_result, explanation, resolved["cache_match"], usage, span["source"], attempts=resolved["attempts"]))
+
+
+async def astream_query(user_question: str):
+    """
+    Streaming variant of aprocess_query. Yields stage updates as they happen:
+
+    - {"stage": "sql", "generated_sql", "explanation", "attempt"} for every
+      SQL query before it runs (a retry or candidate follows a failed one),
+    - {"stage": "result", "generated_sql", "explanation", "sql_result"} with
+      the SQL that answered the question and its result,
+    - {"stage": "answer", "final_answer"} with the answer so far, once per streamed token batch,
+    - {"stage": "done", **response} with the same dict aprocess_query returns.
+    """
+    await _awarm_up()
+    trace = RequestTrace(pipeline_metrics)
+    user_question = user_question.strip()
+
+    # aresolve_sql runs as a task and hands every SQL query over before executing it
+    updates = asyncio.Queue()
+
+    def on_sql(sql_query, explanation, attempt):
+        updates.put_nowait({"stage": "sql", "generated_sql": sql_query, "explanation": explanation, "attempt": attempt})
+
+    resolving = asyncio.create_task(aresolve_sql(user_question, trace, on_sql=on_sql))
+    resolving.add_done_callback(lambda _: updates.put_nowait(None))
+    try:
+        while (update := await updates.get()) is not None:
+            yield update
+        resolved = await resolving
+    finally:
+        resolving.cancel()
+    sql_query = resolved["sql_query"]
+    sql_result = resolved["sql_result"]
+    explanation = resolved["explanation"]
+    usage = resolved["token_usage"]
+
+    if sql_query is None or resolved["error_message"]:
+        yield {"stage": "done", **_finish_request(trace, _failure_response(sql_query, sql_result, explanation, resolved["cache_match"], usage, attempts=resolved["attempts"]))}
+        return
+
+    yield {"stage": "result", "generated_sql": sql_query, "explanation": explanation, "sql_result": sql_result}
+
+    # The span covers the whole stream, including the time the caller takes to consume it
+    with trace.span("final_answer") as span:
+        final_answer = _templated_answer(user_question, sql_result)
+        span["source"] = "template" if final_answer is not None else "llm"
+        if final_answer is not None:
+            yield {"stage": "answer", "final_answer": final_answer}
+        else:
+            final_answer = ""
+            async for delta in astream_final_answer(user_question, sql_query, sql_result, usage):
+                final_answer += delta
+                yield {"stage": "answer", "final_answer": final_answer}
+            final_answer = final_answer.strip()
+
+    yield {"stage": "done", **_finish_request(trace, _success_response(final_answer, sql_query, sql_result, explanation, resolved["cache_match"], usage, span["source"], attempts=resolved["attempts"]))}
+
+
+def _batch_groups(questions: list[str]) -> list[list[int]]:
+    """Indexes of the questions grouped by normalized text, in order of first appearance."""
+    groups = {}
+    for index, question in enumerate(questions):
+        groups.setdefault(normalize_question(question), []).append(index)
+    return list(groups.values())
+
+
+def _batch_error_response(error: Exception) -> dict:
+    return {"status": "error", "final_answer": f"Error processing question: {error}"}
+
+
+def _batch_responses(indexes: list[int], response: dict):
+    """Yields (index, response) for every question of a group; duplicates point at the first one."""
+    yield indexes[0], response
+    for index in indexes[1:]:
+        yield index, {**response, "duplicate_of": indexes[0]}
+
+
+def process_queries(questions: list[str], concurrency: int = BATCH_CONCURRENCY):
+    """
+    Answers a batch of questions with at most `concurrency` of them (and so
+    of their LLM calls) in flight, yielding (index, response) pairs as they
+    complete. Identical questions are answered once and carry "duplicate_of"
+    with the index of the first. All questions share the cached system
+    prompts, the connection pool, the question and result caches and any
+    identical SQL that is running at the same time.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+        futures = {pool.submit(process_query, questions[group[0]]): group for group in _batch_groups(questions)}
+        for future in as_completed(futures):
+            try:
+                response = future.result()
+            except Exception as e:
+                response = _batch_error_response(e)
+            yield from _batch_responses(futures[future], response)
+
+
+async def aprocess_queries(questions: list[str], concurrency: int = BATCH_CONCURRENCY):
+    """Async variant of process_queries, built on aprocess_query."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(group: list[int]):
+        async with semaphore:
+            try:
+                return group, await aprocess_query(questions[group[0]])
+            except Exception as e:
+                return group, _batch_error_response(e)
+
+    for next_done in asyncio.as_completed([answer(group) for group in _batch_groups(questions)]):
+        group, response = await next_done
+        for item in _batch_responses(group, response):
+            yield item
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from backend_app import aprocess_queries, pipeline_metrics, warm_up
+from query_result import QueryResult
+
+
+def read_questions(path: str) -> list[dict]:
+    """
+    Reads a JSONL file of questions: one {"question": ..., ...} object or a
+    bare JSON string per line. Extra keys (e.g. "id") are copied to the result.
+    """
+    items = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            if not isinstance(item, dict) or not str(item.get("question", "")).strip():
+                raise ValueError(f"{path}:{line_number}: expected a question string or an object with a \"question\"")
+            items.append(item)
+    return items
+
+
+def to_jsonable(response: dict, spans: bool = False) -> dict:
+    """A process_query response as plain JSON types; the timing spans are dropped unless `spans`."""
+    record = {}
+    for key, value in response.items():
+        if isinstance(value, QueryResult):
+            value = value.to_dict()
+        elif key == "timings" and not spans:
+            value = {name: ms for name, ms in value.items() if name != "spans"}
+        record[key] = value
+    return record
+
+
+async def run_batch(items: list[dict], output_path: str, concurrency: int, spans: bool = False) -> dict:
+    """Answers the questions and appends one JSON line per question to `output_path` as each completes."""
+    questions = [str(item["question"]) for item in items]
+    summary = {"questions": len(questions), "duplicates": 0, "failures": 0, "llm_calls": 0, "total_tokens": 0}
+    shared_before = pipeline_metrics.snapshot()["counters"].get("sql_shared_total", 0)
+    start = time.perf_counter()
+    with open(output_path, "w") as out:
+        async for index, response in aprocess_queries(questions, concurrency):
+            record = {**items[index], "index": index, **to_jsonable(response, spans)}
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+            if "duplicate_of" in response:
+                summary["duplicates"] += 1
+                continue
+            if response["status"] != "success":
+                summary["failures"] += 1
+            usage = response.get("token_usage") or {}
+            summary["llm_calls"] += usage.get("llm_calls", 0)
+            summary["total_tokens"] += usage.get("total_tokens", 0)
+
+    summary["seconds"] = time.perf_counter() - start
+    summary["questions_per_minute"] = len(questions) / summary["seconds"] * 60 if summary["seconds"] else 0.0
+    summary["shared_sql"] = pipeline_metrics.snapshot()["counters"].get("sql_shared_total", 0) - shared_before
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions and write the answers as JSONL.")
+    parser.add_argument("input", help="JSONL file with one question per line.")
+    parser.add_argument("-o", "--output", help="JSONL file to write the results to (default: <input>.results.jsonl).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Questions (and LLM calls) in flight at once.")
+    parser.add_argument("--spans", action="store_true", help="Include the timing spans of each question.")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    items = read_questions(args.input)
+    warm_up()  # before the clock starts
+    print(f"Answering {len(items)} questions with concurrency {args.concurrency}...")
+    summary = asyncio.run(run_batch(items, output, args.concurrency, args.spans))
+
+    print(f"\n✅ Wrote {summary['questions']} results to '{output}'.")
+    print(f"   {summary['questions'] - summary['duplicates']} unique questions, {summary['duplicates']} duplicates, "
+          f"{summary['failures']} failures, {summary['shared_sql']} shared SQL executions.")
+    print(f"   {summary['llm_calls']} LLM calls, {summary['total_tokens']:,} tokens.")
+    print(f"   {summary['seconds']:.1f}s total, {summary['questions_per_minute']:.1f} questions/minute.")
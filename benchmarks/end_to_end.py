@@ -0,0 +1,177 @@
+"""
+End-to-end benchmark of process_query against a local mock LLM.
+
+    python -m benchmarks.end_to_end                         # 10x data, concurrency 1 4 16
+    python -m benchmarks.end_to_end --scale 100 --concurrency 1 8 --llm-latency 0.5
+
+The data is scaled with data_scaler.scale_data into a temporary directory,
+which becomes the working directory, so backend_app.warm_up() loads it into
+a fresh pharma_data.db. benchmarks/mock_openai.py runs in a subprocess
+and answers every question of benchmarks/corpus.jsonl with fixed SQL, so
+timings cover the pipeline itself plus the simulated LLM latency.
+
+Each concurrency level sends the corpus `--rounds` times through a thread
+pool and reports throughput, per-stage latency percentiles (prompt build,
+SQL generation LLM calls, SQL execution, answer), and peak RSS. The
+question and result caches are disabled unless --cache is given, so every
+question goes through all stages. Stage timings are taken from the
+"timings" dict of each response.
+"""
+
+import argparse
+import contextlib
+import os
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from csv_to_sqlite import data_dir
+from data_scaler import scale_data
+from benchmarks.mock_openai import CORPUS_FILE, load_corpus
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stages reported from the "timings" dict of the responses
+STAGES = ["prompt", "llm", "sql", "answer"]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_mock_server(port: int, latency: float, token_latency: float, corpus: str) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_openai", "--port", str(port), "--latency", str(latency),
+         "--token-latency", str(token_latency), "--corpus", corpus],
+        cwd=REPO_DIR, stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("The mock OpenAI server did not start")
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def _percentile(values: list[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def run_level(backend_app, questions: list[str], concurrency: int) -> dict:
+    """Sends all questions through `concurrency` threads and summarizes the timings."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        responses = list(pool.map(backend_app.process_query, questions))
+    wall = time.perf_counter() - start
+
+    stages = {}
+    for stage in STAGES + ["total"]:
+        values = [response["timings"].get(f"{stage}_ms", 0.0) for response in responses]
+        stages[stage] = {"p50": _percentile(values, 50), "p95": _percentile(values, 95), "max": max(values)}
+    return {
+        "questions": len(questions),
+        "failures": sum(response["status"] != "success" for response in responses),
+        "llm_calls": sum(response["token_usage"]["llm_calls"] for response in responses),
+        "seconds": wall,
+        "throughput": len(questions) / wall,
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=10, help="data scale factor")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the corpus per concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="mock seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="mock seconds between streamed chunks")
+    parser.add_argument("--engine", choices=["sqlite", "duckdb"], default="sqlite")
+    parser.add_argument("--cache", action="store_true", help="keep the question and result caches enabled")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report the peak Python heap (slower)")
+    parser.add_argument("--corpus", default=CORPUS_FILE)
+    parser.add_argument("--data-dir", default=os.path.abspath(data_dir))
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own log output")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    questions = [entry["question"] for entry in corpus]
+    work_dir = tempfile.mkdtemp(prefix="e2e_bench_")
+    port = _free_port()
+    mock = _start_mock_server(port, args.llm_latency, args.token_latency, os.path.abspath(args.corpus))
+    log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    cwd = os.getcwd()
+    try:
+        counts = scale_data(args.data_dir, os.path.join(work_dir, "data"), args.scale)
+        print(f"Data: {args.scale}x, {sum(counts.values()):,} rows; engine: {args.engine}; "
+              f"mock LLM latency {args.llm_latency:g}s; caches {'on' if args.cache else 'off'}")
+
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+        os.environ["OPENAI_API_KEY"] = "mock"
+        os.environ["SQL_ENGINE"] = args.engine
+        os.chdir(work_dir)
+
+        start = time.perf_counter()
+        with log:
+            import backend_app
+            backend_app.warm_up()  # loads the scaled data
+        print(f"Import + load: {time.perf_counter() - start:.2f}s, peak RSS {_peak_rss_mb():.0f} MB\n")
+
+        if not args.cache:
+            from question_cache import QuestionCache
+            from result_cache import QueryResultCache
+            backend_app.question_cache = QuestionCache(os.path.join(work_dir, "bench_question_cache.db"), max_entries=0)
+            backend_app.result_cache = QueryResultCache(max_entries=0)
+
+        with log:
+            # Warm-up pass: pooled connections, prompt cache, HTTP keep-alive
+            run_level(backend_app, questions, 1)
+        if args.tracemalloc:
+            tracemalloc.start()
+
+        header = f"{'conc':>4} {'q/s':>7} {'fail':>4} {'llm/q':>5}"
+        for stage in STAGES + ["total"]:
+            header += f" {stage + ' p50':>11} {stage + ' p95':>11}"
+        header += f" {'peak RSS':>9}" + (f" {'py heap':>8}" if args.tracemalloc else "")
+        print(header)
+
+        for concurrency in args.concurrency:
+            if args.tracemalloc:
+                tracemalloc.reset_peak()
+            with log:
+                level = run_level(backend_app, questions * args.rounds, concurrency)
+            line = f"{concurrency:>4} {level['throughput']:>7.2f} {level['failures']:>4} {level['llm_calls'] / level['questions']:>5.2f}"
+            for stage in STAGES + ["total"]:
+                line += f" {level['stages'][stage]['p50']:>8.1f} ms {level['stages'][stage]['p95']:>8.1f} ms"
+            line += f" {_peak_rss_mb():>6.0f} MB"
+            if args.tracemalloc:
+                line += f" {tracemalloc.get_traced_memory()[1] / 2**20:>5.0f} MB"
+            print(line)
+    finally:
+        os.chdir(cwd)
+        mock.terminate()
+        mock.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Runs the same analytical query set on the SQLite and DuckDB engines at
+several synthetic data scales.
+
+    python -m benchmarks.engines                   # 1x, 10x, 100x
+    python -m benchmarks.engines --scales 1 10 --repeat 5
+
+Scaled data is written by data_scaler.scale_data (more HCPs, accounts and
+reps with their fact rows, all foreign keys intact) into a temporary
+directory, which is loaded into a fresh SQLite file by the regular loader
+and into DuckDB by DuckDBEngine. Queries go straight to the
+engines, bypassing the result cache. Needs the duckdb package.
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from connection_pool import SQLiteConnectionPool
+from csv_to_sqlite import data_dir, load_csv_to_sqlite
+from data_scaler import scale_data
+from sql_engines import SQLiteEngine, DuckDBEngine
+
+QUERIES = {
+    "trx_by_territory_quarter": """
+        SELECT t.name, d.year, d.quarter, SUM(r.trx_cnt) AS trx
+        FROM fact_rx r
+        JOIN hcp_dim h ON r.hcp_id = h.hcp_id
+        JOIN territory_dim t ON h.territory_id = t.territory_id
+        JOIN date_dim d ON r.date_id = d.date_id
+        GROUP BY t.name, d.year, d.quarter
+    """,
+    "top_hcps_nrx_2024": """
+        SELECT h.full_name, SUM(r.nrx_cnt) AS nrx
+        FROM fact_rx r
+        JOIN hcp_dim h ON r.hcp_id = h.hcp_id
+        JOIN date_dim d ON r.date_id = d.date_id
+        WHERE d.year = 2024
+        GROUP BY h.full_name
+        ORDER BY nrx DESC
+        LIMIT 10
+    """,
+    "calls_by_rep_status": """
+        SELECT a.rep_id, a.status, COUNT(*) AS calls, AVG(a.duration_min) AS avg_min
+        FROM fact_rep_activity a
+        GROUP BY a.rep_id, a.status
+    """,
+    "activity_by_specialty_month": """
+        SELECT h.specialty, substr(d.calendar_date, 1, 7) AS month, COUNT(*) AS activities
+        FROM fact_rep_activity a
+        JOIN hcp_dim h ON a.hcp_id = h.hcp_id
+        JOIN date_dim d ON a.date_id = d.date_id
+        GROUP BY h.specialty, month
+    """,
+    "payor_mix_by_territory": """
+        SELECT ac.territory_id, p.payor_type, AVG(p.pct_of_volume) AS pct
+        FROM fact_payor_mix p
+        JOIN account_dim ac ON p.account_id = ac.account_id
+        GROUP BY ac.territory_id, p.payor_type
+    """,
+}
+
+
+def _time_query(engine, sql_query: str, repeat: int) -> float:
+    """Median wall time in ms over `repeat` runs, after one warm-up run."""
+    engine.execute(sql_query, False, 600.0, 10**12, 10_000, None)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine.execute(sql_query, False, 600.0, 10**12, 10_000, None)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per query")
+    parser.add_argument("--data-dir", default=data_dir)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="engine_bench_")
+    try:
+        print(f"{'scale':>5} {'query':<30} {'sqlite ms':>10} {'duckdb ms':>10} {'speedup':>8}")
+        for factor in args.scales:
+            scaled_dir = os.path.join(work_dir, f"x{factor}")
+            scale_data(args.data_dir, scaled_dir, factor)
+
+            db_path = os.path.join(work_dir, f"x{factor}.db")
+            load_csv_to_sqlite(db_path, scaled_dir)
+            sqlite_engine = SQLiteEngine(SQLiteConnectionPool(db_path, max_size=1))
+            duckdb_engine = DuckDBEngine(scaled_dir)
+
+            for name, sql_query in QUERIES.items():
+                sqlite_ms = _time_query(sqlite_engine, sql_query, args.repeat)
+                duckdb_ms = _time_query(duckdb_engine, sql_query, args.repeat)
+                print(f"{factor:>4}x {name:<30} {sqlite_ms:>10.1f} {duckdb_ms:>10.1f} {sqlite_ms / duckdb_ms:>7.1f}x")
+
+            sqlite_engine.close()
+            duckdb_engine.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
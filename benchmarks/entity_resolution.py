@@ -0,0 +1,117 @@
+"""
+Benchmarks the entity-name resolver on the dimension names of the data.
+
+    python -m benchmarks.entity_resolution
+    python -m benchmarks.entity_resolution --scale 100 --typos 2
+
+For every HCP, account, rep and territory name it asks a question that
+mentions the name as is and with --typos letters swapped, replaced or
+dropped, and checks that the name resolves to the right dimension row.
+On the questions of benchmarks/corpus.jsonl and benchmarks/schema_pruning.py,
+any name that resolves without appearing in the question is a false
+positive. Index build time and per-question lookup latency are reported at
+--scale times the data (names repeat across scaled copies, so the index
+grows in IDs, not in names).
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+import pandas as pd
+
+from csv_to_sqlite import data_dir
+from entity_resolver import EntityIndex, ENTITY_SOURCES
+from benchmarks.mock_openai import load_corpus
+from benchmarks.schema_pruning import QUESTIONS
+
+# Question templates the names are dropped into, per dimension
+TEMPLATES = {
+    "hcp": "What was the total NRx for {} in 2024?",
+    "account": "How many calls were made at {} last quarter?",
+    "rep": "How many completed calls did {} make?",
+    "territory": "Top 5 HCPs by TRx in {}",
+}
+
+
+def _read_names(path: str) -> dict:
+    """(id, name) pairs per ENTITY_SOURCES kind, read from the CSVs."""
+    names = {}
+    for kind, source in ENTITY_SOURCES.items():
+        df = pd.read_csv(os.path.join(path, f"{source['table']}.csv"))
+        if kind == "rep":
+            labels = df["first_name"] + " " + df["last_name"]
+        else:
+            labels = df[source["name_sql"]]
+        names[kind] = list(zip(df[source["id_column"]], labels))
+    return names
+
+
+def _misspell(name: str, typos: int, rng: random.Random) -> str:
+    """Applies `typos` random letter edits to the words after any title."""
+    chars = list(name)
+    start = name.index(" ") + 1 if name.lower().startswith("dr ") else 0
+    for _ in range(typos):
+        letters = [i for i in range(start, len(chars)) if chars[i].isalpha()]
+        i = rng.choice(letters)
+        edit = rng.choice(["swap", "replace", "drop"])
+        if edit == "swap" and i + 1 < len(chars) and chars[i + 1].isalpha():
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        elif edit == "replace":
+            chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+        else:
+            del chars[i]
+    return "".join(chars)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=10, help="copies of every name row in the index")
+    parser.add_argument("--typos", type=int, default=1, help="letter edits per misspelled mention")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=data_dir)
+    args = parser.parse_args()
+
+    names = _read_names(args.data_dir)
+    start = time.perf_counter()
+    index = EntityIndex()
+    for copy in range(args.scale):
+        for kind, rows in names.items():
+            for entity_id, name in rows:
+                index.add(kind, (copy, entity_id), name)
+    build_ms = (time.perf_counter() - start) * 1000
+    rows = sum(len(kind_rows) for kind_rows in names.values()) * args.scale
+    print(f"Index: {len(index)} names, {rows:,} rows, built in {build_ms:.1f} ms\n")
+
+    rng = random.Random(args.seed)
+    print(f"{'mentions':<12} {'questions':>9} {'resolved':>9} {'wrong':>6} {'p50 us':>7} {'p95 us':>7}")
+    for label, typos in [("exact", 0), (f"{args.typos} typo(s)", args.typos)]:
+        resolved = wrong = 0
+        latencies = []
+        questions = 0
+        for kind, rows in names.items():
+            for entity_id, name in rows:
+                mention = _misspell(name, typos, rng) if typos else name
+                start = time.perf_counter()
+                matches = index.resolve(TEMPLATES[kind].format(mention))
+                latencies.append((time.perf_counter() - start) * 1e6)
+                questions += 1
+                hits = [match for match in matches if match["kind"] == kind and (0, entity_id) in match["ids"]]
+                resolved += bool(hits)
+                wrong += bool(matches and not hits)
+        print(f"{label:<12} {questions:>9} {resolved / questions:>8.0%} {wrong:>6} "
+              f"{statistics.median(latencies):>7.0f} {statistics.quantiles(latencies, n=20)[-1]:>7.0f}")
+
+    plain = QUESTIONS + [entry["question"] for entry in load_corpus()]
+    false_positives = [(question, match["name"]) for question in plain for match in index.resolve(question)]
+    # Questions that name someone on purpose are expected to resolve
+    false_positives = [(question, name) for question, name in false_positives if name.lower() not in question.lower()]
+    print(f"\nFalse positives on {len(plain)} questions without misspelled names: {len(false_positives)}")
+    for question, name in false_positives:
+        print(f"  {question!r} -> {name!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+A local stand-in for the OpenAI chat completions endpoint, answering from a
+fixed question -> SQL corpus so the pipeline can be benchmarked without
+network calls, cost or model variance.
+
+    python -m benchmarks.mock_openai --port 8000 --latency 0.3
+    export OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=mock
+
+SQL generation requests (the system message is the SQL prompt) are matched
+on the question in the first user message (without the resolved entity
+lines backend_app appends to it) and answered with the corpus
+entry's <explanation>/<sql>; unknown questions get FALLBACK_SQL. Any other
+request gets a canned one-sentence answer. Streaming (with include_usage)
+is supported. `latency` is added before the first token and
+`token_latency` between streamed chunks.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CORPUS_FILE = os.path.join(os.path.dirname(__file__), "corpus.jsonl")
+SQL_PROMPT_MARKER = "SQL Expert"
+FALLBACK_SQL = "SELECT COUNT(*) AS hcp_cnt FROM hcp_dim;"
+ANSWER_TEXT = "Based on the query result, here is the answer to your question."
+
+
+def load_corpus(path: str = CORPUS_FILE) -> list[dict]:
+    """Reads the {"question", "explanation", "sql"} lines of a JSONL corpus."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _key(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+def _count_tokens(text: str) -> int:
+    return max(len(text) // 4, 1)
+
+
+class MockOpenAIServer:
+    """Threaded HTTP server serving /v1/chat/completions from the corpus."""
+
+    def __init__(self, corpus: list[dict] | None = None, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, token_latency: float = 0.0):
+        self.answers = {_key(entry["question"]): entry for entry in (corpus if corpus is not None else load_corpus())}
+        self.latency = latency
+        self.token_latency = token_latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reply(self, messages: list[dict]) -> str:
+        """The assistant message for a chat request."""
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        if SQL_PROMPT_MARKER not in system:
+            return ANSWER_TEXT
+        question = next((m["content"] for m in messages if m["role"] == "user"), "").split("\n\n-- ")[0]
+        entry = self.answers.get(_key(question))
+        if entry is None:
+            return f"<explanation>No corpus entry; count the HCPs.</explanation>\n<sql>{FALLBACK_SQL}</sql>"
+        return f"<explanation>{entry['explanation']}</explanation>\n<sql>{entry['sql']}</sql>"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; avoid the Nagle / delayed-ACK stall
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+
+                messages = request.get("messages", [])
+                content = server.reply(messages)
+                prompt_tokens = sum(_count_tokens(m.get("content") or "") for m in messages)
+                completion_tokens = _count_tokens(content)
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                    "prompt_tokens_details": {"cached_tokens": 0},
+                }
+                base = {
+                    "id": f"chatcmpl-mock-{server.requests}",
+                    "created": int(time.time()),
+                    "model": request.get("model", "mock"),
+                }
+                time.sleep(server.latency)
+
+                if not request.get("stream"):
+                    self._send_json(200, {
+                        **base,
+                        "object": "chat.completion",
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                        "usage": usage,
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                chunk = {**base, "object": "chat.completion.chunk"}
+                words = content.split(" ")
+                for i, word in enumerate(words):
+                    delta = {"content": word if i == 0 else " " + word}
+                    self._send_event({**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                    time.sleep(server.token_latency)
+                self._send_event({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    self._send_event({**chunk, "choices": [], "usage": usage})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def _send_event(self, body: dict):
+                self.wfile.write(f"data: {json.dumps(body)}\n\n".encode())
+                self.wfile.flush()
+
+        return Handler
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def start(self) -> "MockOpenAIServer":
+        """Serves requests on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--corpus", default=CORPUS_FILE)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(load_corpus(args.corpus), args.host, args.port, args.latency, args.token_latency)
+    print(f"Mock OpenAI server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
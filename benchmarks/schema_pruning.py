@@ -0,0 +1,119 @@
+"""
+Compares the SQL generation prompt with the full schema against the pruned
+schema on a fixed question set.
+
+    python -m benchmarks.schema_pruning           # prompt size + build time
+    python -m benchmarks.schema_pruning --live    # also time the LLM calls
+
+Token counts use tiktoken when it is installed and fall back to chars / 4.
+The --live run needs OPENAI_API_KEY (and optionally OPENAI_BASE_URL) and
+measures time-to-first-token and total latency with streaming enabled.
+"""
+
+import argparse
+import statistics
+import time
+
+from system_prompt import SYSTEM_PROMPT, build_schema_prompt
+from schema_retriever import select_tables
+from backend_app import build_sql_messages
+
+QUESTIONS = [
+    "Total TRx by territory for Q3 2024",
+    "How many calls did Morgan Chen make last quarter?",
+    "Top 10 HCPs by NRx for GAZYVA in 2024",
+    "Which accounts had the most completed calls in 2024?",
+    "Payor mix for GAZYVA by payor type",
+    "How many lunch meetings happened in the Northeast region in March 2024?",
+    "Weekly NRx trend for rheumatology specialists",
+    "Which reps have the most completed calls per HCP?",
+    "Market share by territory for the latest quarter",
+    "List all territories",
+]
+
+
+def _token_counter():
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text)), "tiktoken"
+    except ImportError:
+        return lambda text: len(text) // 4, "chars/4"
+
+
+def _build(question: str, prune: bool) -> str:
+    tables = select_tables(question) if prune else None
+    return SYSTEM_PROMPT if tables is None else build_schema_prompt(tables)
+
+
+def _time_build(question: str, prune: bool, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _build(question, prune)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def _time_llm(messages: list[dict], model: str) -> tuple[float, float]:
+    """Returns (time to first token, total time) in ms for one streamed call."""
+    from openai import OpenAI
+
+    client = OpenAI()
+    start = time.perf_counter()
+    first = None
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=True,
+    )
+    for chunk in stream:
+        if first is None and chunk.choices and chunk.choices[0].delta.content:
+            first = time.perf_counter()
+    end = time.perf_counter()
+    return ((first or end) - start) * 1000, (end - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="also time real LLM calls")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--repeat", type=int, default=200, help="prompt builds per timing")
+    args = parser.parse_args()
+
+    count_tokens, counter_name = _token_counter()
+    print(f"Token counter: {counter_name}\n")
+    print(f"{'question':<58} {'tables':>6} {'full tok':>9} {'pruned tok':>10} {'saved':>6}")
+
+    full_tokens, pruned_tokens, full_ms, pruned_ms = [], [], [], []
+    ttft = {"full": [], "pruned": []}
+    total = {"full": [], "pruned": []}
+    for question in QUESTIONS:
+        tables = select_tables(question)
+        full_messages = build_sql_messages(question, prune_schema=False)
+        pruned_messages = build_sql_messages(question, prune_schema=True)
+        full_tokens.append(sum(count_tokens(m["content"]) for m in full_messages))
+        pruned_tokens.append(sum(count_tokens(m["content"]) for m in pruned_messages))
+        full_ms.append(_time_build(question, False, args.repeat))
+        pruned_ms.append(_time_build(question, True, args.repeat))
+
+        saved = 1 - pruned_tokens[-1] / full_tokens[-1]
+        print(f"{question[:58]:<58} {len(tables) if tables else 'all':>6} "
+              f"{full_tokens[-1]:>9} {pruned_tokens[-1]:>10} {saved:>6.0%}")
+
+        if args.live:
+            for name, messages in (("full", full_messages), ("pruned", pruned_messages)):
+                first, end = _time_llm(messages, args.model)
+                ttft[name].append(first)
+                total[name].append(end)
+
+    print()
+    print(f"Mean prompt tokens: full={statistics.mean(full_tokens):.0f} pruned={statistics.mean(pruned_tokens):.0f} "
+          f"({1 - sum(pruned_tokens) / sum(full_tokens):.0%} fewer)")
+    print(f"Mean schema build:  full={statistics.mean(full_ms):.3f} ms pruned={statistics.mean(pruned_ms):.3f} ms")
+    if args.live:
+        for name in ("full", "pruned"):
+            print(f"LLM {name:<7} TTFT p50={statistics.median(ttft[name]):.0f} ms "
+                  f"total p50={statistics.median(total[name]):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
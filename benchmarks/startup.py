@@ -0,0 +1,138 @@
+"""
+Startup benchmark: module import time and time-to-first-request.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --modules backend_app
+
+Import time is the total of `python -X importtime -c "import <module>"`,
+median of --runs fresh interpreters, with the heaviest packages it imports.
+Time-to-first-request runs one question end to end in a fresh interpreter
+(import backend_app, warm_up, process_query) against the local mock LLM
+from benchmarks/mock_openai.py, for four starts:
+
+- cold:     no pharma_data.db yet, so the CSVs are loaded
+- current:  the DB exists and matches the CSVs, which are only checked
+- skip:     SKIP_DATA_LOAD=1, the DB is used as is
+- snapshot: SNAPSHOT_DB points at a prebuilt db_snapshot.py snapshot
+
+Each run works in a temporary copy of the data directory and starts
+without a question cache, so the question always goes to the (mock) LLM.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from backend_app import DB_FILE, QUESTION_CACHE_FILE
+from csv_to_sqlite import data_dir
+from db_snapshot import SNAPSHOT_DIR, CURRENT_LINK, build_snapshot, publish_snapshot
+from benchmarks.mock_openai import MockOpenAIServer, load_corpus
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTION = "How many HCPs are there?"
+
+# Runs in the child interpreter; prints the phase timings as JSON
+FIRST_REQUEST_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import backend_app
+imported = time.perf_counter()
+backend_app.warm_up()
+warm = time.perf_counter()
+response = backend_app.process_query(sys.argv[1])
+done = time.perf_counter()
+print(json.dumps({"import": imported - start, "warm_up": warm - imported, "request": done - warm,
+                  "total": done - start, "status": response["status"]}))
+"""
+
+
+def import_times(module: str) -> tuple[float, dict]:
+    """
+    Import seconds of `module` in a fresh interpreter and of the packages it
+    imports directly (cumulative, so a package includes its own imports).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    packages = {}
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # header line
+        name = parts[2][1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        seconds = int(parts[1]) / 1e6
+        # importtime lists a module's imports, one level deeper, right before the module itself
+        if depth == 0:
+            if name == module:
+                return seconds, packages
+            packages = {}
+        elif depth == 1:
+            package = name.strip().split(".")[0]
+            packages[package] = packages.get(package, 0) + seconds
+    raise RuntimeError(f"{module} not found in the -X importtime output")
+
+
+def first_request(work_dir: str, env: dict) -> dict:
+    result = subprocess.run([sys.executable, "-c", FIRST_REQUEST_SCRIPT, QUESTION], cwd=work_dir, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--modules", nargs="+", default=["backend_app", "app"])
+    parser.add_argument("--top", type=int, default=5, help="heaviest packages listed per module")
+    parser.add_argument("--data-dir", default=os.path.abspath(data_dir))
+    args = parser.parse_args()
+
+    print("Import time (median of fresh interpreters)")
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(args.runs)]
+        total = statistics.median(seconds for seconds, _ in runs)
+        packages = runs[-1][1]
+        heaviest = sorted(packages, key=packages.get, reverse=True)[:args.top]
+        print(f"  {module:<12} {total * 1000:>8.0f} ms   "
+              + ", ".join(f"{name} {packages[name] * 1000:.0f} ms" for name in heaviest))
+
+    server = MockOpenAIServer(load_corpus()).start()
+    work_dir = tempfile.mkdtemp(prefix="startup_bench_")
+    env = dict(os.environ, OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY="mock",
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+    try:
+        shutil.copytree(args.data_dir, os.path.join(work_dir, "data"))
+        snapshot_dir = os.path.join(work_dir, SNAPSHOT_DIR)
+        publish_snapshot(build_snapshot(snapshot_dir, os.path.join(work_dir, "data"))["path"], snapshot_dir)
+        starts = {
+            "cold": {"SKIP_DATA_LOAD": "0"},
+            "current": {"SKIP_DATA_LOAD": "0"},
+            "skip": {"SKIP_DATA_LOAD": "1"},
+            "snapshot": {"SNAPSHOT_DB": os.path.join(SNAPSHOT_DIR, CURRENT_LINK)},
+        }
+        print("\nTime to first request (median seconds)")
+        print(f"  {'start':<9} {'import':>7} {'warm-up':>8} {'request':>8} {'total':>7}")
+        for start, start_env in starts.items():
+            runs = []
+            for _ in range(args.runs):
+                for file_name in [QUESTION_CACHE_FILE] + ([DB_FILE] if start == "cold" else []):
+                    if os.path.exists(os.path.join(work_dir, file_name)):
+                        os.remove(os.path.join(work_dir, file_name))
+                runs.append(first_request(work_dir, dict(env, **start_env)))
+            failures = sum(run["status"] != "success" for run in runs)
+            line = f"  {start:<9}"
+            for phase in ["import", "warm_up", "request", "total"]:
+                line += f" {statistics.median(run[phase] for run in runs):>7.2f}s"
+            print(line + (f"  ({failures} failed)" if failures else ""))
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
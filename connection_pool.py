@@ -0,0 +1,127 @@
+import sqlite3
+import threading
+import queue
+from contextlib import contextmanager
+
+# PRAGMAs applied to every pooled read-only connection
+READ_PRAGMAS = [
+    "PRAGMA query_only = ON",
+    "PRAGMA cache_size = -32768",      # 32 MiB page cache per connection
+    "PRAGMA mmap_size = 268435456",    # 256 MiB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+]
+
+
+class SQLiteConnectionPool:
+    """
+    Small thread-safe pool of long-lived, read-only SQLite connections.
+
+    Connections are opened lazily up to `max_size` and handed out LIFO, so
+    the most recently used connection (with the warmest page cache and an
+    already parsed schema) is reused first.
+
+    With immutable=True the file is opened with `immutable=1`: SQLite skips
+    all locking and change detection, which is only safe for a file nobody
+    writes to again, like a db_snapshot.py snapshot. `mmap_size` overrides
+    the memory-mapped I/O size of READ_PRAGMAS.
+    """
+
+    def __init__(self, db_path: str, max_size: int = 8, timeout: float = 30.0,
+                 immutable: bool = False, mmap_size: int | None = None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.immutable = immutable
+        self.mmap_size = mmap_size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro" + ("&immutable=1" if self.immutable else ""),
+            uri=True,
+            check_same_thread=False,
+        )
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        if self.mmap_size is not None:
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Borrows a connection, opening a new one if the pool is not full yet."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No SQLite connection available after {self.timeout}s") from None
+
+    def release(self, conn: sqlite3.Connection):
+        """Returns a borrowed connection to the pool (or closes it once the pool is closed)."""
+        if self._closed:
+            self.discard(conn)
+            return
+        self._idle.put(conn)
+
+    def discard(self, conn: sqlite3.Connection):
+        """Closes a broken connection instead of returning it to the pool."""
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection and always gives it back."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except sqlite3.DatabaseError as e:
+            # Corrupt or closed handles are dropped; ordinary SQL errors are not
+            if isinstance(e, sqlite3.ProgrammingError) or "closed" in str(e):
+                self.discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self.release(conn)
+
+    def close_all(self):
+        """Closes every idle connection, e.g. after the database file was replaced."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+    def close(self):
+        """
+        Retires the pool, e.g. after switching to another database file:
+        idle connections are closed now, borrowed ones when they are released.
+        """
+        self._closed = True
+        self.close_all()
@@ -1,7 +1,19 @@
-import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import TYPE_CHECKING
 import sqlite3
+import argparse
+import hashlib
+import tempfile
+import shutil
+import json
+import time
 import os
 
+# pandas is only imported when CSVs are actually read, so importing the
+# schema definitions below (e.g. from sql_engines) stays cheap
+if TYPE_CHECKING:
+    import pandas as pd
+
 # 1. Define the CSV files you need to load
 csv_files = [
     "territory_dim.csv",
@@ -15,63 +27,836 @@ csv_files = [
     "hcp_dim.csv"
 ]
 
-# 2. Define the database file name
+# 2. Define the database file name and the folder holding the CSVs
 db_file = "pharma_data.db"
+data_dir = "data"
+
+# 3. Bookkeeping table recording what has already been ingested
+MANIFEST_TABLE = "_ingest_manifest"
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# 4. Streaming load settings: rows parsed per chunk and loader PRAGMAs.
+#    Memory use is bounded by CHUNK_SIZE rows, whatever the file size.
+#    synchronous is per connection: only the loader's own connection runs
+#    with it OFF, every new connection starts at the default again.
+CHUNK_SIZE = 50_000
+LOAD_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -65536",  # 64 MiB
+    "PRAGMA temp_store = MEMORY",
+]
+# Throwaway per-table staging DBs built by parallel workers need no journal
+STAGING_PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -65536",
+]
+
+# 5. Declarative schema for the star schema: column types, primary keys
+#    on the dimension keys and composite indexes on the fact join keys.
+TABLE_SCHEMAS = {
+    "territory_dim": {
+        "columns": [
+            ("territory_id", "INTEGER"),
+            ("name", "TEXT"),
+            ("geo_type", "TEXT"),
+            ("parent_territory_id", "INTEGER"),
+        ],
+        "primary_key": ["territory_id"],
+        "indexes": [],
+    },
+    "rep_dim": {
+        "columns": [
+            ("rep_id", "INTEGER"),
+            ("first_name", "TEXT"),
+            ("last_name", "TEXT"),
+            ("region", "TEXT"),
+        ],
+        "primary_key": ["rep_id"],
+        "indexes": [],
+    },
+    "date_dim": {
+        "columns": [
+            ("date_id", "INTEGER"),
+            ("calendar_date", "TEXT"),
+            ("year", "INTEGER"),
+            ("quarter", "TEXT"),
+            ("week_num", "INTEGER"),
+            ("day_of_week", "TEXT"),
+        ],
+        "primary_key": ["date_id"],
+        "indexes": [["year", "quarter"]],
+    },
+    "account_dim": {
+        "columns": [
+            ("account_id", "INTEGER"),
+            ("name", "TEXT"),
+            ("account_type", "TEXT"),
+            ("address", "TEXT"),
+            ("territory_id", "INTEGER"),
+        ],
+        "primary_key": ["account_id"],
+        "indexes": [["territory_id"]],
+    },
+    "hcp_dim": {
+        "columns": [
+            ("hcp_id", "INTEGER"),
+            ("full_name", "TEXT"),
+            ("specialty", "TEXT"),
+            ("tier", "TEXT"),
+            ("territory_id", "INTEGER"),
+        ],
+        "primary_key": ["hcp_id"],
+        "indexes": [["territory_id"]],
+    },
+    "fact_rx": {
+        "columns": [
+            ("hcp_id", "INTEGER"),
+            ("date_id", "INTEGER"),
+            ("brand_code", "TEXT"),
+            ("trx_cnt", "INTEGER"),
+            ("nrx_cnt", "INTEGER"),
+        ],
+        "primary_key": [],
+        "indexes": [["date_id", "hcp_id", "brand_code"], ["hcp_id", "date_id"]],
+    },
+    "fact_payor_mix": {
+        "columns": [
+            ("account_id", "INTEGER"),
+            ("date_id", "INTEGER"),
+            ("payor_type", "TEXT"),
+            ("pct_of_volume", "REAL"),
+        ],
+        "primary_key": [],
+        "indexes": [["date_id", "account_id", "payor_type"], ["account_id", "date_id"]],
+    },
+    "fact_rep_activity": {
+        "columns": [
+            ("activity_id", "INTEGER"),
+            ("rep_id", "INTEGER"),
+            ("hcp_id", "INTEGER"),
+            ("account_id", "INTEGER"),
+            ("date_id", "INTEGER"),
+            ("activity_type", "TEXT"),
+            ("status", "TEXT"),
+            ("time_of_day", "TEXT"),
+            ("duration_min", "INTEGER"),
+        ],
+        "primary_key": ["activity_id"],
+        "indexes": [
+            ["date_id", "rep_id"],
+            ["date_id", "hcp_id"],
+            ["date_id", "account_id"],
+            ["rep_id", "date_id"],
+        ],
+    },
+    "fact_ln_metrics": {
+        "columns": [
+            ("entity_type", "TEXT"),
+            ("entity_id", "INTEGER"),
+            ("quarter_id", "TEXT"),
+            ("ln_patient_cnt", "INTEGER"),
+            ("est_market_share", "REAL"),
+        ],
+        "primary_key": [],
+        "indexes": [["entity_type", "entity_id", "quarter_id"], ["quarter_id"]],
+    },
+}
+
+# 6. Rollup tables maintained by the loader for the most common question
+#    grains. "select" aggregates the source fact; "{where}" is replaced by a
+#    filter on the periods to refresh. "period" is the refresh grain as an
+#    expression over date_dim d, "rollup_period" the same over the rollup.
+#    The SQL must also run on DuckDB (see sql_engines), so every selected
+#    column is aggregated or grouped on.
+ROLLUPS = {
+    "agg_rx_territory_quarter": {
+        "source": "fact_rx",
+        "depends_on": ["fact_rx", "hcp_dim", "date_dim", "territory_dim"],
+        "columns": [
+            ("territory_id", "INTEGER"),
+            ("territory_name", "TEXT"),
+            ("brand_code", "TEXT"),
+            ("year", "INTEGER"),
+            ("quarter", "TEXT"),
+            ("trx_cnt", "INTEGER"),
+            ("nrx_cnt", "INTEGER"),
+            ("hcp_cnt", "INTEGER"),
+        ],
+        "primary_key": ["territory_id", "brand_code", "year", "quarter"],
+        "indexes": [["year", "quarter"], ["brand_code", "year", "quarter"]],
+        "period": "d.year || '-' || d.quarter",
+        "rollup_period": "year || '-' || quarter",
+        "select": """
+            SELECT h.territory_id, t.name, f.brand_code, d.year, d.quarter,
+                   SUM(f.trx_cnt), SUM(f.nrx_cnt), COUNT(DISTINCT f.hcp_id)
+            FROM fact_rx f
+            JOIN hcp_dim h ON h.hcp_id = f.hcp_id
+            JOIN date_dim d ON d.date_id = f.date_id
+            LEFT JOIN territory_dim t ON t.territory_id = h.territory_id
+            {where}
+            GROUP BY h.territory_id, t.name, f.brand_code, d.year, d.quarter
+        """,
+    },
+    "agg_activity_rep_month": {
+        "source": "fact_rep_activity",
+        "depends_on": ["fact_rep_activity", "rep_dim", "date_dim"],
+        "columns": [
+            ("rep_id", "INTEGER"),
+            ("rep_name", "TEXT"),
+            ("region", "TEXT"),
+            ("year", "INTEGER"),
+            ("month", "TEXT"),
+            ("activity_type", "TEXT"),
+            ("status", "TEXT"),
+            ("activity_cnt", "INTEGER"),
+            ("hcp_cnt", "INTEGER"),
+            ("total_duration_min", "INTEGER"),
+        ],
+        "primary_key": ["rep_id", "month", "activity_type", "status"],
+        "indexes": [["month"]],
+        "period": "substr(d.calendar_date, 1, 7)",
+        "rollup_period": "month",
+        "select": """
+            SELECT f.rep_id, r.first_name || ' ' || r.last_name, r.region, d.year,
+                   substr(d.calendar_date, 1, 7), f.activity_type, f.status,
+                   COUNT(*), COUNT(DISTINCT f.hcp_id), SUM(f.duration_min)
+            FROM fact_rep_activity f
+            JOIN date_dim d ON d.date_id = f.date_id
+            LEFT JOIN rep_dim r ON r.rep_id = f.rep_id
+            {where}
+            GROUP BY f.rep_id, r.first_name, r.last_name, r.region, d.year,
+                     substr(d.calendar_date, 1, 7), f.activity_type, f.status
+        """,
+    },
+    "agg_payor_account_quarter": {
+        "source": "fact_payor_mix",
+        "depends_on": ["fact_payor_mix", "account_dim", "date_dim"],
+        "columns": [
+            ("account_id", "INTEGER"),
+            ("account_name", "TEXT"),
+            ("territory_id", "INTEGER"),
+            ("year", "INTEGER"),
+            ("quarter", "TEXT"),
+            ("payor_type", "TEXT"),
+            ("avg_pct_of_volume", "REAL"),
+            ("snapshot_cnt", "INTEGER"),
+        ],
+        "primary_key": ["account_id", "year", "quarter", "payor_type"],
+        "indexes": [["year", "quarter"]],
+        "period": "d.year || '-' || d.quarter",
+        "rollup_period": "year || '-' || quarter",
+        "select": """
+            SELECT f.account_id, a.name, a.territory_id, d.year, d.quarter, f.payor_type,
+                   AVG(f.pct_of_volume), COUNT(*)
+            FROM fact_payor_mix f
+            JOIN date_dim d ON d.date_id = f.date_id
+            LEFT JOIN account_dim a ON a.account_id = f.account_id
+            {where}
+            GROUP BY f.account_id, a.name, a.territory_id, d.year, d.quarter, f.payor_type
+        """,
+    },
+}
+
+# pandas dtypes used when parsing each SQL column type from CSV
+PANDAS_DTYPES = {"INTEGER": "Int64", "REAL": "float64", "TEXT": "string"}
+
+
+def _file_hash(path: str, length: int | None = None) -> str:
+    """Returns the sha256 of a file, or of its first `length` bytes."""
+    digest = hashlib.sha256()
+    remaining = length
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            size = HASH_BLOCK_SIZE if remaining is None else min(HASH_BLOCK_SIZE, remaining)
+            block = f.read(size)
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+def _ends_with_newline(path: str, length: int) -> bool:
+    """Checks whether byte `length - 1` of the file is a newline."""
+    if length == 0:
+        return False
+    with open(path, "rb") as f:
+        f.seek(length - 1)
+        return f.read(1) == b"\n"
+
+
+def _ensure_manifest(conn: sqlite3.Connection):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            file_name  TEXT NOT NULL,
+            file_size  INTEGER NOT NULL,
+            file_mtime REAL NOT NULL,
+            sha256     TEXT NOT NULL,
+            row_count  INTEGER NOT NULL,
+            loaded_at  REAL NOT NULL
+        )
+    """)
+    conn.commit()
+
+
+def _read_manifest(conn: sqlite3.Connection, table_name: str) -> dict | None:
+    row = conn.execute(
+        f"SELECT file_size, file_mtime, sha256, row_count FROM {MANIFEST_TABLE} WHERE table_name = ?",
+        (table_name,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {"file_size": row[0], "file_mtime": row[1], "sha256": row[2], "row_count": row[3]}
+
+
+def _write_manifest(conn: sqlite3.Connection, table_name: str, file_name: str, stat: os.stat_result, sha256: str, row_count: int):
+    conn.execute(
+        f"""INSERT OR REPLACE INTO {MANIFEST_TABLE}
+            (table_name, file_name, file_size, file_mtime, sha256, row_count, loaded_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (table_name, file_name, stat.st_size, stat.st_mtime, sha256, row_count, time.time())
+    )
+
+
+def _table_exists(conn: sqlite3.Connection, table_name: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+    ).fetchone()
+    return row is not None
+
+
+def _table_columns(conn: sqlite3.Connection, table_name: str) -> list[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+
+
+def _schema(table_name: str) -> dict | None:
+    """Schema spec of a loaded table or rollup, None for tables we don't know."""
+    return TABLE_SCHEMAS.get(table_name) or ROLLUPS.get(table_name)
+
+
+def _create_table_sql(table_name: str, target: str | None = None) -> str:
+    """Builds the CREATE TABLE statement for a table from TABLE_SCHEMAS or ROLLUPS."""
+    schema = _schema(table_name)
+    definitions = [f'"{name}" {sql_type}' for name, sql_type in schema["columns"]]
+    if schema["primary_key"]:
+        definitions.append("PRIMARY KEY (" + ", ".join(f'"{c}"' for c in schema["primary_key"]) + ")")
+    return f'CREATE TABLE "{target or table_name}" (' + ", ".join(definitions) + ")"
+
+
+def _create_indexes(conn: sqlite3.Connection, table_name: str, target: str | None = None):
+    """
+    Creates the indexes of `table_name` on `target` (the table itself by default).
+    Index names are global to the database, so a staging copy built next to
+    the live table takes whichever of two names per index the live one isn't
+    using; the swap then drops the live table along with its indexes.
+    """
+    target = target or table_name
+    for columns in _schema(table_name)["indexes"]:
+        index_name = f"idx_{table_name}_" + "_".join(columns)
+        if target != table_name:
+            owner = conn.execute(
+                "SELECT tbl_name FROM sqlite_master WHERE type = 'index' AND name = ?", (index_name,)
+            ).fetchone()
+            if owner is not None and owner[0] != target:
+                index_name += "_b"
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{target}" ({column_list})')
+
+
+def _upserts(table_name: str) -> bool:
+    """
+    Tables with a primary key keep the last row seen for each key, whether
+    they are rebuilt or appended to, so both paths agree on duplicates.
+    """
+    return bool(TABLE_SCHEMAS.get(table_name, {}).get("primary_key"))
+
+
+def _schema_matches(conn: sqlite3.Connection, table_name: str) -> bool:
+    """
+    Checks that an existing table was created from the current schema spec,
+    so databases built by older loaders get rebuilt with types and keys.
+    """
+    schema = _schema(table_name)
+    if schema is None:
+        return True
+    info = conn.execute(f'PRAGMA table_info("{table_name}")').fetchall()
+    actual = [(row[1], row[2].upper()) for row in info]
+    actual_pk = [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5] > 0]
+    return actual == schema["columns"] and actual_pk == schema["primary_key"]
+
+
+def _read_csv(source, table_name: str, **kwargs) -> "pd.DataFrame":
+    """Reads a CSV with the column types declared in TABLE_SCHEMAS, if any."""
+    import pandas as pd
+
+    if table_name in TABLE_SCHEMAS:
+        kwargs.setdefault("dtype", {
+            name: PANDAS_DTYPES[sql_type] for name, sql_type in TABLE_SCHEMAS[table_name]["columns"]
+        })
+    return pd.read_csv(source, **kwargs)
+
+
+def _insert_rows(conn: sqlite3.Connection, table_name: str, df: "pd.DataFrame", upsert: bool = False):
+    """Bulk-inserts a DataFrame with executemany."""
+    columns = list(df.columns)
+    # NaN/NA -> None so missing values are stored as NULL
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    placeholders = ", ".join("?" for _ in columns)
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    verb = "INSERT OR REPLACE" if upsert else "INSERT"
+    conn.executemany(f'{verb} INTO "{table_name}" ({column_list}) VALUES ({placeholders})', rows)
+
+
+def get_data_version(db_path: str = db_file) -> int:
+    """
+    Returns the data version of the database. It is bumped every time
+    the loader changes the contents of at least one table.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _bump_data_version(conn: sqlite3.Connection):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.execute(f"PRAGMA user_version = {version + 1}")
+
+
+def _read_chunks(source, table_name: str, chunk_size: int | None, **kwargs):
+    """
+    Yields DataFrames of at most `chunk_size` rows. With chunk_size=None
+    the whole file is read at once.
+    """
+    if chunk_size is None:
+        yield _read_csv(source, table_name, **kwargs)
+        return
+    with _read_csv(source, table_name, chunksize=chunk_size, **kwargs) as reader:
+        yield from reader
+
+
+def _stream_into(conn: sqlite3.Connection, target: str, table_name: str, full_path: str, chunk_size: int | None) -> int:
+    """
+    Creates `target` with the schema of `table_name` and streams the CSV
+    into it chunk by chunk. Must be called inside a transaction.
+    Returns the number of rows in `target` afterwards.
+    """
+    row_count = 0
+    upsert = _upserts(table_name)
+    if table_name in TABLE_SCHEMAS:
+        conn.execute(_create_table_sql(table_name, target))
+    for i, df in enumerate(_read_chunks(full_path, table_name, chunk_size)):
+        if i == 0 and table_name not in TABLE_SCHEMAS:
+            # Unknown tables fall back to pandas type inference
+            df.head(0).to_sql(target, conn, index=False)
+        _insert_rows(conn, target, df, upsert=upsert)
+        row_count += len(df)
+    if upsert:
+        row_count = conn.execute(f'SELECT COUNT(*) FROM "{target}"').fetchone()[0]
+    return row_count
+
+
+def _swap_in_staging(conn: sqlite3.Connection, table_name: str, file_name: str, stat: os.stat_result, sha256: str, row_count: int):
+    """
+    Replaces the live table with its staging copy in one short transaction.
+    The indexes are built on the staging copy first, so the swap itself
+    only drops and renames.
+    """
+    staging = f"{table_name}__staging"
+    if table_name in TABLE_SCHEMAS:
+        _create_indexes(conn, table_name, staging)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        conn.execute(f'ALTER TABLE "{staging}" RENAME TO "{table_name}"')
+        _write_manifest(conn, table_name, file_name, stat, sha256, row_count)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _replace_table(conn: sqlite3.Connection, full_path: str, file_name: str, table_name: str, stat: os.stat_result, sha256: str, chunk_size: int | None = CHUNK_SIZE) -> int:
+    """
+    Rebuilds a table from scratch. The new data is streamed in chunks into
+    a staging table inside one transaction, so the live table is only
+    locked for the final swap.
+    """
+    staging = f"{table_name}__staging"
+
+    conn.execute(f'DROP TABLE IF EXISTS "{staging}"')
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row_count = _stream_into(conn, staging, table_name, full_path, chunk_size)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    _swap_in_staging(conn, table_name, file_name, stat, sha256, row_count)
+    return row_count
+
+
+def _build_staging_db(full_path: str, table_name: str, staging_path: str, chunk_size: int | None) -> tuple[int, float]:
+    """
+    Process pool worker: parses one CSV into its own throwaway SQLite file.
+    Returns the row count and the seconds spent.
+    """
+    start = time.perf_counter()
+    conn = sqlite3.connect(staging_path, isolation_level=None)
+    try:
+        for pragma in STAGING_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute("BEGIN")
+        row_count = _stream_into(conn, table_name, table_name, full_path, chunk_size)
+        conn.commit()
+    finally:
+        conn.close()
+    return row_count, time.perf_counter() - start
+
 
-def load_csv_to_sqlite():
+def _merge_staging_db(conn: sqlite3.Connection, staging_path: str, file_name: str, table_name: str, stat: os.stat_result, sha256: str, row_count: int):
     """
-    Loads a list of CSV files into a single SQLite database, 
+    Single writer step of a parallel load: ATTACHes a worker's staging DB,
+    copies its table into the main DB and swaps it in.
+    """
+    staging = f"{table_name}__staging"
+
+    conn.execute("ATTACH DATABASE ? AS stg", (staging_path,))
+    try:
+        conn.execute(f'DROP TABLE IF EXISTS main."{staging}"')
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if table_name in TABLE_SCHEMAS:
+                conn.execute(_create_table_sql(table_name, staging))
+            else:
+                conn.execute(f'CREATE TABLE main."{staging}" AS SELECT * FROM stg."{table_name}" WHERE 0')
+            verb = "INSERT OR REPLACE" if _upserts(table_name) else "INSERT"
+            conn.execute(f'{verb} INTO main."{staging}" SELECT * FROM stg."{table_name}"')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute("DETACH DATABASE stg")
+
+    _swap_in_staging(conn, table_name, file_name, stat, sha256, row_count)
+
+
+def _date_range(conn: sqlite3.Connection, table_name: str, df: "pd.DataFrame", upsert: bool) -> tuple | None:
+    """
+    Range of date_id values a chunk of appended rows touches. For upserts
+    this includes the dates of the existing rows the chunk replaces.
+    """
+    if "date_id" not in df.columns or df["date_id"].isna().all():
+        return None
+    low, high = int(df["date_id"].min()), int(df["date_id"].max())
+    if upsert:
+        key = TABLE_SCHEMAS[table_name]["primary_key"]
+        if len(key) == 1:
+            ids = json.dumps([int(v) for v in df[key[0]].dropna()])
+            old_low, old_high = conn.execute(
+                f'SELECT MIN(date_id), MAX(date_id) FROM "{table_name}" WHERE "{key[0]}" IN (SELECT value FROM json_each(?))',
+                (ids,)
+            ).fetchone()
+            if old_low is not None:
+                low, high = min(low, old_low), max(high, old_high)
+    return low, high
+
+
+def _merge_ranges(a: tuple | None, b: tuple | None) -> tuple | None:
+    if a is None or b is None:
+        return a or b
+    return min(a[0], b[0]), max(a[1], b[1])
+
+
+def _append_table(conn: sqlite3.Connection, full_path: str, file_name: str, table_name: str, stat: os.stat_result, sha256: str, previous: dict, chunk_size: int | None = CHUNK_SIZE) -> tuple[int, tuple | None]:
+    """
+    Appends only the rows added to the end of a CSV since the last load.
+    Tables with a primary key are upserted, so re-sent rows replace the old ones.
+    Returns the appended row count and the (min, max) date_id range the new
+    rows touch, which is what the rollups have to refresh.
+    """
+    columns = _table_columns(conn, table_name)
+    upsert = _upserts(table_name)
+    appended = 0
+    date_range = None
+
+    with open(full_path, "rb") as f:
+        f.seek(previous["file_size"])
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for df in _read_chunks(f, table_name, chunk_size, header=None, names=columns):
+                date_range = _merge_ranges(date_range, _date_range(conn, table_name, df, upsert))
+                _insert_rows(conn, table_name, df, upsert=upsert)
+                appended += len(df)
+            if upsert:
+                row_count = conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+            else:
+                row_count = previous["row_count"] + appended
+            _write_manifest(conn, table_name, file_name, stat, sha256, row_count)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return appended, date_range
+
+
+def _rebuild_rollup(conn: sqlite3.Connection, name: str) -> int:
+    """Recomputes a rollup table from scratch in one transaction."""
+    rollup = ROLLUPS[name]
+    column_list = ", ".join(f'"{c}"' for c, _ in rollup["columns"])
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+        conn.execute(_create_table_sql(name))
+        conn.execute(f'INSERT INTO "{name}" ({column_list}) ' + rollup["select"].format(where=""))
+        _create_indexes(conn, name)
+        row_count = conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return row_count
+
+
+def _refresh_rollup_periods(conn: sqlite3.Connection, name: str, date_range: tuple) -> int:
+    """
+    Recomputes only the rollup rows of the periods (quarters, months, ...)
+    that overlap `date_range`. Returns the number of rows rewritten.
+    """
+    rollup = ROLLUPS[name]
+    column_list = ", ".join(f'"{c}"' for c, _ in rollup["columns"])
+    periods = f'SELECT DISTINCT {rollup["period"]} FROM date_dim d WHERE d.date_id BETWEEN ? AND ?'
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f'DELETE FROM "{name}" WHERE {rollup["rollup_period"]} IN ({periods})', date_range)
+        cursor = conn.execute(
+            f'INSERT INTO "{name}" ({column_list}) '
+            + rollup["select"].format(where=f'WHERE {rollup["period"]} IN ({periods})'),
+            date_range
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return cursor.rowcount
+
+
+def _refresh_rollups(conn: sqlite3.Connection, results: dict, date_ranges: dict) -> dict:
+    """
+    Keeps the ROLLUPS in step with the tables this run changed: a rollup
+    whose source fact only had rows appended is refreshed for the affected
+    periods, one with a rebuilt source or dimension (or that is missing or
+    outdated) is rebuilt. Returns per-rollup results like load_csv_to_sqlite.
+    """
+    rollup_results = {}
+    for name, rollup in ROLLUPS.items():
+        result = {"table": name, "action": "skipped", "rows": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+        rollup_results[name] = result
+
+        if not all(_table_exists(conn, table) for table in rollup["depends_on"]):
+            print(f"⚠️ Warning: cannot build rollup '{name}', a source table is missing. Skipping.")
+            result["action"] = "missing"
+            continue
+
+        changed = [table for table in rollup["depends_on"] if results.get(table, {}).get("action") in ("appended", "replaced")]
+        current = _table_exists(conn, name) and _schema_matches(conn, name)
+        if current and not changed:
+            continue
+
+        source = rollup["source"]
+        incremental = (
+            current
+            and changed == [source]
+            and results[source]["action"] == "appended"
+            and date_ranges.get(source) is not None
+        )
+        try:
+            start = time.perf_counter()
+            if incremental:
+                print(f"Refreshing rollup '{name}' for date_id {date_ranges[source][0]}..{date_ranges[source][1]}...")
+                row_count = _refresh_rollup_periods(conn, name, date_ranges[source])
+                _record(result, "refreshed", row_count, time.perf_counter() - start)
+            else:
+                print(f"Building rollup '{name}'...")
+                row_count = _rebuild_rollup(conn, name)
+                _record(result, "rebuilt", row_count, time.perf_counter() - start)
+        except Exception as e:
+            print(f"   ❌ An error occurred while building rollup {name}: {e}")
+            result["action"] = "error"
+            # A stale rollup is worse than none; the next run rebuilds it
+            conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+    return rollup_results
+
+
+def _record(result: dict, action: str, row_count: int, elapsed: float):
+    result["action"] = action
+    result["rows"] = row_count
+    result["seconds"] = elapsed
+    result["rows_per_sec"] = row_count / elapsed if elapsed > 0 else 0.0
+    print(f"   ✅ Successfully {action} {row_count} rows into '{result['table']}' ({result['rows_per_sec']:,.0f} rows/sec).")
+
+
+def load_csv_to_sqlite(db_path: str = db_file, data_path: str = data_dir, force: bool = False, chunk_size: int | None = CHUNK_SIZE, workers: int = 1) -> dict:
+    """
+    Loads a list of CSV files into a single SQLite database,
     creating a table for each file.
+
+    Every loaded file is fingerprinted (size, mtime, sha256) in a manifest
+    table. On later runs unchanged files are skipped, fact files that only
+    grew at the end are appended to, and anything else is rebuilt.
+    Pass force=True to rebuild every table regardless of the manifest.
+
+    Files are streamed in chunks of `chunk_size` rows and bulk-inserted in
+    one transaction per table, so peak memory does not grow with file size.
+    Pass chunk_size=None to read each file in one go.
+
+    With workers > 1 the tables that need a rebuild are parsed in a process
+    pool, each into its own staging DB, and merged into the main DB by this
+    process as they finish.
+
+    Afterwards the ROLLUPS tables are brought up to date: refreshed for the
+    affected periods after appends, rebuilt when a source table was rebuilt.
+
+    Returns a dict mapping table (and rollup) name to the action taken
+    ("skipped", "appended", "replaced", "refreshed", "rebuilt", "missing"
+    or "error"), the rows written and the ingest throughput in rows/sec.
     """
 
-    csv_files = [
-    "territory_dim.csv",
-    "rep_dim.csv",
-    "fact_rx.csv",
-    "fact_payor_mix.csv",
-    "date_dim.csv",
-    "fact_ln_metrics.csv",
-    "fact_rep_activity.csv",
-    "account_dim.csv",
-    "hcp_dim.csv"]
+    import pandas as pd
 
-    # 2. Define the database file name
-    db_file = "pharma_data.db"
+    print(f"Connecting to database: {db_path}")
 
-    print(f"Connecting to database: {db_file}")
-    
     # Connect to the SQLite database (it will be created if it doesn't exist)
-    conn = sqlite3.connect(db_file)
-    
+    # isolation_level=None lets us manage transactions explicitly
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    for pragma in LOAD_PRAGMAS:
+        conn.execute(pragma)
+    _ensure_manifest(conn)
+
+    results = {}
+    rebuilds = []
+    date_ranges = {}
+
     for file_name in csv_files:
+        # Create a clean table name from the file name
+        table_name = file_name.replace(".csv", "")
+        result = {"table": table_name, "action": "skipped", "rows": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+        results[table_name] = result
+
         # Check if the file exists before attempting to load
-        full_path = os.path.join("data", file_name)
+        full_path = os.path.join(data_path, file_name)
         if not os.path.exists(full_path):
             print(f"⚠️ Warning: File not found: {file_name}. Skipping.")
+            result["action"] = "missing"
             continue
-            
-        # Create a clean table name from the file name
-        table_name = file_name.replace(".csv", "")
-        
+
         try:
-            print(f"Loading '{file_name}' into table '{table_name}'...")
-            
-            # Read the CSV into a pandas DataFrame
-            # Assuming the first row contains headers.
-            df = pd.read_csv(full_path)
-            
-            # Write the DataFrame to the SQL database
-            # 'replace' will overwrite the table if it already exists
-            df.to_sql(table_name, conn, if_exists='replace', index=False)
-            
-            print(f"   ✅ Successfully loaded {len(df)} rows.")
+            stat = os.stat(full_path)
+            previous = None if force else _read_manifest(conn, table_name)
+            if previous is not None and not (_table_exists(conn, table_name) and _schema_matches(conn, table_name)):
+                previous = None
+
+            # Cheap check first: same size and mtime means the file is untouched
+            if previous is not None and previous["file_size"] == stat.st_size and previous["file_mtime"] == stat.st_mtime:
+                print(f"Skipping '{file_name}': unchanged since last load.")
+                continue
+
+            sha256 = _file_hash(full_path)
+
+            # Touched but identical content: only refresh the fingerprint
+            if previous is not None and previous["sha256"] == sha256:
+                _write_manifest(conn, table_name, file_name, stat, sha256, previous["row_count"])
+                print(f"Skipping '{file_name}': content unchanged since last load.")
+                continue
+
+            # Fact files that only had rows appended get the new tail inserted
+            appended = (
+                previous is not None
+                and table_name.startswith("fact_")
+                and stat.st_size > previous["file_size"]
+                and _ends_with_newline(full_path, previous["file_size"])
+                and _file_hash(full_path, previous["file_size"]) == previous["sha256"]
+            )
+
+            if appended:
+                print(f"Appending new rows from '{file_name}' to table '{table_name}'...")
+                start = time.perf_counter()
+                row_count, date_ranges[table_name] = _append_table(conn, full_path, file_name, table_name, stat, sha256, previous, chunk_size)
+                _record(result, "appended", row_count, time.perf_counter() - start)
+            elif workers > 1:
+                # Rebuilt below by the process pool
+                rebuilds.append((file_name, table_name, full_path, stat, sha256))
+            else:
+                print(f"Loading '{file_name}' into table '{table_name}'...")
+                start = time.perf_counter()
+                row_count = _replace_table(conn, full_path, file_name, table_name, stat, sha256, chunk_size)
+                _record(result, "replaced", row_count, time.perf_counter() - start)
 
         except pd.errors.EmptyDataError:
             print(f"   ❌ Error: {file_name} is empty. Skipping.")
+            result["action"] = "error"
         except Exception as e:
             print(f"   ❌ An error occurred while processing {file_name}: {e}")
+            result["action"] = "error"
+
+    if rebuilds:
+        print(f"Loading {len(rebuilds)} tables with {workers} worker processes...")
+        # Staging DBs live next to the target so the merge reads from the same disk
+        staging_dir = tempfile.mkdtemp(prefix="ingest_", dir=os.path.dirname(os.path.abspath(db_path)))
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(rebuilds))) as pool:
+                futures = {}
+                for file_name, table_name, full_path, stat, sha256 in rebuilds:
+                    staging_path = os.path.join(staging_dir, f"{table_name}.db")
+                    future = pool.submit(_build_staging_db, full_path, table_name, staging_path, chunk_size)
+                    futures[future] = (file_name, table_name, staging_path, stat, sha256)
+
+                for future in as_completed(futures):
+                    file_name, table_name, staging_path, stat, sha256 = futures[future]
+                    result = results[table_name]
+                    try:
+                        row_count, parse_seconds = future.result()
+                        start = time.perf_counter()
+                        _merge_staging_db(conn, staging_path, file_name, table_name, stat, sha256, row_count)
+                        _record(result, "replaced", row_count, parse_seconds + time.perf_counter() - start)
+                    except pd.errors.EmptyDataError:
+                        print(f"   ❌ Error: {file_name} is empty. Skipping.")
+                        result["action"] = "error"
+                    except Exception as e:
+                        print(f"   ❌ An error occurred while processing {file_name}: {e}")
+                        result["action"] = "error"
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    results.update(_refresh_rollups(conn, results, date_ranges))
+
+    if any(result["action"] in ("appended", "replaced", "refreshed", "rebuilt") for result in results.values()):
+        _bump_data_version(conn)
+        # Refresh the planner statistics so the new indexes get used
+        conn.execute("ANALYZE")
 
     # Close the connection
     conn.close()
     print("\nAll files processed. Database connection closed.")
-    print(f"Database '{db_file}' is ready!")
\ No newline at end of file
+    print(f"Database '{db_path}' is ready!")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the pharma CSVs into SQLite.")
+    parser.add_argument("--db", default=db_file, help="SQLite database file to write.")
+    parser.add_argument("--data-dir", default=data_dir, help="Folder containing the CSV files.")
+    parser.add_argument("--force", action="store_true", help="Rebuild every table, ignoring the manifest.")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows parsed per chunk.")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes used to parse tables in parallel.")
+    args = parser.parse_args()
+
+    load_csv_to_sqlite(args.db, args.data_dir, force=args.force, chunk_size=args.chunk_size, workers=args.workers)
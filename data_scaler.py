@@ -0,0 +1,141 @@
+import argparse
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from csv_to_sqlite import csv_files, data_dir
+
+# Dimensions that get a fresh block of IDs in every copy of the data.
+# territory_dim and date_dim are shared by all copies and written as is.
+SCALED_DIMENSIONS = {
+    "hcp_dim": "hcp_id",
+    "account_dim": "account_id",
+    "rep_dim": "rep_id",
+}
+
+# Columns holding keys of a scaled dimension, per table
+FOREIGN_KEYS = {
+    "hcp_dim": {"hcp_id": "hcp_dim"},
+    "account_dim": {"account_id": "account_dim"},
+    "rep_dim": {"rep_id": "rep_dim"},
+    "fact_rx": {"hcp_id": "hcp_dim"},
+    "fact_payor_mix": {"account_id": "account_dim"},
+    "fact_rep_activity": {"rep_id": "rep_dim", "hcp_id": "hcp_dim", "account_id": "account_dim"},
+}
+
+# fact_ln_metrics.entity_id points at an HCP or an account depending on entity_type
+ENTITY_TYPES = {"H": "hcp_dim", "A": "account_dim"}
+
+# Surrogate keys that must stay unique across copies
+ROW_KEYS = {"fact_rep_activity": "activity_id"}
+
+# Count measures varied by +/- jitter in every copy but the first
+JITTER_COLUMNS = {
+    "fact_rx": ["trx_cnt", "nrx_cnt"],
+    "fact_rep_activity": ["duration_min"],
+    "fact_ln_metrics": ["ln_patient_cnt"],
+}
+
+
+def _id_strides(tables: dict) -> dict:
+    """
+    Offset between two copies of each scaled dimension: the span of its IDs
+    (including IDs only found in fact tables), so the copies never overlap.
+    """
+    spans = {dim: [] for dim in SCALED_DIMENSIONS}
+    for table_name, df in tables.items():
+        for column, dim in FOREIGN_KEYS.get(table_name, {}).items():
+            spans[dim].extend(df[column].dropna().agg(["min", "max"]).tolist())
+        if table_name == "fact_ln_metrics":
+            for entity_type, dim in ENTITY_TYPES.items():
+                ids = df.loc[df["entity_type"] == entity_type, "entity_id"]
+                spans[dim].extend(ids.agg(["min", "max"]).dropna().tolist())
+    return {dim: int(max(values) - min(values) + 1) if values else 0 for dim, values in spans.items()}
+
+
+def _scaled_copy(table_name: str, df: pd.DataFrame, copy: int, strides: dict, row_strides: dict,
+                 jitter: float, rng: np.random.Generator) -> pd.DataFrame:
+    """Returns copy number `copy` (0 is the original) of one table with its keys shifted."""
+    if copy == 0:
+        return df
+    df = df.copy()
+    for column, dim in FOREIGN_KEYS.get(table_name, {}).items():
+        df[column] = df[column] + copy * strides[dim]
+    if table_name == "fact_ln_metrics":
+        for entity_type, dim in ENTITY_TYPES.items():
+            mask = df["entity_type"] == entity_type
+            df.loc[mask, "entity_id"] = df.loc[mask, "entity_id"] + copy * strides[dim]
+    if table_name in ROW_KEYS:
+        df[ROW_KEYS[table_name]] = df[ROW_KEYS[table_name]] + copy * row_strides[table_name]
+    if jitter:
+        for column in JITTER_COLUMNS.get(table_name, []):
+            factors = rng.uniform(1 - jitter, 1 + jitter, len(df))
+            df[column] = (df[column] * factors).round().astype(df[column].dtype)
+    return df
+
+
+def scale_data(source_dir: str = data_dir, target_dir: str = "data_scaled", factor: int = 10,
+               jitter: float = 0.2, seed: int = 0) -> dict:
+    """
+    Writes a copy of the pharma CSVs that is `factor` times larger while
+    every foreign key still resolves.
+
+    Copy 0 is the original data. Every further copy adds new HCPs, accounts
+    and reps (same names and attributes, IDs shifted by a per-dimension
+    stride) together with their Rx, payor mix, activity and LN metric rows,
+    whose count measures are varied by +/- `jitter` so aggregates differ
+    between copies. Territories and dates are shared, so the data covers the
+    same calendar with `factor` times the field force and customers.
+    Returns the number of rows written per table.
+    """
+    if factor < 1:
+        raise ValueError("factor must be at least 1")
+    os.makedirs(target_dir, exist_ok=True)
+
+    tables = {}
+    for file_name in csv_files:
+        path = os.path.join(source_dir, file_name)
+        if not os.path.exists(path):
+            print(f"⚠️ Warning: File not found at '{path}'. Skipping.")
+            continue
+        tables[file_name.replace(".csv", "")] = pd.read_csv(path)
+
+    strides = _id_strides(tables)
+    row_strides = {table: int(tables[table][column].max()) for table, column in ROW_KEYS.items() if table in tables}
+    rng = np.random.default_rng(seed)
+
+    counts = {}
+    for table_name, df in tables.items():
+        target = os.path.join(target_dir, f"{table_name}.csv")
+        if factor == 1 or (table_name not in FOREIGN_KEYS and table_name != "fact_ln_metrics"):
+            shutil.copyfile(os.path.join(source_dir, f"{table_name}.csv"), target)
+            counts[table_name] = len(df)
+            continue
+
+        # One copy in memory at a time, appended to the target file
+        tmp_path = target + ".tmp"
+        for copy in range(factor):
+            scaled = _scaled_copy(table_name, df, copy, strides, row_strides, jitter, rng)
+            scaled.to_csv(tmp_path, mode="w" if copy == 0 else "a", header=copy == 0, index=False)
+        os.replace(tmp_path, target)
+        counts[table_name] = len(df) * factor
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a scaled-up copy of the pharma CSVs with intact foreign keys.")
+    parser.add_argument("--factor", type=int, default=10, help="How many times larger the data should be.")
+    parser.add_argument("--data-dir", default=data_dir, help="Folder containing the source CSV files.")
+    parser.add_argument("--out", default="data_scaled", help="Folder to write the scaled CSV files to.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative variation of count measures in added copies.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the jitter.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = scale_data(args.data_dir, args.out, args.factor, args.jitter, args.seed)
+    for table_name, rows in counts.items():
+        print(f"✅ {table_name}: {rows:,} rows")
+    print(f"Wrote {sum(counts.values()):,} rows to '{args.out}' in {time.perf_counter() - start:.2f}s.")
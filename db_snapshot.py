@@ -0,0 +1,181 @@
+import argparse
+import datetime
+import hashlib
+import os
+import sqlite3
+import time
+
+from csv_to_sqlite import load_csv_to_sqlite, data_dir, MANIFEST_TABLE
+
+# Snapshots are written here as pharma_data.<version>.db; CURRENT_LINK is a
+# symlink to the one being served and is repointed atomically on publish
+SNAPSHOT_DIR = "snapshots"
+CURRENT_LINK = "current.db"
+SNAPSHOT_PREFIX = "pharma_data."
+
+# Version stamp and provenance stored in every snapshot
+META_TABLE = "_snapshot"
+
+# Snapshots kept by `build` besides the current one, for rolling back
+KEEP_SNAPSHOTS = 3
+
+
+def _content_version(conn: sqlite3.Connection) -> str:
+    """Hash of the schema and of the ingested CSVs (from the loader's manifest)."""
+    digest = hashlib.sha256()
+    for (sql,) in conn.execute("SELECT sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY type, name"):
+        digest.update(sql.encode())
+    for table_name, sha256 in conn.execute(f"SELECT table_name, sha256 FROM {MANIFEST_TABLE} ORDER BY table_name"):
+        digest.update(f"{table_name}:{sha256}".encode())
+    return digest.hexdigest()[:16]
+
+
+def _finalize(conn: sqlite3.Connection, version: str):
+    """Stamps the version, switches off WAL and refreshes the planner statistics."""
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.execute(f"CREATE TABLE {META_TABLE} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.executemany(f"INSERT INTO {META_TABLE} VALUES (?, ?)", [
+        ("version", version),
+        ("built_at", datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")),
+        ("sqlite_version", sqlite3.sqlite_version),
+    ])
+    # user_version is the data version the result cache is keyed on, so
+    # every snapshot gets its own (derived from the content, 28 bits)
+    conn.execute(f"PRAGMA user_version = {int(version[:7], 16)}")
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+
+
+def snapshot_info(path: str) -> dict:
+    """The META_TABLE entries of a snapshot plus its data version and size."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+    try:
+        info = dict(conn.execute(f"SELECT key, value FROM {META_TABLE}").fetchall())
+        info["data_version"] = conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+    info["path"] = os.path.realpath(path)
+    info["bytes"] = os.path.getsize(path)
+    return info
+
+
+def build_snapshot(snapshot_dir: str = SNAPSHOT_DIR, data_path: str = data_dir, workers: int = 1) -> dict:
+    """
+    Builds a read-only snapshot of the CSVs in `snapshot_dir`: loaded with
+    every index and rollup, stamped with a content version, ANALYZEd and
+    VACUUMed into a compact file that is never written again, so it can be
+    served with immutable=1 and shared through the OS page cache by every
+    worker process. Identical data yields the same version and file name,
+    in which case the existing snapshot is kept. Returns snapshot_info().
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    work_path = os.path.join(snapshot_dir, f".build-{os.getpid()}.db")
+    start = time.perf_counter()
+    try:
+        results = load_csv_to_sqlite(work_path, data_path, force=True, workers=workers)
+        failed = [name for name, result in results.items() if result["action"] in ("missing", "error")]
+        if failed:
+            raise RuntimeError(f"Not building a snapshot: could not load {', '.join(failed)}")
+
+        conn = sqlite3.connect(work_path, isolation_level=None)
+        try:
+            version = _content_version(conn)
+            target = os.path.join(snapshot_dir, f"{SNAPSHOT_PREFIX}{version}.db")
+            if os.path.exists(target):
+                print(f"Snapshot {version} already exists, keeping '{target}'.")
+                return snapshot_info(target)
+
+            _finalize(conn, version)
+            # Written under a temporary name first so a half-written file is never picked up
+            conn.execute("VACUUM INTO ?", (target + ".tmp",))
+        finally:
+            conn.close()
+
+        check = sqlite3.connect(target + ".tmp")
+        try:
+            status = check.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            check.close()
+        if status != "ok":
+            os.remove(target + ".tmp")
+            raise RuntimeError(f"Snapshot {version} failed the integrity check: {status}")
+        os.chmod(target + ".tmp", 0o444)
+        os.replace(target + ".tmp", target)
+    finally:
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(work_path + suffix):
+                os.remove(work_path + suffix)
+
+    info = snapshot_info(target)
+    print(f"✅ Built snapshot {version} ({info['bytes'] / 2**20:.1f} MiB) in {time.perf_counter() - start:.2f}s: '{target}'")
+    return info
+
+
+def current_snapshot(snapshot_dir: str = SNAPSHOT_DIR) -> str | None:
+    """Path of the published snapshot, or None before the first publish."""
+    link = os.path.join(snapshot_dir, CURRENT_LINK)
+    return os.path.realpath(link) if os.path.exists(link) else None
+
+
+def publish_snapshot(path: str, snapshot_dir: str = SNAPSHOT_DIR):
+    """
+    Atomically points CURRENT_LINK at `path`, which must be in `snapshot_dir`.
+    Running servers pick it up on their next check (backend_app.SNAPSHOT_DB),
+    without a restart; queries already running finish on the old file.
+    """
+    if os.path.dirname(os.path.realpath(path)) != os.path.realpath(snapshot_dir):
+        raise ValueError(f"'{path}' is not in the snapshot directory '{snapshot_dir}'")
+    snapshot_info(path)  # refuse anything that is not a snapshot
+    link = os.path.join(snapshot_dir, CURRENT_LINK)
+    tmp_link = link + f".{os.getpid()}.tmp"
+    # Relative, so the directory can be copied or mounted elsewhere
+    os.symlink(os.path.basename(path), tmp_link)
+    os.replace(tmp_link, link)
+    print(f"✅ Published '{os.path.basename(path)}' as '{link}'.")
+
+
+def prune_snapshots(snapshot_dir: str = SNAPSHOT_DIR, keep: int = KEEP_SNAPSHOTS) -> list[str]:
+    """
+    Deletes all but the `keep` newest snapshots besides the current one.
+    Processes still reading a deleted file keep it until they switch away.
+    """
+    current = current_snapshot(snapshot_dir)
+    paths = [os.path.join(snapshot_dir, name) for name in os.listdir(snapshot_dir)
+             if name.startswith(SNAPSHOT_PREFIX) and name.endswith(".db")]
+    paths = [path for path in paths if os.path.realpath(path) != current]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    removed = paths[keep:]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build, publish and inspect read-only database snapshots.")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR, help="Folder holding the snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build a snapshot from the CSVs and publish it.")
+    build.add_argument("--data-dir", default=data_dir, help="Folder containing the CSV files.")
+    build.add_argument("--workers", type=int, default=1, help="Worker processes used to parse tables in parallel.")
+    build.add_argument("--no-publish", action="store_true", help="Only build; publish later with `publish`.")
+    build.add_argument("--keep", type=int, default=KEEP_SNAPSHOTS, help="Older snapshots to keep for rollbacks.")
+    publish = commands.add_parser("publish", help="Make a snapshot the current one.")
+    publish.add_argument("path", help="Snapshot file, e.g. snapshots/pharma_data.<version>.db")
+    info = commands.add_parser("info", help="Show the version stamp of a snapshot.")
+    info.add_argument("path", nargs="?", help="Snapshot file (default: the current one).")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        snapshot = build_snapshot(args.dir, args.data_dir, args.workers)
+        if not args.no_publish:
+            publish_snapshot(snapshot["path"], args.dir)
+            for path in prune_snapshots(args.dir, args.keep):
+                print(f"Removed old snapshot '{path}'.")
+    elif args.command == "publish":
+        publish_snapshot(args.path, args.dir)
+    else:
+        path = args.path or current_snapshot(args.dir)
+        if path is None:
+            parser.error(f"no snapshot published in '{args.dir}'")
+        for key, value in snapshot_info(path).items():
+            print(f"{key}: {value}")
@@ -0,0 +1,222 @@
+import re
+from collections import Counter
+from difflib import SequenceMatcher
+
+# Dimensions whose names questions refer to, with the query that reads the
+# (id, name) pairs and the SQL expression to filter on the name
+ENTITY_SOURCES = {
+    "hcp": {
+        "table": "hcp_dim",
+        "id_column": "hcp_id",
+        "name_sql": "full_name",
+        "sql": "SELECT hcp_id, full_name FROM hcp_dim WHERE full_name IS NOT NULL",
+    },
+    "account": {
+        "table": "account_dim",
+        "id_column": "account_id",
+        "name_sql": "name",
+        "sql": "SELECT account_id, name FROM account_dim WHERE name IS NOT NULL",
+    },
+    "rep": {
+        "table": "rep_dim",
+        "id_column": "rep_id",
+        "name_sql": "first_name || ' ' || last_name",
+        "sql": "SELECT rep_id, first_name || ' ' || last_name FROM rep_dim WHERE first_name IS NOT NULL",
+    },
+    "territory": {
+        "table": "territory_dim",
+        "id_column": "territory_id",
+        "name_sql": "name",
+        "sql": "SELECT territory_id, name FROM territory_dim WHERE name IS NOT NULL",
+    },
+}
+
+# Trigram Dice similarity a mention with as many words as the name needs to
+# resolve to it; catches a misspelled letter or two ("Blake Garsia")
+MATCH_THRESHOLD = 0.7
+MIN_MENTION_CHARS = 4
+
+# Inexact matches may not start or end with one of these, so "calls by
+# clinic" never resolves to "Bay Clinic"
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "by", "did", "do", "does", "for", "from", "how", "in", "is",
+    "many", "of", "on", "or", "the", "to", "vs", "was", "what", "which", "who", "with",
+    # time words, so "center last month" never stands in for a name
+    "last", "this", "next", "previous", "prior", "current", "day", "days", "week", "weeks",
+    "month", "months", "quarter", "quarters", "year", "years", "today", "yesterday",
+    "ytd", "mtd", "qtd",
+}
+
+# Words many names share; an inexact match has to come from the rest of the
+# name, so "the medical center" never resolves to "Bay Medical Center"
+GENERIC_WORDS = {
+    "medical", "center", "centre", "hospital", "hospitals", "clinic", "clinics", "health",
+    "healthcare", "care", "group", "associates", "practice", "pharmacy", "institute",
+    "university", "general", "regional", "community", "family", "territory", "region",
+    "district", "north", "south", "east", "west", "central",
+}
+
+# Letter similarity (difflib ratio) every distinctive word of a name needs
+# with the mention word in its place for an inexact match
+WORD_MATCH_THRESHOLD = 0.6
+
+# Names sharing more IDs than this (e.g. one clinic name used by many
+# accounts) are hinted as a name equality filter instead of an ID list
+MAX_HINT_IDS = 20
+
+# Titles dropped from names and mentions, so "Dr Blake Garcia" and "Blake Garcia" match
+HONORIFICS = {"dr", "doctor", "prof", "mr", "mrs", "ms"}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def normalize_name(text: str) -> str:
+    """Lower-cased words without punctuation or leading titles."""
+    words = _WORD_RE.findall(text.lower())
+    while words and words[0] in HONORIFICS:
+        words = words[1:]
+    return " ".join(words)
+
+
+def _trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _distinctive_words_match(name_words: list[str], mention_words: list[str]) -> bool:
+    """
+    True if the name has a word outside GENERIC_WORDS and every such word is
+    close to the mention word in the same position ("garsia" for "garcia").
+    """
+    distinctive = [(word, other) for word, other in zip(name_words, mention_words) if word not in GENERIC_WORDS]
+    return bool(distinctive) and all(
+        word == other or SequenceMatcher(None, word, other).ratio() >= WORD_MATCH_THRESHOLD
+        for word, other in distinctive
+    )
+
+
+class EntityIndex:
+    """
+    In-memory trigram index over the names of the ENTITY_SOURCES dimensions
+    for one data version. Rows with the same normalized name share an entry,
+    so the index stays small when names repeat.
+    """
+
+    def __init__(self, data_version: int = 0):
+        self.data_version = data_version
+        self.entries = []
+        self._keys = {}
+        # Word count -> trigram -> entry indexes; mentions are only compared
+        # with names of the same length
+        self._postings = {}
+        self._max_words = 1
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, kind: str, entity_id, name: str):
+        normalized = normalize_name(str(name))
+        if not normalized:
+            return
+        key = (kind, normalized)
+        index = self._keys.get(key)
+        if index is None:
+            index = self._keys[key] = len(self.entries)
+            trigrams = _trigrams(normalized)
+            word_count = len(normalized.split())
+            self.entries.append({"kind": kind, "name": str(name), "words": normalized.split(),
+                                 "trigrams": trigrams, "numbers": _NUMBER_RE.findall(normalized), "ids": []})
+            postings = self._postings.setdefault(word_count, {})
+            for gram in trigrams:
+                postings.setdefault(gram, []).append(index)
+            self._max_words = max(self._max_words, word_count)
+        self.entries[index]["ids"].append(entity_id)
+
+    def _candidates(self, mention: str):
+        """(score, entry index) of the entries similar enough to the mention."""
+        words = mention.split()
+        postings = self._postings.get(len(words))
+        if postings is None:
+            return
+        trigrams = _trigrams(mention)
+        numbers = _NUMBER_RE.findall(mention)
+        fuzzy_allowed = words[0] not in STOPWORDS and words[-1] not in STOPWORDS
+        overlaps = Counter()
+        for gram in trigrams:
+            overlaps.update(postings.get(gram, ()))
+        for index, overlap in overlaps.items():
+            entry = self.entries[index]
+            score = 2 * overlap / (len(trigrams) + len(entry["trigrams"]))
+            if score < 1.0 and not fuzzy_allowed:
+                continue
+            # "Territory 1" never matches "Territory 2"
+            if score < MATCH_THRESHOLD or entry["numbers"] != numbers:
+                continue
+            if score < 1.0 and not _distinctive_words_match(entry["words"], words):
+                continue
+            yield score, index
+
+    def resolve(self, question: str) -> list[dict]:
+        """
+        Finds the dimension names mentioned in a question, allowing for small
+        misspellings. Every run of words is scored against the index and the
+        best non-overlapping matches win. Returns one dict per mention with
+        the matched name, its dimension and the IDs of all rows carrying it.
+        """
+        words = _WORD_RE.findall(question.lower())
+        spans = []
+        for start in range(len(words)):
+            # One extra word so a leading title ("Dr") can be part of the mention
+            for end in range(start + 1, min(len(words), start + self._max_words + 1) + 1):
+                mention = normalize_name(" ".join(words[start:end]))
+                if len(mention) < MIN_MENTION_CHARS:
+                    continue
+                for score, index in self._candidates(mention):
+                    spans.append((score, end - start, start, end, index, mention))
+
+        # Best score first, the longer mention on ties; every word is used once
+        spans.sort(key=lambda span: (-span[0], -span[1], span[2]))
+        used = set()
+        best = {}
+        matched = set()
+        matches = []
+        for score, _, start, end, index, mention in spans:
+            taken = set(range(start, end))
+            if index in matched or (taken & used and best.get((start, end)) != score):
+                continue
+            # Equally good names for the same words are all kept (ambiguous mention)
+            used |= taken
+            best[(start, end)] = score
+            matched.add(index)
+            entry = self.entries[index]
+            source = ENTITY_SOURCES[entry["kind"]]
+            matches.append({
+                "mention": mention,
+                "kind": entry["kind"],
+                "table": source["table"],
+                "column": source["id_column"],
+                "name": entry["name"],
+                "ids": list(entry["ids"]),
+                "score": round(score, 3),
+            })
+        return matches
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def format_entity_hints(matches: list[dict], max_ids: int = MAX_HINT_IDS) -> str:
+    """The lines appended to the question telling the model which IDs the names resolved to."""
+    lines = ["-- Resolved entities: filter on these keys with = or IN instead of matching names with LIKE."]
+    for match in matches:
+        ids = match["ids"]
+        if len(ids) == 1:
+            condition = f"{match['column']} = {ids[0]}"
+        elif len(ids) <= max_ids:
+            condition = f"{match['column']} IN ({', '.join(str(entity_id) for entity_id in ids)})"
+        else:
+            condition = f"{ENTITY_SOURCES[match['kind']]['name_sql']} = {_quote(match['name'])} ({len(ids)} rows)"
+        lines.append(f'-- "{match["mention"]}" is {match["table"]} "{match["name"]}": {condition}')
+    return "\n".join(lines)
@@ -0,0 +1,168 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager, nullcontext
+
+# Histogram buckets in seconds, from cached SQL lookups up to slow LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Span name -> pipeline stage it is summed into in RequestTrace.timings()
+SPAN_STAGES = {
+    "prompt_build": "prompt",
+    "question_cache": "cache",
+    "generate_sql": "llm",
+    "execute_sql": "sql",
+    "final_answer": "answer",
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters and histograms, rendered in the Prometheus text
+    exposition format. Metrics are declared up front with `declare`;
+    `collectors` are called at render time for values kept elsewhere
+    (e.g. cache statistics) and return (name, labels dict, value) tuples.
+    """
+
+    def __init__(self, prefix: str = "text2sql"):
+        self.prefix = prefix
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def declare(self, name: str, kind: str, help_text: str):
+        """Registers a "counter", "gauge" or "histogram" with its HELP line."""
+        self._help[name] = (kind, help_text)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(LATENCY_BUCKETS, value)
+            if index < len(LATENCY_BUCKETS):
+                histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def snapshot(self) -> dict:
+        """Counter values and histogram count/sum as a plain dict, e.g. for logs or tests."""
+        with self._lock:
+            return {
+                "counters": {f"{name}{_label_text(labels)}": value for (name, labels), value in self._counters.items()},
+                "histograms": {f"{name}{_label_text(labels)}": {"count": h["count"], "sum": h["sum"]}
+                               for (name, labels), h in self._histograms.items()},
+            }
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text format (version 0.0.4)."""
+        samples = {}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                samples.setdefault(name, []).append((labels, value))
+            histograms = {key: dict(h, buckets=list(h["buckets"])) for key, h in self._histograms.items()}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                samples.setdefault(name, []).append((tuple(sorted(labels.items())), value))
+
+        lines = []
+        for name in sorted(set(samples) | {name for name, _ in histograms} | set(self._help)):
+            full_name = f"{self.prefix}_{name}"
+            kind, help_text = self._help.get(name, ("untyped", ""))
+            if help_text:
+                lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, value in sorted(samples.get(name, [])):
+                lines.append(f"{full_name}{_label_text(labels)} {value:g}")
+            for (histogram_name, labels), histogram in sorted(histograms.items()):
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{_label_text(labels, (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{full_name}_bucket{_label_text(labels, (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{full_name}_sum{_label_text(labels)} {histogram['sum']:.6f}")
+                lines.append(f"{full_name}_count{_label_text(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestTrace:
+    """
+    Timed spans of one question's trip through the pipeline. Spans may be
+    recorded from several threads (e.g. racing SQL candidates). Finished
+    spans are also observed in the `metrics` histogram "stage_seconds".
+    """
+
+    def __init__(self, metrics: MetricsRegistry | None = None):
+        self.metrics = metrics
+        self.spans = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Times the enclosed block. Yields the span dict so the block can add
+        attributes, e.g. span["rows"] = 10. An escaping exception is recorded
+        under "error" and re-raised.
+        """
+        start = time.perf_counter()
+        record = {"name": name, "start_ms": round((start - self._started) * 1000, 3), **attributes}
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            record["duration_ms"] = round(duration * 1000, 3)
+            with self._lock:
+                self.spans.append(record)
+            if self.metrics is not None:
+                self.metrics.observe("stage_seconds", duration, stage=SPAN_STAGES.get(name, name))
+
+    def timings(self) -> dict:
+        """
+        Per-request timing dict: total wall time, milliseconds summed per
+        stage (spans that overlap, like racing candidates, add up) and the
+        spans in start order.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        stages = {}
+        for span in spans:
+            stage = SPAN_STAGES.get(span["name"], span["name"])
+            stages[f"{stage}_ms"] = round(stages.get(f"{stage}_ms", 0.0) + span["duration_ms"], 3)
+        return {"total_ms": round(self.elapsed * 1000, 3), **stages, "spans": spans}
+
+
+def maybe_span(trace: RequestTrace | None, name: str, **attributes):
+    """trace.span(name), or a no-op context yielding a throwaway dict when there is no trace."""
+    return trace.span(name, **attributes) if trace is not None else nullcontext({})
@@ -0,0 +1,105 @@
+import json
+from dataclasses import dataclass, field
+
+# How many rows of a result are shown to the LLM when phrasing the answer
+SUMMARY_HEAD_ROWS = 20
+
+# Rows serialized by estimated_bytes(); the size of the rest is extrapolated
+SIZE_SAMPLE_ROWS = 50
+
+
+@dataclass(frozen=True)
+class QueryResult:
+    """
+    Result of execute_sql: column names plus row tuples, straight from the
+    cursor. `truncated` is set when the query produced more than the row cap
+    and only the first `row_count` rows were kept. Failed queries carry the
+    error string (e.g. "SQL_ERROR: no such column: x") and no rows.
+    """
+    columns: list[str] = field(default_factory=list)
+    rows: list[tuple] = field(default_factory=list)
+    truncated: bool = False
+    error: str | None = None
+
+    @property
+    def row_count(self) -> int:
+        return len(self.rows)
+
+    @property
+    def error_type(self) -> str | None:
+        """Error class prefix, e.g. "SQL_ERROR", "VALIDATION_ERROR" or "TIMEOUT_ERROR"."""
+        return self.error.split(":", 1)[0] if self.error else None
+
+    @property
+    def is_empty(self) -> bool:
+        return self.error is None and not self.rows
+
+    def to_records(self) -> list[dict]:
+        """Rows as a list of {column: value} dicts."""
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form, e.g. for API responses."""
+        return {
+            "columns": self.columns,
+            "rows": [list(row) for row in self.rows],
+            "row_count": self.row_count,
+            "truncated": self.truncated,
+            "error": self.error,
+        }
+
+    def estimated_bytes(self, sample_rows: int = SIZE_SAMPLE_ROWS) -> int:
+        """
+        Approximate size of to_dict() as JSON: about `sample_rows` rows,
+        spread over the result, are serialized and their average size is
+        scaled to all rows.
+        """
+        sample = self.rows[::max(1, self.row_count // sample_rows)]
+        header = len(json.dumps({"columns": self.columns, "rows": [], "row_count": self.row_count,
+                                 "truncated": self.truncated, "error": self.error}, default=str))
+        if not sample:
+            return header
+        sample_bytes = len(json.dumps([list(row) for row in sample], default=str))
+        return header + sample_bytes * self.row_count // len(sample)
+
+    def _numeric_stats(self) -> list[str]:
+        stats = []
+        for i, column in enumerate(self.columns):
+            values = [row[i] for row in self.rows if row[i] is not None]
+            if not values or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                continue
+            total = sum(values)
+            stats.append(
+                f"{column}: min={min(values)}, max={max(values)}, sum={round(total, 4)}, avg={round(total / len(values), 4)}"
+            )
+        return stats
+
+    def summary(self, head_rows: int = SUMMARY_HEAD_ROWS) -> str:
+        """
+        Compact text description for the LLM: row count, the first rows and,
+        for larger results, per-column aggregates of the numeric columns.
+        """
+        if self.error:
+            return self.error
+        if not self.rows:
+            return "Empty result set (0 rows)."
+
+        count = f"{self.row_count}" + (" (truncated; more rows exist)" if self.truncated else "")
+        lines = [f"Row count: {count}", "Columns: " + ", ".join(self.columns)]
+
+        shown = self.rows[:head_rows]
+        lines.append("First rows:" if len(shown) < self.row_count else "All rows:")
+        lines.append(" | ".join(self.columns))
+        for row in shown:
+            lines.append(" | ".join("NULL" if v is None else str(v) for v in row))
+
+        if len(shown) < self.row_count:
+            stats = self._numeric_stats()
+            if stats:
+                lines.append("Numeric column stats over all returned rows:")
+                lines.extend(stats)
+
+        return "\n".join(lines)
+
+    def __str__(self) -> str:
+        return self.summary()
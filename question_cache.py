@@ -0,0 +1,186 @@
+import re
+import math
+import time
+import sqlite3
+import threading
+from collections import Counter
+
+# Filler words a near match may differ in. Anything else that differs (a
+# metric like TRx/NRx, a name, a number, a value like tier "a") means
+# another question. Words that change the meaning ("and", "or", "not",
+# "top", "per") are deliberately left out.
+STOPWORDS = {
+    "the", "an", "of", "for", "in", "on", "at", "by", "to", "from", "with", "please", "me", "us",
+    "show", "list", "give", "tell", "find", "get", "what", "which", "is", "are", "was", "were",
+    "there", "do", "does", "did", "can", "you", "i", "all",
+}
+
+
+def normalize_question(question: str) -> str:
+    """Lower-cases a question, drops punctuation and collapses whitespace."""
+    text = re.sub(r"[^\w\s.%-]", " ", question.lower())
+    text = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _ngram_vector(text: str, n: int = 3) -> dict:
+    """Unit-length char n-gram count vector of a normalized question."""
+    padded = f" {text} "
+    counts = Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+    norm = math.sqrt(sum(c * c for c in counts.values())) or 1.0
+    return {gram: c / norm for gram, c in counts.items()}
+
+
+def _content_words(text: str) -> list[str]:
+    """The words of a normalized question that are not STOPWORDS, in order."""
+    return [word for word in text.split() if word not in STOPWORDS]
+
+
+def _cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(gram, 0.0) for gram, weight in a.items())
+
+
+class QuestionCache:
+    """
+    Persistent cache mapping a normalized user question to the SQL and
+    explanation that answered it successfully.
+
+    Exact matches are looked up by normalized text. If `near_match_threshold`
+    is set, a question whose char-trigram cosine similarity with a cached one
+    reaches the threshold is a hit too, but only if the two differ in
+    STOPWORDS alone ("show me the TRx by territory" vs "TRx by territory");
+    "TRx" vs "NRx", "tier a" vs "tier b" or "2023" vs "2024" never match.
+    The least recently used entries are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 1000, near_match_threshold: float | None = None):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.near_match_threshold = near_match_threshold
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS question_cache (
+                normalized   TEXT PRIMARY KEY,
+                question     TEXT NOT NULL,
+                sql          TEXT NOT NULL,
+                explanation  TEXT,
+                hits         INTEGER NOT NULL DEFAULT 0,
+                created_at   REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+        # In-memory similarity index over the cached questions
+        self._vectors = {}
+        if near_match_threshold is not None:
+            for (normalized,) in self._conn.execute("SELECT normalized FROM question_cache"):
+                self._vectors[normalized] = _ngram_vector(normalized)
+
+    def _nearest(self, normalized: str) -> str | None:
+        vector = _ngram_vector(normalized)
+        content = _content_words(normalized)
+        best, best_score = None, self.near_match_threshold
+        for candidate, candidate_vector in self._vectors.items():
+            score = _cosine(vector, candidate_vector)
+            if score >= best_score and _content_words(candidate) == content:
+                best, best_score = candidate, score
+        return best
+
+    def lookup(self, question: str) -> dict | None:
+        """
+        Returns {"sql", "explanation", "match", "cached_question"} for a
+        cached question, or None on a miss. "match" is "exact" or "near".
+        """
+        normalized = normalize_question(question)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT question, sql, explanation FROM question_cache WHERE normalized = ?",
+                (normalized,)
+            ).fetchone()
+            match = "exact"
+            key = normalized
+
+            if row is None and self.near_match_threshold is not None:
+                key = self._nearest(normalized)
+                if key is not None:
+                    row = self._conn.execute(
+                        "SELECT question, sql, explanation FROM question_cache WHERE normalized = ?",
+                        (key,)
+                    ).fetchone()
+                    match = "near"
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE question_cache SET hits = hits + 1, last_used_at = ? WHERE normalized = ?",
+                (time.time(), key)
+            )
+            self._conn.commit()
+            if match == "exact":
+                self.exact_hits += 1
+            else:
+                self.near_hits += 1
+            return {"cached_question": row[0], "sql": row[1], "explanation": row[2], "match": match}
+
+    def store(self, question: str, sql_query: str, explanation: str | None):
+        """
+        Remembers the SQL that answered a question. Callers must only store
+        SQL that executed without error and returned rows.
+        """
+        normalized = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO question_cache (normalized, question, sql, explanation, hits, created_at, last_used_at)
+                   VALUES (?, ?, ?, ?, 0, ?, ?)
+                   ON CONFLICT(normalized) DO UPDATE SET
+                       sql = excluded.sql, explanation = excluded.explanation, last_used_at = excluded.last_used_at""",
+                (normalized, question, sql_query, explanation, now, now)
+            )
+            if self.near_match_threshold is not None:
+                self._vectors[normalized] = _ngram_vector(normalized)
+            self._evict()
+            self._conn.commit()
+
+    def invalidate(self, question: str):
+        """Drops the entry for a question, e.g. when its SQL stopped working."""
+        normalized = normalize_question(question)
+        with self._lock:
+            self._conn.execute("DELETE FROM question_cache WHERE normalized = ?", (normalized,))
+            self._conn.commit()
+            self._vectors.pop(normalized, None)
+
+    def _evict(self):
+        evicted = self._conn.execute(
+            """SELECT normalized FROM question_cache
+               ORDER BY last_used_at DESC LIMIT -1 OFFSET ?""",
+            (self.max_entries,)
+        ).fetchall()
+        for (normalized,) in evicted:
+            self._conn.execute("DELETE FROM question_cache WHERE normalized = ?", (normalized,))
+            self._vectors.pop(normalized, None)
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the hit rate."""
+        with self._lock:
+            hits = self.exact_hits + self.near_hits
+            lookups = hits + self.misses
+            entries = self._conn.execute("SELECT COUNT(*) FROM question_cache").fetchone()[0]
+            return {
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "max_entries": self.max_entries,
+            }
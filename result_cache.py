@@ -0,0 +1,116 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+
+# String literals are kept verbatim; everything else is normalized
+_LITERAL_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+_TABLE_ALIAS_RE = re.compile(
+    r"\b(from|join)\s+([a-z_][a-z0-9_]*)\s+(?:as\s+)?([a-z_][a-z0-9_]*)\b"
+)
+_RESERVED = {
+    "where", "join", "inner", "left", "right", "full", "cross", "outer", "on",
+    "using", "group", "order", "limit", "having", "union", "natural", "window",
+    "except", "intersect",
+}
+
+
+def normalize_sql(sql_query: str) -> str:
+    """
+    Normalizes a SQL string for cache lookups: collapses whitespace,
+    lower-cases everything outside string literals, drops trailing
+    semicolons and renames table aliases to t1, t2, ... in order of
+    appearance, so `SELECT SUM(r.trx_cnt) FROM fact_rx r` and
+    `select sum(T1.trx_cnt) from fact_rx as T1` share a key.
+    """
+    parts = _LITERAL_RE.split(sql_query.strip().rstrip(";").strip())
+    code = [part.lower() if i % 2 == 0 else part for i, part in enumerate(parts)]
+
+    aliases = {}
+    for i in range(0, len(code), 2):
+        for match in _TABLE_ALIAS_RE.finditer(code[i]):
+            alias = match.group(3)
+            if alias not in _RESERVED and alias not in aliases:
+                aliases[alias] = f"t{len(aliases) + 1}"
+
+    # "FROM fact_rx AS r" and "FROM fact_rx r" are the same thing
+    for i in range(0, len(code), 2):
+        code[i] = _TABLE_ALIAS_RE.sub(
+            lambda m: m.group(0) if m.group(3) in _RESERVED else f"{m.group(1)} {m.group(2)} {m.group(3)}",
+            code[i],
+        )
+
+    if aliases:
+        alias_re = re.compile(r"\b(" + "|".join(map(re.escape, aliases)) + r")\b")
+        for i in range(0, len(code), 2):
+            code[i] = alias_re.sub(lambda m: aliases[m.group(1)], code[i])
+
+    for i in range(0, len(code), 2):
+        code[i] = re.sub(r"\s+", " ", code[i])
+        code[i] = re.sub(r"\s*([(),=<>+*/-])\s*", r"\1", code[i])
+
+    return "".join(code).strip()
+
+
+class QueryResultCache:
+    """
+    Thread-safe LRU cache of execute_sql results keyed on normalized SQL.
+
+    Every entry is tagged with the data version it was computed against, so
+    bumping the version (which the CSV loader does whenever data changes)
+    invalidates all older entries. Entries also expire after `ttl_seconds`.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float | None = 600, max_entry_rows: int = 50_000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_entry_rows = max_entry_rows
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sql_query: str, data_version: int):
+        """Returns the cached result, or None on a miss."""
+        key = normalize_sql(sql_query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                version, stored_at, result = entry
+                expired = self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds
+                if version == data_version and not expired:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, sql_query: str, data_version: int, result):
+        """Stores a result, evicting the least recently used entries if full."""
+        if self.max_entries <= 0:
+            return
+        if getattr(result, "row_count", 0) > self.max_entry_rows:
+            return
+        key = normalize_sql(sql_query)
+        with self._lock:
+            self._entries[key] = (data_version, time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
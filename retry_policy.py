@@ -0,0 +1,144 @@
+import time
+import random
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+# Exponential backoff with full jitter for rate limits and transient API errors
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+
+
+@dataclass(frozen=True)
+class RetryBudget:
+    """Per-question limits for SQL generation: LLM requests, total tokens and wall-clock seconds."""
+    max_calls: int = 5
+    max_tokens: int = 30_000
+    max_seconds: float = 60.0
+
+
+def classify_llm_error(error: Exception) -> str:
+    """
+    Sorts an exception from an SQL generation call into:
+
+    - "rate_limit": HTTP 429, retried after a backoff,
+    - "transient": timeouts, connection and 5xx errors, retried after a backoff,
+    - "format": the reply had no <explanation>/<sql> tags, retried with feedback,
+    - "fatal": anything else (bad key, bad request, exhausted quota), not retried.
+    """
+    # Imported here so importing this module doesn't load the SDK; it is
+    # already loaded by the client that raised the error
+    import openai
+
+    if isinstance(error, openai.RateLimitError):
+        # An exhausted quota is reported as a 429 too, but waiting won't help
+        return "fatal" if getattr(error, "code", None) == "insufficient_quota" else "rate_limit"
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+        return "transient"
+    if isinstance(error, ValueError):
+        return "format"
+    return "fatal"
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Seconds from the Retry-After header of an API error response, if any."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class RetryController:
+    """
+    Drives the SQL generation retries of one question within a RetryBudget.
+
+    Only the last failed SQL and its error are kept as feedback, so every
+    attempt sends the base messages plus at most two short messages instead
+    of the whole conversation so far.
+    """
+
+    def __init__(self, budget: RetryBudget | None = None, usage: dict | None = None):
+        self.budget = budget or RetryBudget()
+        self.usage = usage
+        self.attempts = 0  # LLM replies received
+        self.backoffs = 0  # requests rejected by rate limits / transient errors
+        self.last_sql = None
+        self.last_error = None
+        self._started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    @property
+    def remaining_calls(self) -> int:
+        return max(self.budget.max_calls - self.attempts - self.backoffs, 0)
+
+    def exhausted(self) -> str | None:
+        """Returns why the budget is used up, or None if another request is allowed."""
+        if not self.remaining_calls:
+            return f"used all {self.budget.max_calls} LLM requests"
+        if self.usage is not None and self.usage["total_tokens"] >= self.budget.max_tokens:
+            return f"used {self.usage['total_tokens']:,} of {self.budget.max_tokens:,} tokens"
+        if self.elapsed >= self.budget.max_seconds:
+            return f"ran for more than {self.budget.max_seconds:g}s"
+        return None
+
+    def backoff_delay(self, error: Exception, counted: bool = False) -> float | None:
+        """
+        Seconds to wait before retrying after a rate limit or transient error,
+        honouring Retry-After. Returns None if the wait would overrun the time
+        budget. `counted` means the failed request is already in `backoffs`
+        (racing candidates charge all of theirs at once).
+        """
+        if not counted:
+            self.backoffs += 1
+        delay = _retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (self.backoffs - 1)))
+        if self.elapsed + delay >= self.budget.max_seconds:
+            return None
+        return delay
+
+    def record_failure(self, sql_query: str | None, error_message: str):
+        """Remembers the latest failed attempt, replacing the previous one."""
+        self.last_sql = sql_query
+        self.last_error = error_message
+
+    def messages(self, base_messages: list) -> list:
+        """The base messages plus feedback on the last failed attempt only."""
+        if self.last_error is None:
+            return list(base_messages)
+        feedback = []
+        if self.last_sql:
+            feedback.append({"role": "assistant", "content": f"<sql>{self.last_sql}</sql>"})
+        feedback.append({"role": "user", "content": f"The previous attempt resulted in an error: {self.last_error} Please try again."})
+        return list(base_messages) + feedback
+
+
+class AttemptStats:
+    """Thread-safe histogram of how many LLM attempts each question needed."""
+
+    def __init__(self):
+        self._histogram = Counter()
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, attempts: int, success: bool):
+        with self._lock:
+            self._histogram[attempts] += 1
+            if not success:
+                self._failures += 1
+
+    def stats(self) -> dict:
+        """Returns the attempts histogram, mean attempts and failure count."""
+        with self._lock:
+            questions = sum(self._histogram.values())
+            total = sum(attempts * count for attempts, count in self._histogram.items())
+            return {
+                "questions": questions,
+                "mean_attempts": total / questions if questions else 0.0,
+                "histogram": dict(sorted(self._histogram.items())),
+                "failures": self._failures,
+            }
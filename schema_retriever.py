@@ -0,0 +1,129 @@
+import re
+from collections import deque
+from system_prompt import TABLE_BLOCKS, JOIN_EDGES
+
+_WORD_RE = re.compile(r"[a-z0-9_]+")
+# Two capitalized words in a row, e.g. "Morgan Chen" or "Mountain Hospital"
+_PROPER_NAME_RE = re.compile(r"\b[A-Z][a-z]+\s+[A-Z][a-z]+\b")
+# A calendar year such as "2024" means the question filters on date_dim
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+
+# Dimensions whose rows are looked up by a person or place name
+NAME_TABLES = ["hcp_dim", "rep_dim", "account_dim"]
+
+
+# Suffixes stripped after plurals, first match that leaves STEM_MIN_CHARS
+# letters, so "prescribed", "visiting" and "cancellation" match "prescribing",
+# "visit" and "cancelled"
+SUFFIXES = ("ation", "ion", "ing", "ed")
+STEM_MIN_CHARS = 4
+
+
+def _stem(word: str) -> str:
+    """Light stemming, applied the same way to questions and keywords."""
+    if len(word) > 3 and word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= STEM_MIN_CHARS:
+            return word[:-len(suffix)]
+    return word
+
+
+def _tokens(text: str) -> list[str]:
+    return [_stem(word) for word in _WORD_RE.findall(text.lower())]
+
+
+def _contains(tokens: list[str], phrase: list[str]) -> bool:
+    n = len(phrase)
+    return any(tokens[i:i + n] == phrase for i in range(len(tokens) - n + 1))
+
+
+# Keyword phrases per table, tokenized once; table and column names count as keywords too
+_TABLE_KEYWORDS = {
+    name: [_tokens(keyword) for keyword in block["keywords"]] + [[name]]
+    for name, block in TABLE_BLOCKS.items()
+}
+
+_NEIGHBOURS = {name: set() for name in TABLE_BLOCKS}
+for left, right in JOIN_EDGES:
+    _NEIGHBOURS[left].add(right)
+    _NEIGHBOURS[right].add(left)
+
+
+def score_tables(question: str) -> dict:
+    """Counts the keyword/synonym phrases of each table mentioned in the question."""
+    tokens = _tokens(question)
+    scores = {}
+    for name, phrases in _TABLE_KEYWORDS.items():
+        score = sum(1 for phrase in phrases if _contains(tokens, phrase))
+        if score:
+            scores[name] = score
+    if _YEAR_RE.search(question):
+        scores["date_dim"] = scores.get("date_dim", 0) + 1
+    return scores
+
+
+def _shortest_path(start: set, goal: str) -> list[str]:
+    """BFS over JOIN_EDGES from any table in `start` to `goal`."""
+    previous = {table: None for table in start}
+    queue = deque(start)
+    while queue:
+        table = queue.popleft()
+        if table == goal:
+            path = []
+            while table is not None and table not in start:
+                path.append(table)
+                table = previous[table]
+            return path
+        for neighbour in _NEIGHBOURS[table]:
+            if neighbour not in previous:
+                previous[neighbour] = table
+                queue.append(neighbour)
+    return [goal]
+
+
+def select_tables(question: str, required: list[str] | None = None) -> list[str] | None:
+    """
+    Picks the tables a question needs from keyword/synonym matches, then
+    adds the bridge tables required to join them (e.g. hcp_dim between
+    fact_rx and territory_dim) and the rollups of the selected facts.
+    Questions mentioning a proper name also get the name dimensions next to
+    the matched tables, and `required` tables (e.g. the dimensions of names
+    resolved to IDs) are always included. Returns None when nothing matched
+    or no fact table was picked, meaning the full schema should be used:
+    a question about prescribing or visits that only matched a dimension
+    would otherwise lose the table holding its numbers.
+    """
+    scores = score_tables(question)
+    for table in required or []:
+        scores[table] = scores.get(table, 0) + 1
+    if not scores:
+        return None
+
+    ordered = sorted(scores, key=lambda name: -scores[name])
+
+    # A person/place name can only be resolved through a name dimension
+    # that joins to the fact tables already matched
+    if _PROPER_NAME_RE.search(question):
+        for table in list(ordered):
+            for neighbour in _NEIGHBOURS[table]:
+                if neighbour in NAME_TABLES and neighbour not in ordered:
+                    ordered.append(neighbour)
+
+    selected = {ordered[0]}
+    for table in ordered[1:]:
+        if table not in selected:
+            selected.update(_shortest_path(selected, table))
+
+    if not any(name.startswith("fact_") for name in selected):
+        return None
+
+    # Rollups of the selected facts come along so the model can prefer them
+    for name, block in TABLE_BLOCKS.items():
+        if block.get("rollup_of") in selected:
+            selected.add(name)
+
+    # Keep the TABLE_BLOCKS order so prompts for the same tables are identical
+    return [name for name in TABLE_BLOCKS if name in selected]
@@ -0,0 +1,295 @@
+import os
+import time
+import sqlite3
+import threading
+
+from connection_pool import SQLiteConnectionPool
+from csv_to_sqlite import csv_files, data_dir, TABLE_SCHEMAS, ROLLUPS
+from query_result import QueryResult
+from sql_validator import validate_sql, validate_sql_text, SQLValidationError
+
+# DuckDB types for the column types declared in TABLE_SCHEMAS / ROLLUPS.
+# IDs such as 3000000015 overflow a 32-bit INTEGER, hence BIGINT.
+DUCKDB_TYPES = {"INTEGER": "BIGINT", "REAL": "DOUBLE", "TEXT": "VARCHAR"}
+
+# How often the DuckDB watchdog checks the time budget and cancel_event
+DUCKDB_WATCH_INTERVAL = 0.05
+
+
+class QueryInterrupted(Exception):
+    """Raised when a query is stopped by its time/step budget or cancel_event."""
+
+
+def fetch_capped(cursor, max_rows: int, batch_size: int) -> tuple[list, bool]:
+    """Streams rows in batches and stops at the row cap instead of fetchall()."""
+    rows = []
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return rows, False
+        rows.extend(batch)
+        if len(rows) > max_rows:
+            del rows[max_rows:]
+            return rows, True
+
+
+class SQLEngine:
+    """
+    Interface execute_sql runs queries through. `dialect` is the SQL
+    dialect name shown to the LLM and `errors` the exception types that
+    mean the SQL itself is wrong.
+    """
+    name = ""
+    dialect = ""
+    errors: tuple = ()
+
+    def data_version(self) -> int:
+        """Changes whenever the data changes; used to key the result cache."""
+        raise NotImplementedError
+
+    def execute(self, sql_query: str, validate: bool, timeout: float, max_steps: int,
+                max_rows: int, cancel_event: threading.Event | None) -> QueryResult:
+        """
+        Runs one query and returns at most `max_rows` rows. Raises
+        SQLValidationError, QueryInterrupted or one of `errors`.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteEngine(SQLEngine):
+    """
+    The default engine: the loader's SQLite file through a pool of
+    read-only connections. Budgets are enforced with the progress handler,
+    which is checked every `progress_steps` VM instructions.
+    """
+    name = "sqlite"
+    dialect = "SQLite"
+    errors = (sqlite3.Error,)
+
+    def __init__(self, pool: SQLiteConnectionPool, progress_steps: int = 10_000, fetch_batch_size: int = 1_000):
+        self.pool = pool
+        self.progress_steps = progress_steps
+        self.fetch_batch_size = fetch_batch_size
+
+    def data_version(self) -> int:
+        # The loader bumps user_version whenever the data changes
+        with self.pool.connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def _query_budget(self, timeout: float, max_steps: int, cancel_event: threading.Event | None):
+        """
+        Builds a progress handler that aborts the running statement once the
+        wall-clock timeout or VM instruction budget is used up, or when
+        cancel_event is set. The returned dict records why it fired.
+        """
+        deadline = time.monotonic() + timeout
+        state = {"steps": 0, "reason": None}
+
+        def handler():
+            state["steps"] += self.progress_steps
+            if cancel_event is not None and cancel_event.is_set():
+                state["reason"] = "cancelled"
+            elif time.monotonic() > deadline:
+                state["reason"] = f"exceeded the {timeout:g}s time limit"
+            elif state["steps"] > max_steps:
+                state["reason"] = f"exceeded the {max_steps:,} VM instruction budget"
+            # A non-zero return value interrupts the statement
+            return 1 if state["reason"] else 0
+
+        return handler, state
+
+    def execute(self, sql_query, validate, timeout, max_steps, max_rows, cancel_event):
+        # Borrow a pooled read-only connection
+        with self.pool.connection() as conn:
+            if validate:
+                for warning in validate_sql(conn, sql_query):
+                    print(f"SQL Validation Warning: {warning}")
+
+            handler, budget = self._query_budget(timeout, max_steps, cancel_event)
+            conn.set_progress_handler(handler, self.progress_steps)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(sql_query)
+                columns = [description[0] for description in cursor.description or []]
+                rows, truncated = fetch_capped(cursor, max_rows, self.fetch_batch_size)
+                cursor.close()
+            except sqlite3.OperationalError:
+                if budget["reason"]:
+                    # Interrupted by the progress handler: the query was too expensive
+                    raise QueryInterrupted(f"query {budget['reason']}") from None
+                raise
+            finally:
+                conn.set_progress_handler(None, 0)
+        return QueryResult(columns=columns, rows=rows, truncated=truncated)
+
+    def close(self):
+        self.pool.close_all()
+
+
+class DuckDBEngine(SQLEngine):
+    """
+    Embedded DuckDB engine with multi-threaded, vectorized execution over
+    the same CSVs the SQLite loader reads.
+
+    By default the CSVs are loaded into in-memory columnar tables. With
+    `parquet_dir` they are converted to Parquet once (again whenever a CSV
+    is newer than its Parquet file) and queried through views instead,
+    which keeps memory flat for large data. The ROLLUPS are built as well,
+    so the schema prompt is the same for both engines. Tables are reloaded
+    when the CSVs change.
+
+    DuckDB has no VM instruction counter, so only the time budget and
+    cancel_event apply; a watchdog thread interrupts the query.
+
+    The in-memory database is writable (the engine loads it itself), so
+    execute refuses anything that DuckDB's parser does not classify as a
+    single SELECT, whether or not the query is validated. A SELECT can still
+    call table functions such as read_csv, so file access is limited to the
+    data and Parquet directories and the configuration is locked before
+    anything is loaded.
+    """
+    name = "duckdb"
+    dialect = "DuckDB"
+
+    def __init__(self, data_path: str = data_dir, parquet_dir: str | None = None,
+                 threads: int | None = None, fetch_batch_size: int = 1_000):
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("The DuckDB engine needs the duckdb package: pip install duckdb") from None
+
+        self.data_path = data_path
+        self.parquet_dir = parquet_dir
+        self.fetch_batch_size = fetch_batch_size
+        self.errors = (duckdb.Error,)
+        self._select_type = duckdb.StatementType.SELECT
+        config = {"threads": threads} if threads else {}
+        self._conn = duckdb.connect(":memory:", config=config)
+        self._restrict_file_access()
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._version = 0
+        self._load_if_changed()
+
+    def _restrict_file_access(self):
+        """Only the data (and Parquet) directories stay readable; generated SQL can't change that."""
+        directories = [os.path.abspath(self.data_path)] + ([os.path.abspath(self.parquet_dir)] if self.parquet_dir else [])
+        listed = ", ".join("'" + directory.replace("'", "''") + "'" for directory in directories)
+        self._conn.execute(f"SET allowed_directories = [{listed}]")
+        self._conn.execute("SET enable_external_access = false")
+        self._conn.execute("SET lock_configuration = true")
+
+    def _csv_paths(self) -> dict:
+        paths = {}
+        for file_name in csv_files:
+            path = os.path.join(self.data_path, file_name)
+            if os.path.exists(path):
+                paths[file_name.replace(".csv", "")] = path
+        return paths
+
+    def _read_csv_sql(self, table_name: str, path: str) -> str:
+        path = path.replace("'", "''")
+        if table_name not in TABLE_SCHEMAS:
+            return f"read_csv('{path}', header = true)"
+        columns = ", ".join(
+            f"'{name}': '{DUCKDB_TYPES[sql_type]}'" for name, sql_type in TABLE_SCHEMAS[table_name]["columns"]
+        )
+        return f"read_csv('{path}', header = true, columns = {{{columns}}})"
+
+    def _parquet_source(self, table_name: str, csv_path: str) -> str:
+        """Converts a CSV to Parquet if it is missing or stale and returns its read_parquet() source."""
+        os.makedirs(self.parquet_dir, exist_ok=True)
+        parquet_path = os.path.join(self.parquet_dir, f"{table_name}.parquet")
+        if not os.path.exists(parquet_path) or os.path.getmtime(parquet_path) < os.path.getmtime(csv_path):
+            print(f"Converting '{csv_path}' to Parquet...")
+            tmp_path = parquet_path + ".tmp"
+            escaped = tmp_path.replace("'", "''")
+            self._conn.execute(f"COPY (SELECT * FROM {self._read_csv_sql(table_name, csv_path)}) TO '{escaped}' (FORMAT PARQUET)")
+            os.replace(tmp_path, parquet_path)
+        escaped = parquet_path.replace("'", "''")
+        return f"read_parquet('{escaped}')"
+
+    def _load_if_changed(self):
+        paths = self._csv_paths()
+        fingerprint = tuple(sorted((table, os.stat(path).st_size, os.stat(path).st_mtime) for table, path in paths.items()))
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return
+            start = time.perf_counter()
+            for table_name, path in paths.items():
+                if self.parquet_dir:
+                    source = self._parquet_source(table_name, path)
+                    self._conn.execute(f'CREATE OR REPLACE VIEW "{table_name}" AS SELECT * FROM {source}')
+                else:
+                    source = self._read_csv_sql(table_name, path)
+                    self._conn.execute(f'CREATE OR REPLACE TABLE "{table_name}" AS SELECT * FROM {source}')
+
+            for name, rollup in ROLLUPS.items():
+                if not all(table in paths for table in rollup["depends_on"]):
+                    continue
+                definitions = ", ".join(f'"{c}" {DUCKDB_TYPES[t]}' for c, t in rollup["columns"])
+                self._conn.execute(f'CREATE OR REPLACE TABLE "{name}" ({definitions})')
+                self._conn.execute(f'INSERT INTO "{name}" ' + rollup["select"].format(where=""))
+
+            self._fingerprint = fingerprint
+            self._version += 1
+            print(f"DuckDB engine loaded {len(paths)} tables in {time.perf_counter() - start:.2f}s.")
+
+    def data_version(self) -> int:
+        self._load_if_changed()
+        return self._version
+
+    def _watch(self, cursor, done: threading.Event, timeout: float, cancel_event: threading.Event | None, state: dict):
+        deadline = time.monotonic() + timeout
+        while not done.wait(DUCKDB_WATCH_INTERVAL):
+            if cancel_event is not None and cancel_event.is_set():
+                state["reason"] = "cancelled"
+            elif time.monotonic() > deadline:
+                state["reason"] = f"exceeded the {timeout:g}s time limit"
+            if state["reason"]:
+                cursor.interrupt()
+                return
+
+    def _require_single_select(self, cursor, sql_query: str):
+        """Raises SQLValidationError unless the parser sees exactly one SELECT statement."""
+        statements = cursor.extract_statements(sql_query)
+        if len(statements) != 1:
+            raise SQLValidationError([{"code": "multiple_statements", "message": "Only a single SQL statement is allowed."}])
+        if statements[0].type != self._select_type:
+            raise SQLValidationError([{"code": "not_select", "message": "Only read-only SELECT queries are allowed."}])
+
+    def execute(self, sql_query, validate, timeout, max_steps, max_rows, cancel_event):
+        # Each query gets its own cursor (a connection to the same database), which is thread-safe
+        cursor = self._conn.cursor()
+        done = threading.Event()
+        state = {"reason": None}
+        try:
+            self._require_single_select(cursor, sql_query)
+            if validate:
+                validate_sql_text(sql_query)
+                try:
+                    cursor.execute(f"EXPLAIN {sql_query.strip().rstrip(';')}")
+                except self.errors as e:
+                    raise SQLValidationError([{"code": "invalid_sql", "message": str(e)}]) from None
+
+            watchdog = threading.Thread(target=self._watch, args=(cursor, done, timeout, cancel_event, state), daemon=True)
+            watchdog.start()
+            try:
+                cursor.execute(sql_query)
+                columns = [description[0] for description in cursor.description or []]
+                rows, truncated = fetch_capped(cursor, max_rows, self.fetch_batch_size)
+            except self.errors:
+                if state["reason"]:
+                    raise QueryInterrupted(f"query {state['reason']}") from None
+                raise
+            finally:
+                done.set()
+        finally:
+            cursor.close()
+        return QueryResult(columns=columns, rows=rows, truncated=truncated)
+
+    def close(self):
+        self._conn.close()
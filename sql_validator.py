@@ -0,0 +1,229 @@
+import re
+import sqlite3
+
+# Fact tables bigger than this may not be fully scanned without a date filter
+FULL_SCAN_ROW_LIMIT = 5_000_000
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_TABLE_REF_RE = re.compile(
+    r"\b(from|join)\s+([a-z_][a-z0-9_]*)(?:\s+(?:as\s+)?([a-z_][a-z0-9_]*))?"
+)
+_JOIN_RE = re.compile(r"\b(natural\s+)?(?:(?:left|right|full|inner|(cross))\s+)?(?:outer\s+)?join\b")
+_JOIN_CONDITION_RE = re.compile(r"\b(on|using)\b")
+_CLAUSE_END_RE = re.compile(r"\b(join|where|group|order|limit|having|union|except|intersect|window)\b|\)")
+_CTE_NAME_RE = re.compile(r'\s*(?:[a-z_][a-z0-9_]*|"[^"]*")\s*')
+_CTE_AS_RE = re.compile(r"\s*as\s+(?:(?:not\s+)?materialized\s+)?(?=\()")
+_DATE_FILTER_RE = re.compile(
+    r"\b(?:[a-z_][a-z0-9_]*\.)?(date_id|calendar_date|year|quarter|quarter_id|week_num)\s*"
+    r"(?:=|==|<=?|>=?|<>|!=|\bbetween\b|\bin\b|\blike\b)\s*(?![a-z_][a-z0-9_]*\.[a-z_])"
+)
+_KEYWORDS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "outer", "on",
+    "using", "group", "order", "limit", "having", "union", "natural", "window",
+    "except", "intersect",
+}
+
+
+class SQLValidationError(Exception):
+    """
+    Raised when generated SQL is rejected before execution. `issues` is a
+    list of {"code", "message"} dicts describing every problem found.
+    """
+
+    def __init__(self, issues: list[dict]):
+        self.issues = issues
+        super().__init__("; ".join(issue["message"].rstrip(".") for issue in issues) + ".")
+
+
+def _strip(sql_query: str) -> str:
+    """Removes comments and string literal contents, and lower-cases the rest."""
+    code = _COMMENT_RE.sub(" ", sql_query)
+    code = _LITERAL_RE.sub("''", code)
+    return code.lower().strip()
+
+
+def _skip_parens(code: str, pos: int) -> int:
+    """Index just past the parenthesis group opening at code[pos], or -1 if it never closes."""
+    depth = 0
+    for i in range(pos, len(code)):
+        if code[i] == "(":
+            depth += 1
+        elif code[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+
+def _main_statement(code: str) -> str | None:
+    """
+    The statement after the CTE list of a WITH query (the query itself
+    otherwise), or None if the CTE list does not parse.
+    """
+    match = re.match(r"with\s+(?:recursive\b)?", code)
+    if not match:
+        return code
+    pos = match.end()
+    while True:
+        name = _CTE_NAME_RE.match(code, pos)
+        if not name:
+            return None
+        pos = name.end()
+        if code.startswith("(", pos):  # column list
+            pos = _skip_parens(code, pos)
+            if pos < 0:
+                return None
+        body = _CTE_AS_RE.match(code, pos)
+        if not body:
+            return None
+        pos = _skip_parens(code, body.end())
+        if pos < 0:
+            return None
+        more = re.match(r"\s*,", code[pos:])
+        if not more:
+            return code[pos:].strip()
+        pos += more.end()
+
+
+def _table_aliases(code: str) -> dict:
+    """Maps every alias (and bare table name) used in FROM/JOIN to its table."""
+    aliases = {}
+    for _, table, alias in _TABLE_REF_RE.findall(code):
+        aliases[table] = table
+        if alias and alias not in _KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def _missing_join_predicates(code: str) -> list[str]:
+    """
+    Finds explicit JOINs without ON/USING and comma joins without any WHERE
+    clause, i.e. the ways a query ends up as a cartesian product. An
+    explicit CROSS JOIN is taken as intended (e.g. a one-row total for a
+    share of total) unless it crosses in a fact table.
+    """
+    problems = []
+    for match in _JOIN_RE.finditer(code):
+        if match.group(1):
+            continue  # NATURAL JOIN has an implicit predicate
+        rest = code[match.end():]
+        # A derived table, JOIN (SELECT ...) t ON ..., is skipped as a whole;
+        # its own closing parenthesis is not the end of the join clause
+        skip = 0
+        if rest.lstrip().startswith("("):
+            skip = _skip_parens(rest, len(rest) - len(rest.lstrip()))
+            if skip < 0:
+                skip = 0
+        end = _CLAUSE_END_RE.search(rest, skip)
+        clause = rest[skip:end.start()] if end else rest[skip:]
+        table = "(subquery)" if skip else (clause.split()[0] if clause.split() else "?")
+        if match.group(2) and not table.startswith("fact_"):
+            continue  # a deliberate CROSS JOIN, unless it multiplies in a fact table
+        if not _JOIN_CONDITION_RE.search(clause):
+            problems.append(f"JOIN of {table} has no ON/USING condition")
+
+    for match in re.finditer(r"\bfrom\s+([a-z_][a-z0-9_]*)(?:\s+(?:as\s+)?[a-z_][a-z0-9_]*)?\s*,", code):
+        rest = code[match.end():]
+        end = _CLAUSE_END_RE.search(rest)
+        if not end or end.group(1) != "where":
+            problems.append(f"comma join starting at {match.group(1)} has no WHERE join condition")
+    return problems
+
+
+def _estimated_rows(conn: sqlite3.Connection, table: str) -> int:
+    """Cheap row estimate: MAX(rowid) is a single b-tree lookup."""
+    try:
+        row = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()
+        return row[0] or 0
+    except sqlite3.Error:
+        return 0
+
+
+def _code_of_single_select(sql_query: str) -> str:
+    """Stripped, lower-cased SQL; raises unless it is one SELECT/WITH statement."""
+    issues = []
+    code = _strip(sql_query).rstrip(";").strip()
+    if ";" in code:
+        issues.append({"code": "multiple_statements", "message": "Only a single SQL statement is allowed."})
+    main = _main_statement(code)
+    # WITH ... DELETE/UPDATE/INSERT starts with "with" too; the statement after the CTEs must be a SELECT
+    if main is None or not re.match(r"^\(*\s*select\b", main):
+        issues.append({"code": "not_select", "message": "Only read-only SELECT queries are allowed."})
+    if issues:
+        raise SQLValidationError(issues)
+    return code
+
+
+def validate_sql_text(sql_query: str):
+    """
+    The engine-independent part of validate_sql: a single SELECT statement
+    with a join predicate for every JOIN. Engines other than SQLite run this
+    and then prepare the statement with their own EXPLAIN.
+    """
+    code = _code_of_single_select(sql_query)
+    issues = [
+        {"code": "missing_join_predicate", "message": f"Cartesian product: {problem}."}
+        for problem in _missing_join_predicates(code)
+    ]
+    if issues:
+        raise SQLValidationError(issues)
+
+
+def validate_sql(conn: sqlite3.Connection, sql_query: str, full_scan_row_limit: int = FULL_SCAN_ROW_LIMIT) -> list[str]:
+    """
+    Checks generated SQL before it is executed, without running it:
+
+    - it must be a single SELECT (or WITH ... SELECT) statement,
+    - it must prepare cleanly (EXPLAIN QUERY PLAN catches syntax errors
+      and unknown tables/columns),
+    - every JOIN needs a join predicate,
+    - fact tables may only be fully scanned without a date filter if they
+      are smaller than `full_scan_row_limit` rows.
+
+    Raises SQLValidationError listing the problems. Returns a list of
+    warnings for issues that are allowed through (e.g. a full scan of a
+    small fact table).
+    """
+    issues = []
+    warnings = []
+    code = _code_of_single_select(sql_query)
+
+    try:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql_query.strip().rstrip(';')}").fetchall()
+    except sqlite3.Error as e:
+        raise SQLValidationError([{"code": "invalid_sql", "message": str(e)}]) from None
+
+    for problem in _missing_join_predicates(code):
+        issues.append({"code": "missing_join_predicate", "message": f"Cartesian product: {problem}."})
+
+    aliases = _table_aliases(code)
+    has_date_filter = bool(_DATE_FILTER_RE.search(code))
+    scanned_facts = []
+    for row in plan:
+        detail = row[-1].lower()
+        match = re.match(r"scan (\S+)", detail)
+        if not match:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table.startswith("fact_"):
+            scanned_facts.append(table)
+
+    if len(scanned_facts) > 1 and any(p["code"] == "missing_join_predicate" for p in issues):
+        issues.append({
+            "code": "fact_cross_scan",
+            "message": "Full scans of " + " and ".join(scanned_facts) + " combined without a join predicate.",
+        })
+
+    if not has_date_filter:
+        for table in scanned_facts:
+            rows = _estimated_rows(conn, table)
+            message = f"Full scan of {table} (~{rows} rows) without a date filter"
+            if rows > full_scan_row_limit:
+                issues.append({"code": "unfiltered_fact_scan", "message": message + "; add a date range filter."})
+            else:
+                warnings.append(message + ".")
+
+    if issues:
+        raise SQLValidationError(issues)
+    return warnings
@@ -1,4 +1,22 @@
-SYSTEM_PROMPT = """
+"""
+Schema documentation sent to the LLM, split into per-table blocks so a
+prompt can include only the tables (and join notes) a question needs.
+
+- TABLE_BLOCKS: schema text per table plus the keywords/synonyms that
+  signal a question needs it (used by schema_retriever.select_tables).
+  Rollup tables name their source fact in "rollup_of" and are sent along
+  with it.
+- JOIN_EDGES: which tables join directly, used to add bridge tables.
+- JOIN_NOTES / SPECIAL_CASE_NOTES: included when all their tables are selected.
+- GENERAL_NOTES: always included.
+- DIALECT_NOTES: differences to point out per execution engine.
+- SYSTEM_PROMPT: the full schema, every block and note.
+"""
+
+TABLE_BLOCKS = {
+    "account_dim": {
+        "keywords": ["account", "facility", "hospital", "clinic", "center", "site", "institution", "address", "city", "account type"],
+        "schema": """
 Table name: account_dim  
 Short description: Healthcare account dimension table that lists healthcare facilities and their metadata. Each row is one account/facility.
 
@@ -18,9 +36,70 @@ Sample row (JSON):
   "address": "San Francisco, CA",
   "territory_id": 1
 }
+```
+""",
+    },
+    "agg_activity_rep_month": {
+        "keywords": ["rollup", "monthly activity"],
+        "rollup_of": "fact_rep_activity",
+        "schema": """
+Table name: agg_activity_rep_month  
+Short description: Pre-aggregated rollup of fact_rep_activity, maintained by the loader. One row per rep × month × activity_type × status. Prefer it over fact_rep_activity for activity counts or durations by rep, region, month or year; use fact_rep_activity for HCP/account-level detail, single days or weeks, and time of day.
+
+Columns:
+- rep_id (INTEGER) — Joins to rep_dim.rep_id.
+- rep_name (TEXT) — "first_name last_name" from rep_dim.
+- region (TEXT) — Rep region from rep_dim.
+- year (INTEGER) — Calendar year.
+- month (TEXT) — Calendar month as "YYYY-MM" (e.g., "2024-08").
+- activity_type (TEXT) — Same values as fact_rep_activity.activity_type.
+- status (TEXT) — Same values as fact_rep_activity.status.
+- activity_cnt (INTEGER) — Number of activities.
+- hcp_cnt (INTEGER) — Distinct HCPs in the group (do not sum across groups; use fact_rep_activity for distinct counts over several months).
+- total_duration_min (INTEGER) — Sum of duration_min.
+""",
+    },
+    "agg_payor_account_quarter": {
+        "keywords": ["rollup", "quarterly payor mix"],
+        "rollup_of": "fact_payor_mix",
+        "schema": """
+Table name: agg_payor_account_quarter  
+Short description: Pre-aggregated rollup of fact_payor_mix, maintained by the loader. One row per account × year × quarter × payor_type. Prefer it over fact_payor_mix for payor mix by account, territory or quarter; use fact_payor_mix for individual snapshot dates.
 
-----
+Columns:
+- account_id (INTEGER) — Joins to account_dim.account_id.
+- account_name (TEXT) — Account name from account_dim.
+- territory_id (INTEGER) — Account territory, joins to territory_dim.territory_id.
+- year (INTEGER) — Calendar year.
+- quarter (TEXT) — "Q1".."Q4".
+- payor_type (TEXT) — Same values as fact_payor_mix.payor_type.
+- avg_pct_of_volume (REAL) — Average pct_of_volume over the snapshots in the quarter.
+- snapshot_cnt (INTEGER) — Number of snapshots averaged.
+""",
+    },
+    "agg_rx_territory_quarter": {
+        "keywords": ["rollup", "quarterly prescription"],
+        "rollup_of": "fact_rx",
+        "schema": """
+Table name: agg_rx_territory_quarter  
+Short description: Pre-aggregated rollup of fact_rx, maintained by the loader. One row per territory × brand × year × quarter (territory of the prescribing HCP). Prefer it over joining fact_rx, hcp_dim, date_dim and territory_dim for TRx/NRx by territory, brand, quarter or year; use fact_rx for HCP-level, daily or weekly questions.
 
+Columns:
+- territory_id (INTEGER) — Joins to territory_dim.territory_id.
+- territory_name (TEXT) — Territory name from territory_dim.
+- brand_code (TEXT) — Same values as fact_rx.brand_code.
+- year (INTEGER) — Calendar year.
+- quarter (TEXT) — "Q1".."Q4".
+- trx_cnt (INTEGER) — Sum of fact_rx.trx_cnt.
+- nrx_cnt (INTEGER) — Sum of fact_rx.nrx_cnt.
+- hcp_cnt (INTEGER) — Distinct prescribing HCPs in the group (do not sum across groups).
+""",
+    },
+    "date_dim": {
+        "keywords": ["date", "day", "week", "month", "quarter", "year", "q1", "q2", "q3", "q4", "daily", "weekly", "monthly", "quarterly", "yearly", "annual", "ytd", "weekday", "weekend", "period", "trend", "over time", "calendar", "when", "latest", "recent", "last",
+                     "january", "february", "march", "april", "may", "june", "july", "august",
+                     "september", "october", "november", "december"],
+        "schema": """
 Table name: date_dim  
 Short description: Date dimension table used for time-based analysis. Each row represents a single calendar date along with multiple derived time attributes.
 
@@ -42,9 +121,12 @@ Sample row (JSON) :
   "week_num": 30,
   "day_of_week": "Thu"
 }
-
-----
-
+```
+""",
+    },
+    "fact_ln_metrics": {
+        "keywords": ["patient", "market share", "share", "longitudinal", "ln", "patient count", "ln_patient_cnt"],
+        "schema": """
 Table name: fact_ln_metrics  
 Short description: Longitudinal patient metrics fact table. Each row represents aggregated patient count and estimated market share for an entity (HCP or account) in a specific quarter.
 
@@ -66,9 +148,12 @@ Sample row (JSON) — **taken directly from the uploaded file**:
   "ln_patient_cnt": 56,
   "est_market_share": 6.7
 }
-
-----
-
+```
+""",
+    },
+    "fact_payor_mix": {
+        "keywords": ["payor", "payer", "insurance", "insurer", "commercial", "medicare", "medicaid", "payor mix", "coverage", "pct of volume"],
+        "schema": """
 Table name: fact_payor_mix  
 Short description: Insurance payor distribution fact table. Each row represents the share of patient volume contributed by a specific insurance payor type for a given healthcare account on a given date.
 
@@ -86,9 +171,12 @@ Sample row (JSON) — **taken directly from the uploaded file**:
   "payor_type": "Commercial",
   "pct_of_volume": 8.2
 }
-
-----
-
+```
+""",
+    },
+    "fact_rep_activity": {
+        "keywords": ["activity", "call", "visit", "meeting", "lunch", "lunch meeting", "interaction", "engagement", "touchpoint", "detail", "completed", "scheduled", "canceled", "cancelled", "duration", "minutes", "time of day"],
+        "schema": """
 Table name: fact_rep_activity  
 Short description: Sales representative activity fact table. Each row captures an interaction performed by a sales representative with an HCP or account on a specific date.
 
@@ -116,9 +204,12 @@ Sample row (JSON) — **taken directly from the uploaded file**:
   "time_of_day": "10:45",
   "duration_min": 20
 }
-
-----
-
+```
+""",
+    },
+    "fact_rx": {
+        "keywords": ["prescription", "rx", "trx", "nrx", "script", "brand", "drug", "product", "gazyva", "written", "prescribing", "sales", "new prescription", "total prescription", "volume"],
+        "schema": """
 Table name: fact_rx  
 Short description: Prescription transactions fact table. Each row represents the number of prescriptions written by an HCP for a specific brand on a specific date.
 
@@ -138,9 +229,12 @@ Sample row (JSON) — **taken directly from the uploaded file**:
   "trx_cnt": 11,
   "nrx_cnt": 5
 }
-
-----
-
+```
+""",
+    },
+    "hcp_dim": {
+        "keywords": ["hcp", "doctor", "dr", "physician", "prescriber", "practitioner", "provider", "specialty", "specialist", "rheumatology", "rheumatologist", "nephrology", "nephrologist", "internal medicine", "tier"],
+        "schema": """
 Table name: hcp_dim  
 Short description: Healthcare practitioner dimension table containing core details about HCPs such as name, specialty, priority tier, and assigned territory.
 
@@ -160,9 +254,12 @@ Sample row (JSON) — **taken directly from the uploaded file**:
   "tier": "C",
   "territory_id": 1
 }
-
-----
-
+```
+""",
+    },
+    "rep_dim": {
+        "keywords": ["rep", "representative", "sales rep", "salesperson", "sales force", "field rep", "region"],
+        "schema": """
 Table name: rep_dim  
 Short description: Sales representative dimension table containing identifying details and assigned sales region for each sales rep.
 
@@ -180,9 +277,12 @@ Sample row (JSON) — **taken directly from the uploaded file**:
   "last_name": "Chen",
   "region": "Territory 1"
 }
-
-----
-
+```
+""",
+    },
+    "territory_dim": {
+        "keywords": ["territory", "region", "geography", "geo", "state cluster", "metro", "area", "parent territory"],
+        "schema": """
 Table name: territory_dim  
 Short description: Territory dimension table defining the hierarchical structure of sales territories. Each row represents one territory, its geographic classification, and its parent territory (if any).
 
@@ -200,26 +300,38 @@ Sample row (JSON) — **taken directly from the uploaded file**:
   "geo_type": "State Cluster",
   "parent_territory_id": null
 }
+```
+""",
+    },
+}
 
-
-## Quick overview (tables and primary keys)
-
-* **account_dim** — primary key: `account_id` (INTEGER)
-* **date_dim** — primary key: `date_id` (INTEGER or TEXT; often YYYYMMDD)
-* **fact_ln_metrics** — no single PK shown; uses `entity_type` + `entity_id` + `quarter_id` as natural keys
-* **fact_payor_mix** — likely composite key: (`account_id`, `date_id`, `payor_type`)
-* **fact_rep_activity** — primary key: `activity_id`
-* **fact_rx** — likely composite key: (`hcp_id`, `date_id`, `brand_code`)
-* **hcp_dim** — primary key: `hcp_id`
-* **rep_dim** — primary key: `rep_id`
-* **territory_dim** — primary key: `territory_id`
-
----
-
+# Tables that can be joined directly (see JOIN_NOTES for the join columns)
+JOIN_EDGES = [
+    ("account_dim", "fact_payor_mix"),
+    ("account_dim", "fact_rep_activity"),
+    ("account_dim", "fact_ln_metrics"),
+    ("hcp_dim", "fact_rx"),
+    ("hcp_dim", "fact_rep_activity"),
+    ("hcp_dim", "fact_ln_metrics"),
+    ("date_dim", "fact_payor_mix"),
+    ("date_dim", "fact_rep_activity"),
+    ("date_dim", "fact_rx"),
+    ("rep_dim", "fact_rep_activity"),
+    ("rep_dim", "territory_dim"),
+    ("territory_dim", "account_dim"),
+    ("territory_dim", "hcp_dim"),
+]
+
+JOIN_NOTES_INTRO = """
 ## Canonical join columns (exhaustive)
 
 Below are direct join pairs between tables that should be used when combining datasets.
+"""
 
+JOIN_NOTES = [
+    {
+        "tables": ("account_dim", "fact_payor_mix"),
+        "text": """
 ### 1. `account_dim.account_id`  ⟷  `fact_payor_mix.account_id`
 
 * Use when joining account-level payor mix to account master metadata.
@@ -231,7 +343,11 @@ FROM account_dim a
 JOIN fact_payor_mix f ON a.account_id = f.account_id
 WHERE f.date_id = 20241001;
 ```
-
+""",
+    },
+    {
+        "tables": ("account_dim", "fact_rep_activity"),
+        "text": """
 ### 2. `account_dim.account_id`  ⟷  `fact_rep_activity.account_id`
 
 * Link rep activity that occurred at a facility to the facility record.
@@ -242,7 +358,11 @@ FROM account_dim a
 JOIN fact_rep_activity r ON a.account_id = r.account_id
 WHERE r.status = 'completed';
 ```
-
+""",
+    },
+    {
+        "tables": ("account_dim", "fact_ln_metrics"),
+        "text": """
 ### 3. `account_dim.account_id`  ⟷  `fact_ln_metrics.entity_id`  (conditional)
 
 * **Special case:** `fact_ln_metrics` uses `entity_type` to indicate whether `entity_id` refers to an HCP (`'H'`) or an Account (`'A'`).
@@ -253,7 +373,11 @@ SELECT a.account_id, m.ln_patient_cnt, m.quarter_id
 FROM account_dim a
 JOIN fact_ln_metrics m ON m.entity_type = 'A' AND a.account_id = m.entity_id;
 ```
-
+""",
+    },
+    {
+        "tables": ("hcp_dim", "fact_rx"),
+        "text": """
 ### 4. `hcp_dim.hcp_id`  ⟷  `fact_rx.hcp_id`
 
 * Connect HCP master data to prescription transactions.
@@ -265,7 +389,11 @@ JOIN fact_rx r ON h.hcp_id = r.hcp_id
 WHERE r.brand_code = 'GAZYVA'
 GROUP BY h.hcp_id;
 ```
-
+""",
+    },
+    {
+        "tables": ("hcp_dim", "fact_rep_activity"),
+        "text": """
 ### 5. `hcp_dim.hcp_id`  ⟷  `fact_rep_activity.hcp_id`
 
 * Link rep activities targeted at an HCP to the HCP record.
@@ -275,7 +403,11 @@ SELECT h.full_name, a.activity_type, a.date_id
 FROM hcp_dim h
 JOIN fact_rep_activity a ON h.hcp_id = a.hcp_id;
 ```
-
+""",
+    },
+    {
+        "tables": ("hcp_dim", "fact_ln_metrics"),
+        "text": """
 ### 6. `hcp_dim.hcp_id`  ⟷  `fact_ln_metrics.entity_id`  (conditional)
 
 * Only join where `fact_ln_metrics.entity_type = 'H'`:
@@ -285,7 +417,11 @@ SELECT h.hcp_id, m.ln_patient_cnt, m.quarter_id
 FROM hcp_dim h
 JOIN fact_ln_metrics m ON m.entity_type = 'H' AND h.hcp_id = m.entity_id;
 ```
-
+""",
+    },
+    {
+        "tables": ("date_dim",),
+        "text": """
 ### 7. `date_dim.date_id`  ⟷  `fact_payor_mix.date_id`, `fact_rep_activity.date_id`, `fact_rx.date_id`
 
 * Use to bring calendar attributes (year, quarter, day_of_week) into facts.
@@ -296,7 +432,11 @@ FROM date_dim d
 JOIN fact_rx r ON d.date_id = r.date_id
 WHERE d.year = 2024 AND d.quarter = 'Q4';
 ```
-
+""",
+    },
+    {
+        "tables": ("rep_dim", "fact_rep_activity"),
+        "text": """
 ### 8. `rep_dim.rep_id`  ⟷  `fact_rep_activity.rep_id`
 
 * Join to get rep details for each activity.
@@ -306,7 +446,11 @@ SELECT rep.first_name || ' ' || rep.last_name AS rep_name, a.activity_type
 FROM rep_dim rep
 JOIN fact_rep_activity a ON rep.rep_id = a.rep_id;
 ```
-
+""",
+    },
+    {
+        "tables": ("territory_dim",),
+        "text": """
 ### 9. `territory_dim.territory_id`  ⟷  `account_dim.territory_id` and `hcp_dim.territory_id`
 
 * Map accounts and HCPs to territories. Use outer join if territory may be NULL.
@@ -316,33 +460,105 @@ SELECT t.name AS territory_name, a.name AS account_name
 FROM territory_dim t
 LEFT JOIN account_dim a ON t.territory_id = a.territory_id;
 ```
+""",
+    },
+]
 
----
-
+SPECIAL_CASE_NOTES_INTRO = """
 ## Columns that are conceptually the same but named differently / special cases
+"""
 
+SPECIAL_CASE_NOTES = [
+    {
+        "tables": ("fact_ln_metrics",),
+        "text": """
 * **`entity_id` (fact_ln_metrics) vs `hcp_id` / `account_id`**
 
   * `entity_id` is polymorphic; you must filter `entity_type` to decide whether it refers to `hcp_id` or `account_id`.
   * When writing joins or aggregations against `fact_ln_metrics`, always include `entity_type` in the join condition.
-
+""",
+    },
+    {
+        "tables": ("date_dim",),
+        "text": """
 * **`date_id` type differences**
 
   * `date_id` is listed as `INTEGER/TEXT` for `date_dim`. In fact tables it may be stored as integer (e.g., `20240801`) or text. Casts may be necessary when joining if types differ: `CAST(r.date_id AS TEXT) = d.date_id` or `CAST(d.date_id AS INTEGER) = r.date_id`.
-
+""",
+    },
+    {
+        "tables": ("rep_dim",),
+        "text": """
 * **`region` (rep_dim) vs `territory_id` (account_dim/hcp_dim)**
 
   * `rep_dim.region` stores a human-readable region name (e.g., "Territory 1"). Territories elsewhere are by numeric `territory_id`. If you need to link reps to territories, either:
 
     * Map `rep_dim.region` to `territory_dim.name` (string match), or
     * Add a `territory_id` column to `rep_dim` if available/desired.
-
+""",
+    },
+    {
+        "tables": ("fact_ln_metrics",),
+        "text": """
 * **`quarter_id` vs `date_dim` granularity**
 
   * `fact_ln_metrics.quarter_id` is period-level (e.g., `2024Q4`). If you need quarter-level joins to `date_dim`, use `date_dim.year` + `date_dim.quarter` to group or derive `YYYYQX`.
+""",
+    },
+]
+
+# Pitfalls and checklist, relevant to every query
+GENERAL_NOTES = """
+## Joins to watch out for (pitfalls & best practices)
+
+1. **Polymorphic entity columns** — `fact_ln_metrics.entity_id` must always be used with `entity_type` guard.
+2. **NULLable territory / missing mappings** — use `LEFT JOIN` when territory or region may be missing; `INNER JOIN` will drop records.
+3. **Type mismatches** — `date_id` numeric vs text can silently fail; always verify types with `PRAGMA table_info(table_name)` and cast if necessary.
+4. **Ambiguous `region` vs `territory`** — string-based region names can be inconsistent (extra spaces, different capitalisation). Prefer normalized `territory_id` numeric keys.
+5. **Performance** — when an `agg_*` rollup table is listed and covers the question's grain, query it instead of the fact table; it is orders of magnitude smaller. Otherwise, the fact tables are indexed on their join keys (e.g., `fact_rx(date_id, hcp_id, brand_code)`, `fact_rx(hcp_id, date_id)`, `fact_payor_mix(account_id, date_id)`, `fact_rep_activity(rep_id, date_id)`). Filter and join on these columns directly rather than on expressions over them.
 
 ---
 
+## Quick checklist for joining (when building a query)
+
+1. Identify the grain of the fact table (row uniqueness) you are joining.
+2. Pick the matching dimension key (e.g., `hcp_id` → `hcp_dim.hcp_id`).
+3. Confirm types (INTEGER vs TEXT) for `date_id` and cast consistently.
+4. If using `fact_ln_metrics`, include `entity_type` in the join.
+5. Decide whether `LEFT JOIN` or `INNER JOIN` is needed depending on whether you want to keep or drop unmatched dimension rows.
+"""
+
+# Dialect pitfalls per engine (see sql_engines); SQLite is what the notes above assume
+DIALECT_NOTES = {
+    "sqlite": "",
+    "duckdb": """-- DUCKDB DIALECT NOTES:
+    -- * `calendar_date` is VARCHAR 'YYYY-MM-DD': cast with CAST(calendar_date AS DATE) before date functions.
+    -- * strftime takes the date first: strftime(CAST(calendar_date AS DATE), '%Y-%m') (SQLite's order is reversed).
+    -- * There is no julianday(); use date_diff('day', start_date, end_date).
+    -- * `/` on integers returns a DOUBLE; use `//` for integer division.
+    -- * LIKE is case-sensitive; use ILIKE for case-insensitive name matching.
+    -- * PRAGMA table_info is not available; rely on the schema below.""",
+}
+
+# Sections only worth their tokens in the full schema prompt
+FULL_ONLY_SECTIONS = [
+    """
+## Quick overview (tables and primary keys)
+
+* **account_dim** — primary key: `account_id` (INTEGER)
+* **agg_activity_rep_month** — rollup of fact_rep_activity; key: (`rep_id`, `month`, `activity_type`, `status`)
+* **agg_payor_account_quarter** — rollup of fact_payor_mix; key: (`account_id`, `year`, `quarter`, `payor_type`)
+* **agg_rx_territory_quarter** — rollup of fact_rx; key: (`territory_id`, `brand_code`, `year`, `quarter`)
+* **date_dim** — primary key: `date_id` (INTEGER or TEXT; often YYYYMMDD)
+* **fact_ln_metrics** — no single PK shown; uses `entity_type` + `entity_id` + `quarter_id` as natural keys
+* **fact_payor_mix** — likely composite key: (`account_id`, `date_id`, `payor_type`)
+* **fact_rep_activity** — primary key: `activity_id`
+* **fact_rx** — likely composite key: (`hcp_id`, `date_id`, `brand_code`)
+* **hcp_dim** — primary key: `hcp_id`
+* **rep_dim** — primary key: `rep_id`
+* **territory_dim** — primary key: `territory_id`
+""",
+    """
 ## Example multi-table join (prescriptions by territory)
 
 Get total prescriptions for a brand by territory (year/quarter):
@@ -358,19 +574,8 @@ GROUP BY t.territory_id, m.quarter_id;
 ```
 
 > Note: The example above references `m.quarter_id` but you may want to use `d.year` + `d.quarter` instead of `m` if `m` isn't present in context. Replace with `d.year || 'Q' || substr(d.quarter, 2)` if you need to synthesize.
-
----
-
-## Joins to watch out for (pitfalls & best practices)
-
-1. **Polymorphic entity columns** — `fact_ln_metrics.entity_id` must always be used with `entity_type` guard.
-2. **NULLable territory / missing mappings** — use `LEFT JOIN` when territory or region may be missing; `INNER JOIN` will drop records.
-3. **Type mismatches** — `date_id` numeric vs text can silently fail; always verify types with `PRAGMA table_info(table_name)` and cast if necessary.
-4. **Ambiguous `region` vs `territory`** — string-based region names can be inconsistent (extra spaces, different capitalisation). Prefer normalized `territory_id` numeric keys.
-5. **Performance** — add indexes on commonly joined columns in large fact tables (e.g., `fact_rx(hcp_id)`, `fact_rx(date_id)`, `fact_payor_mix(account_id, date_id)`, `fact_rep_activity(rep_id, date_id)`).
-
----
-
+""",
+    """
 ## Suggested SQL helper snippets
 
 * **Safe join with type casting for date_id**
@@ -406,28 +611,8 @@ SELECT 'HCP' AS entity_type, h.hcp_id AS entity_id, h.full_name AS name, m.ln_pa
 FROM fact_ln_metrics m
 JOIN hcp_dim h ON m.entity_type = 'H' AND m.entity_id = h.hcp_id;
 ```
-
----
-
-## Recommended indexes (if you can modify the SQLite DB)
-
-* `CREATE INDEX idx_fact_rx_hcp_date ON fact_rx (hcp_id, date_id);`
-* `CREATE INDEX idx_fact_payor_account_date ON fact_payor_mix (account_id, date_id);`
-* `CREATE INDEX idx_fact_rep_activity_rep_date ON fact_rep_activity (rep_id, date_id);`
-* `CREATE INDEX idx_fact_ln_entity ON fact_ln_metrics (entity_type, entity_id);`
-
----
-
-## Quick checklist for joining (when building a query)
-
-1. Identify the grain of the fact table (row uniqueness) you are joining.
-2. Pick the matching dimension key (e.g., `hcp_id` → `hcp_dim.hcp_id`).
-3. Confirm types (INTEGER vs TEXT) for `date_id` and cast consistently.
-4. If using `fact_ln_metrics`, include `entity_type` in the join.
-5. Decide whether `LEFT JOIN` or `INNER JOIN` is needed depending on whether you want to keep or drop unmatched dimension rows.
-
----
-
+""",
+    """
 ## Appendix — Table of join relationships (matrix)
 
 | Left table    |  Left column | Right table       | Right column | Notes                            |
@@ -444,5 +629,42 @@ JOIN hcp_dim h ON m.entity_type = 'H' AND m.entity_id = h.hcp_id;
 | rep_dim       |       rep_id | fact_rep_activity |       rep_id | direct join                      |
 | territory_dim | territory_id | account_dim       | territory_id | direct join; account may be NULL |
 | territory_dim | territory_id | hcp_dim           | territory_id | direct join; hcp may be NULL     |
+""",
+]
+
+
+def _notes_for(notes: list, tables: set) -> list[str]:
+    return [note["text"] for note in notes if set(note["tables"]) <= tables]
+
+
+def build_schema_prompt(tables: list[str] | None = None) -> str:
+    """
+    Renders the schema section of the SQL prompt. With tables=None every
+    table and note is included; otherwise only the given tables, the join
+    and special-case notes between them, and the general notes.
+    """
+    full = tables is None
+    selected = set(TABLE_BLOCKS) if full else set(tables)
+
+    sections = [TABLE_BLOCKS[name]["schema"] for name in TABLE_BLOCKS if name in selected]
+    if full:
+        sections.append(FULL_ONLY_SECTIONS[0])
+
+    join_notes = _notes_for(JOIN_NOTES, selected)
+    if join_notes:
+        sections.append("\n\n".join([JOIN_NOTES_INTRO] + join_notes))
+
+    special_notes = _notes_for(SPECIAL_CASE_NOTES, selected)
+    if special_notes:
+        sections.append("\n\n".join([SPECIAL_CASE_NOTES_INTRO] + special_notes))
+
+    if full:
+        sections.extend(FULL_ONLY_SECTIONS[1:3])
+    sections.append(GENERAL_NOTES)
+    if full:
+        sections.append(FULL_ONLY_SECTIONS[3])
+
+    return "\n\n----\n\n".join(sections) + "\n"
+
 
-"""
\ No newline at end of file
+SYSTEM_PROMPT = build_schema_prompt()
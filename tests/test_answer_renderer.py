@@ -0,0 +1,57 @@
+import pytest
+
+from answer_renderer import format_value, question_filters, render_answer
+from query_result import QueryResult
+
+
+@pytest.mark.parametrize("columns, rows", [
+    (["sum(t1.trx_cnt)"], [(26070,)]),
+    (["t1.trx_cnt"], [(5,)]),
+    (["total trx"], [(5,)]),
+    (["n"], [(90,)]),
+    (["value"], [(1.5,)]),
+    (["full_name", "total"], [("Dr Blake Garcia", 3), ("Dr Ada Lee", 2)]),
+    (["name", "SUM(trx_cnt)"], [("A", 3), ("B", 2)]),
+])
+def test_undescriptive_columns_go_to_the_llm(columns, rows):
+    assert render_answer("Total TRx for GAZYVA in 2024", QueryResult(columns=columns, rows=rows)) is None
+
+
+def test_scalar_repeats_the_question_filters():
+    result = QueryResult(columns=["total_trx"], rows=[(26070,)])
+    assert render_answer("Total TRx for GAZYVA in 2024", result) == "The total TRx for GAZYVA in 2024 is 26,070."
+    assert render_answer("How many TRx are there?", result) == "The total TRx is 26,070."
+
+
+def test_ranked_list_repeats_the_period():
+    result = QueryResult(columns=["full_name", "total_nrx"], rows=[("A", 30), ("B", 20)])
+    assert render_answer("Top 2 HCPs by NRx in 2024", result) == (
+        "Full name ranked by total NRx in 2024: 1. A (30); 2. B (20)."
+    )
+
+
+@pytest.mark.parametrize("question, filters", [
+    ("Total TRx for GAZYVA in 2024", "for GAZYVA in 2024"),
+    ("Total TRx by territory for Q3 2024", "for Q3 2024"),
+    ("How many calls did Morgan Chen make last quarter?", "last quarter"),
+    ("How many HCPs are there?", ""),
+    ("Average call duration by activity type", ""),
+])
+def test_question_filters(question, filters):
+    assert question_filters(question) == filters
+
+
+@pytest.mark.parametrize("value, text", [
+    (0.1234, "0.1234"),
+    (-0.05678, "-0.05678"),
+    (12345.678, "12,345.68"),
+    (42.0, "42"),
+    (1234567, "1,234,567"),
+])
+def test_format_value(value, text):
+    assert format_value("est_market_share", value) == text
+
+
+def test_identifier_columns_are_verbatim():
+    assert format_value("hcp_id", 3000000015) == "3000000015"
+    assert format_value("year", 2024) == "2024"
@@ -0,0 +1,124 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from csv_to_sqlite import data_dir, load_csv_to_sqlite
+
+pytest.importorskip("pandas")
+
+ACTIVITY = "fact_rep_activity"
+
+
+@pytest.fixture
+def data(tmp_path):
+    # The activity fact with its rollup dimensions; the other CSVs are missing
+    folder = tmp_path / "data"
+    folder.mkdir()
+    for file_name in ("rep_dim.csv", "date_dim.csv"):
+        shutil.copy(os.path.join(data_dir, file_name), folder / file_name)
+    with open(os.path.join(data_dir, f"{ACTIVITY}.csv")) as source:
+        lines = [next(source) for _ in range(101)]
+    (folder / f"{ACTIVITY}.csv").write_text("".join(lines))
+    return folder
+
+
+def _load(tmp_path, data, **kwargs) -> dict:
+    return load_csv_to_sqlite(str(tmp_path / "test.db"), str(data), **kwargs)
+
+
+def _query(tmp_path, sql: str) -> list:
+    conn = sqlite3.connect(tmp_path / "test.db")
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def _append(data, *rows: str):
+    with open(data / f"{ACTIVITY}.csv", "a") as f:
+        f.write("".join(row + "\n" for row in rows))
+
+
+def test_unchanged_files_are_skipped(tmp_path, data):
+    assert _load(tmp_path, data)[ACTIVITY]["action"] == "replaced"
+    results = _load(tmp_path, data)
+    assert results[ACTIVITY]["action"] == "skipped"
+    assert results["agg_activity_rep_month"]["action"] == "skipped"
+
+
+def test_appended_tail_is_inserted(tmp_path, data):
+    _load(tmp_path, data)
+    _append(data, "9001,1,1000000022,1000,20240815,call,completed,10:45,20")
+    result = _load(tmp_path, data)[ACTIVITY]
+    assert (result["action"], result["rows"]) == ("appended", 1)
+    assert _query(tmp_path, f"SELECT COUNT(*) FROM {ACTIVITY}") == [(101,)]
+
+
+def test_appended_primary_key_replaces_the_row(tmp_path, data):
+    _load(tmp_path, data)
+    _append(data, "1,1,1000000022,1000,20240801,call,cancelled,10:45,99")
+    assert _load(tmp_path, data)[ACTIVITY]["action"] == "appended"
+    assert _query(tmp_path, f"SELECT status, duration_min FROM {ACTIVITY} WHERE activity_id = 1") == [("cancelled", 99)]
+    assert _query(tmp_path, f"SELECT COUNT(*) FROM {ACTIVITY}") == [(100,)]
+
+
+def test_rewritten_file_is_rebuilt(tmp_path, data):
+    _load(tmp_path, data)
+    path = data / f"{ACTIVITY}.csv"
+    path.write_text(path.read_text().replace("lunch_meeting", "dinner_meeting", 1))
+    assert _load(tmp_path, data)[ACTIVITY]["action"] == "replaced"
+    assert _query(tmp_path, f"SELECT activity_type FROM {ACTIVITY} WHERE activity_id = 2") == [("dinner_meeting",)]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_rebuild_keeps_the_last_duplicate_like_an_append(tmp_path, data, workers):
+    _load(tmp_path, data)
+    _append(data, "1,1,1000000022,1000,20240801,call,cancelled,10:45,99")
+    result = _load(tmp_path, data, force=True, workers=workers)[ACTIVITY]
+    assert (result["action"], result["rows"]) == ("replaced", 100)
+    assert _query(tmp_path, f"SELECT status FROM {ACTIVITY} WHERE activity_id = 1") == [("cancelled",)]
+
+
+def test_rebuilds_keep_the_indexes(tmp_path, data):
+    def indexes():
+        return _query(tmp_path, f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = '{ACTIVITY}' AND sql IS NOT NULL")
+
+    _load(tmp_path, data)
+    expected = indexes()
+    for _ in range(2):
+        _load(tmp_path, data, force=True)
+        assert indexes() == expected != [(0,)]
+
+
+def _rollup_matches_the_fact(tmp_path) -> bool:
+    # A fresh GROUP BY over the fact table must agree with the maintained rollup
+    fresh = _query(tmp_path, f"""
+        SELECT f.rep_id, substr(d.calendar_date, 1, 7), f.activity_type, f.status,
+               COUNT(*), COUNT(DISTINCT f.hcp_id), SUM(f.duration_min)
+        FROM {ACTIVITY} f JOIN date_dim d ON d.date_id = f.date_id
+        GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+    """)
+    rollup = _query(tmp_path, """
+        SELECT rep_id, month, activity_type, status, activity_cnt, hcp_cnt, total_duration_min
+        FROM agg_activity_rep_month ORDER BY 1, 2, 3, 4
+    """)
+    return bool(fresh) and rollup == fresh
+
+
+@pytest.mark.parametrize("rows", [
+    ["9001,1,1000000022,1000,20240815,call,completed,10:45,20",
+     "9002,2,1000000002,1004,20240902,call,completed,09:00,15"],
+    ["1,1,1000000022,1000,20240801,call,cancelled,10:45,99"],
+    # An upsert moving the activity to another month refreshes both months
+    ["2,1,1000000002,1004,20240903,lunch_meeting,completed,12:30,70"],
+])
+def test_refreshed_rollup_matches_a_fresh_group_by(tmp_path, data, rows):
+    assert _load(tmp_path, data)["agg_activity_rep_month"]["action"] == "rebuilt"
+    assert _rollup_matches_the_fact(tmp_path)
+    _append(data, *rows)
+    results = _load(tmp_path, data)
+    assert results[ACTIVITY]["action"] == "appended"
+    assert results["agg_activity_rep_month"]["action"] == "refreshed"
+    assert _rollup_matches_the_fact(tmp_path)
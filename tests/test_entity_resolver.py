@@ -0,0 +1,42 @@
+import pytest
+
+from entity_resolver import EntityIndex
+
+
+@pytest.fixture
+def index():
+    index = EntityIndex()
+    index.add("account", 1000, "Bay Medical Center")
+    index.add("account", 1001, "Bay Clinic")
+    index.add("account", 1002, "Lakeside Hospital")
+    index.add("hcp", 3000000015, "Dr Blake Garcia")
+    index.add("territory", 1, "Territory 1")
+    index.add("territory", 2, "Territory 2")
+    return index
+
+
+def _names(index, question: str) -> list[str]:
+    return [match["name"] for match in index.resolve(question)]
+
+
+@pytest.mark.parametrize("question", [
+    "How many calls at the medical center last month",
+    "How many calls at the medical center this quarter",
+    "Calls at the clinic last week",
+    "Visits to a hospital this year",
+    "Calls by clinic",
+    "TRx in territory 3",
+])
+def test_generic_phrases_resolve_nothing(index, question):
+    assert _names(index, question) == []
+
+
+@pytest.mark.parametrize("question, name", [
+    ("How many calls at Bay Medical Center last month", "Bay Medical Center"),
+    ("calls at bay medical centre last month", "Bay Medical Center"),
+    ("Calls at Lakesde Hospital this year", "Lakeside Hospital"),
+    ("NRx for Dr Blake Garsia in 2024", "Dr Blake Garcia"),
+    ("TRx in Territory 2", "Territory 2"),
+])
+def test_names_resolve_exactly_or_misspelled(index, question, name):
+    assert _names(index, question) == [name]
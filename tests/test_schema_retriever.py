@@ -0,0 +1,28 @@
+import pytest
+
+from schema_retriever import select_tables
+
+
+@pytest.mark.parametrize("question, fact, dimension", [
+    ("Which HCPs prescribed the most?", "fact_rx", "hcp_dim"),
+    ("Which doctors were visited most?", "fact_rep_activity", "hcp_dim"),
+    ("Which reps had the most cancellations?", "fact_rep_activity", "rep_dim"),
+    ("Show sales by quarter", "fact_rx", "date_dim"),
+    ("Total TRx by territory for Q3 2024", "fact_rx", "territory_dim"),
+])
+def test_inflected_keywords_keep_the_fact_table(question, fact, dimension):
+    tables = select_tables(question)
+    assert fact in tables and dimension in tables
+
+
+@pytest.mark.parametrize("question", [
+    "How many HCPs are there?",
+    "List all territories",
+    "Hello there",
+])
+def test_no_fact_table_means_full_schema(question):
+    assert select_tables(question) is None
+
+
+def test_required_tables_are_included():
+    assert "account_dim" in select_tables("Total TRx in 2024", required=["account_dim"])
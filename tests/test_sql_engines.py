@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from csv_to_sqlite import data_dir
+from sql_validator import SQLValidationError
+
+pytest.importorskip("duckdb")
+from sql_engines import DuckDBEngine  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # A few rows of fact_rx are enough; tables with missing CSVs are skipped
+    with open(os.path.join(data_dir, "fact_rx.csv")) as source:
+        lines = [next(source) for _ in range(6)]
+    (tmp_path / "fact_rx.csv").write_text("".join(lines))
+    engine = DuckDBEngine(data_path=str(tmp_path))
+    yield engine
+    engine.close()
+
+
+def _count(engine) -> int:
+    return engine.execute("SELECT COUNT(*) FROM fact_rx", True, 5, 0, 10, None).rows[0][0]
+
+
+@pytest.mark.parametrize("validate", [True, False])
+@pytest.mark.parametrize("sql_query", [
+    "WITH x AS (SELECT 1) DELETE FROM fact_rx",
+    "DELETE FROM fact_rx",
+    "DROP TABLE fact_rx",
+    "SELECT 1; DELETE FROM fact_rx",
+])
+def test_refuses_anything_but_a_single_select(engine, sql_query, validate):
+    before = _count(engine)
+    with pytest.raises(SQLValidationError):
+        engine.execute(sql_query, validate, 5, 0, 10, None)
+    assert _count(engine) == before == 5
+
+
+@pytest.mark.parametrize("sql_query", [
+    "SELECT content FROM read_text('/etc/hostname')",
+    "SELECT * FROM read_csv('/etc/passwd')",
+    "SET enable_external_access = true",
+])
+def test_files_outside_the_data_directory_are_unreadable(engine, sql_query):
+    with pytest.raises((SQLValidationError,) + engine.errors):
+        engine.execute(sql_query, True, 5, 0, 10, None)
+    with pytest.raises((SQLValidationError,) + engine.errors):
+        engine.execute(sql_query, False, 5, 0, 10, None)
+
+
+def test_runs_selects(engine):
+    result = engine.execute("WITH x AS (SELECT 1 AS one) SELECT one FROM x", False, 5, 0, 10, None)
+    assert result.rows == [(1,)]
@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+from sql_validator import SQLValidationError, validate_sql, validate_sql_text
+
+
+def _codes(sql_query: str) -> list[str]:
+    with pytest.raises(SQLValidationError) as error:
+        validate_sql_text(sql_query)
+    return [issue["code"] for issue in error.value.issues]
+
+
+@pytest.mark.parametrize("sql_query", [
+    "WITH x AS (SELECT 1) DELETE FROM fact_rx",
+    "with x as (select 1), y(a) as materialized (select 2) update fact_rx set trx_cnt = 0",
+    "WITH x AS (SELECT ')') INSERT INTO fact_rx SELECT * FROM x",
+    "WITH x AS (SELECT 1 DELETE FROM fact_rx",
+    "DELETE FROM fact_rx",
+])
+def test_rejects_statements_that_are_not_a_select(sql_query):
+    assert "not_select" in _codes(sql_query)
+
+
+@pytest.mark.parametrize("sql_query", [
+    "WITH x AS (SELECT 1), y AS (SELECT ')' AS c FROM x) SELECT * FROM y",
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 5) SELECT * FROM n",
+    "with x as not materialized (select 1) select * from x",
+    "(SELECT 1)",
+])
+def test_accepts_selects(sql_query):
+    validate_sql_text(sql_query)
+
+
+def test_derived_table_join_with_predicate_is_accepted():
+    validate_sql_text(
+        "SELECT f.hcp_id, t.total FROM fact_rx f "
+        "JOIN (SELECT hcp_id, SUM(trx_cnt) AS total FROM fact_rx GROUP BY hcp_id) t ON t.hcp_id = f.hcp_id"
+    )
+    validate_sql_text(
+        "SELECT * FROM fact_rx f LEFT JOIN (SELECT h.hcp_id FROM hcp_dim h "
+        "JOIN territory_dim t ON t.territory_id = h.territory_id) x USING (hcp_id)"
+    )
+
+
+def test_derived_table_join_without_predicate_is_rejected():
+    assert _codes("SELECT * FROM fact_rx f JOIN (SELECT hcp_id FROM hcp_dim) t") == ["missing_join_predicate"]
+    assert _codes(
+        "SELECT * FROM fact_rx f JOIN (SELECT h.hcp_id FROM hcp_dim h JOIN territory_dim t) x ON x.hcp_id = f.hcp_id"
+    ) == ["missing_join_predicate"]
+
+
+def test_cross_join_of_a_total_is_accepted():
+    validate_sql_text(
+        "SELECT f.hcp_id, SUM(f.trx_cnt) * 1.0 / t.tot AS trx_share FROM fact_rx f "
+        "CROSS JOIN (SELECT SUM(trx_cnt) AS tot FROM fact_rx) t GROUP BY f.hcp_id, t.tot"
+    )
+    validate_sql_text("SELECT * FROM fact_rx f CROSS JOIN territory_dim t")
+
+
+def test_cross_join_of_two_fact_tables_is_rejected():
+    assert _codes("SELECT * FROM fact_rx r CROSS JOIN fact_payor_mix p") == ["missing_join_predicate"]
+
+
+def test_validate_sql_rejects_with_delete_before_preparing():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE fact_rx (hcp_id INTEGER, trx_cnt INTEGER)")
+    with pytest.raises(SQLValidationError) as error:
+        validate_sql(conn, "WITH x AS (SELECT 1) DELETE FROM fact_rx")
+    assert error.value.issues[0]["code"] == "not_select"